@@ -1,130 +1,306 @@
-from groq import Groq
-import os
-import re
 import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import telemetry
+from config import (
+    CLASSIFIER_MODE,
+    CLASSIFIER_BATCH_SIZE,
+    CLASSIFIER_RULES_PATH,
+    CLASSIFIER_TOKEN_BUDGET,
+    FAST_CLASSIFIER_THRESHOLD,
+)
+from llm_gateway import chat, submit
+from agents.fast_classifier import get_model
+from agents.rule_engine import RuleEngine
+from utils.text_budget import available_tokens, compact
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Heuristic rules are compiled once at import time
+RULES = RuleEngine.from_file(CLASSIFIER_RULES_PATH)
+
+# How each document was classified, for reporting fast-path coverage
+_stats = {"heuristic": 0, "fast_path": 0, "llm": 0}
+_stats_lock = threading.Lock()
+
+def _count(route: str):
+    with _stats_lock:
+        _stats[route] += 1
+    telemetry.inc("classification_routes_total", route=route)
+
+def get_classification_stats() -> dict:
+    """Counts of documents classified by heuristics, the local model and the LLM"""
+    with _stats_lock:
+        return dict(_stats)
 
 def classify_and_route(source: str, content: str) -> dict:
     """Classify content with improved JSON detection"""
-    # First check if content is valid document JSON
-    if is_document_json(content):
-        return {
-            "format": "json",
-            "intent": detect_json_intent(content),
-            "source": source
-        }
-    
-    # Then check for PDF-like structure
-    if is_pdf_like_content(content):
-        return {
-            "format": "pdf",
-            "intent": detect_pdf_intent(content),
-            "source": source
-        }
+    classification = local_classification(source, content)
+    if classification is not None:
+        return classification
+    return llm_classification(source, content)
+
+def local_classification(source: str, content: str):
+    """Heuristic rules, then the local model if it is confident enough; None when neither applies"""
+    with telemetry.span("classify.heuristic"):
+        classification = heuristic_classification(source, content)
+    if classification is not None:
+        _count("heuristic")
+        return classification
+
+    with telemetry.span("classify.fast_path"):
+        classification = fast_classification(source, content)
+    if classification is not None:
+        _count("fast_path")
+    return classification
+
+def llm_classification(source: str, content: str) -> dict:
+    """LLM classification, for content the local tiers could not label"""
+    _count("llm")
+    with telemetry.span("classify.llm"):
+        return normal_classification(source, content)
+
+def fast_classification(source: str, content: str, threshold: float = FAST_CLASSIFIER_THRESHOLD):
+    """Local model prediction, or None when no model is trained or it is unsure"""
+    model = get_model()
+    if model is None:
+        return None
+    prediction = model.predict(content)
+    if prediction["confidence"] < threshold:
+        return None
+    return validate_labels(source, prediction["format"], prediction["intent"])
+
+def heuristic_classification(source: str, content: str):
+    """Rule-based classification, or None when no rule applies"""
+    match = RULES.classify(content)
+    if match is None:
+        return None
     
-    # Default to normal classification
-    return normal_classification(source, content)
+    format_label, intent = match
+    return {
+        "format": format_label,
+        "intent": intent,
+        "source": source
+    }
 
 def is_document_json(content: str) -> bool:
     """Check if content is valid JSON and resembles a document"""
-    try:
-        data = json.loads(content)
-        # Only consider it JSON format if it has document-like structure
-        document_keys = {'id', 'type', 'date', 'items', 'from', 'to', 'subject'}
-        if isinstance(data, dict) and any(key in data for key in document_keys):
-            return True
-        return False
-    except ValueError:
-        return False
+    return RULES.parse_document_json(content) is not None
 
 def detect_json_intent(content: str) -> str:
     """Determine intent of JSON content"""
-    data = json.loads(content)
-    
-    # Check for invoice patterns
-    invoice_patterns = [r'invoice', r'total', r'amount', r'due_date']
-    if any(re.search(pattern, str(data), re.IGNORECASE) for pattern in invoice_patterns):
-        return "Invoice"
-    
-    # Check for RFQ patterns
-    rfq_patterns = [r'rfq', r'request for quotation', r'items', r'quote']
-    if any(re.search(pattern, str(data), re.IGNORECASE) for pattern in rfq_patterns):
-        return "RFQ"
-    
-    return "Other"
+    return RULES.intent("json_intents", content.lower())
 
 def detect_pdf_intent(content: str) -> str:
     """Detect intent of PDF-like content"""
-    # Check for invoice patterns
-    invoice_keywords = ['invoice', 'total', 'subtotal', 'amount due', 'balance']
-    if any(keyword.lower() in content.lower() for keyword in invoice_keywords):
-        return "Invoice"
-    
-    # Check for RFQ patterns
-    rfq_keywords = ['rfq', 'request for quote', 'quotation', 'pricing']
-    if any(keyword.lower() in content.lower() for keyword in rfq_keywords):
-        return "RFQ"
-    
-    return "Other"
+    return RULES.intent("pdf_intents", content.lower())
 
 def is_pdf_like_content(content: str) -> bool:
     """Check for PDF structure without matching JSON"""
     if is_document_json(content):
         return False
-        
-    pdf_patterns = [
-        r"^\s*[A-Z0-9\-_]+\s+#\d+",  # Document numbers
-        r"\b\d+\s+units?\s+@\s+\$\d+\.?\d*",  # Line items
-        r"\b(?:total|subtotal|amount due)\s*:\s*\$\d+\.?\d*",  # Monetary amounts
-        r"\bpage\s+\d+\s+of\s+\d+\b",  # Pagination
-        r"\b(?:invoice|receipt|contract|agreement)\b"  # Document types
-    ]
-    return any(re.search(pattern, content, re.IGNORECASE) for pattern in pdf_patterns)
-
-def normal_classification(source: str, content: str) -> dict:
-    """Standard LLM classification with error handling"""
-    try:
-        format_prompt = f"""Classify this content's format (respond ONLY with one word):
-        Options: pdf, json, email, text
-        Content: {content[:2000]}"""
-        
-        intent_prompt = f"""Classify this content's intent (respond ONLY with one word):
-        Options: Invoice, RFQ, Complaint, Regulation, Other
-        Content: {content[:2000]}"""
-        
-        format_response = get_llm_classification(format_prompt).lower()
-        intent_response = get_llm_classification(intent_prompt)
-        
-        # Validate responses
-        valid_formats = {'pdf', 'json', 'email', 'text'}
-        valid_intents = {'Invoice', 'RFQ', 'Complaint', 'Regulation', 'Other'}
-        
-        format_response = format_response if format_response in valid_formats else 'text'
-        intent_response = intent_response if intent_response in valid_intents else 'Other'
-        
-        return {
-            "format": format_response,
-            "intent": intent_response,
-            "source": source
-        }
-    except Exception as e:
-        # Fallback to safe defaults if classification fails
-        return {
-            "format": "text",
-            "intent": "Other",
-            "source": source
-        }
+    return RULES.is_pdf_like(content.lower())
+
+VALID_FORMATS = {'pdf', 'json', 'email', 'text'}
+VALID_INTENTS = {'Invoice', 'RFQ', 'Complaint', 'Regulation', 'Other'}
+
+def validate_labels(source: str, format_label, intent_label) -> dict:
+    """Map raw LLM labels onto the allowed format/intent values"""
+    valid_formats = VALID_FORMATS
+    valid_intents = {intent.lower(): intent for intent in VALID_INTENTS}
+
+    format_label = str(format_label or "").strip().lower()
+    intent_label = str(intent_label or "").strip().lower()
+
+    return {
+        "format": format_label if format_label in valid_formats else 'text',
+        "intent": valid_intents.get(intent_label, 'Other'),
+        "source": source
+    }
+
+def normal_classification(source: str, content: str, mode: str = CLASSIFIER_MODE) -> dict:
+    """Standard LLM classification.
+
+    Unparseable answers map to text/Other, but API errors that persist after
+    the scheduler's retries are raised rather than turned into wrong labels.
+    """
+    if mode == "combined":
+        if _batcher is not None:
+            return _batcher.classify(source, content)
+        return combined_classification(source, content)
+
+    content = compact(content, CLASSIFIER_TOKEN_BUDGET, "classifier")
+    format_prompt = f"""Classify this content's format (respond ONLY with one word):
+    Options: pdf, json, email, text
+    Content: {content}"""
+    
+    intent_prompt = f"""Classify this content's intent (respond ONLY with one word):
+    Options: Invoice, RFQ, Complaint, Regulation, Other
+    Content: {content}"""
+    
+    # Both prompts are independent, so issue them concurrently
+    format_future = submit(get_llm_classification, format_prompt)
+    intent_response = get_llm_classification(intent_prompt)
+    format_response = format_future.result()
+    
+    return validate_labels(source, format_response, intent_response)
+
+def combined_classification(source: str, content: str) -> dict:
+    """Ask for format and intent together in a single structured LLM call"""
+    prompt = f"""Classify this content's format and intent.
+    Format options: pdf, json, email, text
+    Intent options: Invoice, RFQ, Complaint, Regulation, Other
+    Respond ONLY with JSON: {{"format": "<format>", "intent": "<intent>"}}
+    Content: {compact(content, CLASSIFIER_TOKEN_BUDGET, "classifier")}"""
 
-def get_llm_classification(prompt: str) -> str:
-    """Get single-word classification from LLM with error handling"""
     try:
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
+        labels = chat(
             messages=[{"role": "user", "content": prompt}],
             temperature=0.1,
-            max_tokens=10,
+            max_tokens=30,
+            response_format={"type": "json_object"},
+            agent="classifier",
+            parse=json.loads,
         )
-        return response.choices[0].message.content.strip()
-    except Exception:
-        return "Other"
\ No newline at end of file
+    except ValueError:
+        labels = {}
+    if not isinstance(labels, dict):
+        labels = {}
+    return validate_labels(source, labels.get("format"), labels.get("intent"))
+
+def batch_classification(items: list) -> list:
+    """Classify several (source, content) pairs with one LLM request.
+
+    Labels are mapped back by position id and validated per item; any item the
+    model skipped or mislabelled is retried on its own with a combined call.
+    """
+    if not items:
+        return []
+    if len(items) == 1:
+        return [combined_classification(*items[0])]
+
+    # The documents share one context window
+    per_document = min(CLASSIFIER_TOKEN_BUDGET, available_tokens(reserve=30 * len(items)) // len(items))
+    documents = "\n\n".join(
+        f"Document {index}:\n<<<\n{compact(content, per_document, 'classifier')}\n>>>"
+        for index, (_, content) in enumerate(items, start=1)
+    )
+    prompt = f"""Classify the format and intent of each document below.
+    Format options: pdf, json, email, text
+    Intent options: Invoice, RFQ, Complaint, Regulation, Other
+    Respond ONLY with JSON of the form
+    {{"results": [{{"id": 1, "format": "<format>", "intent": "<intent>"}}]}}
+    with exactly one entry per document.
+
+{documents}"""
+
+    try:
+        entries = chat(
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.1,
+            max_tokens=30 * len(items),
+            response_format={"type": "json_object"},
+            agent="classifier",
+            parse=json.loads,
+        ).get("results", [])
+    except (ValueError, AttributeError):
+        entries = []
+
+    labels_by_id = {}
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            labels_by_id[int(entry.get("id"))] = entry
+        except (AttributeError, TypeError, ValueError):
+            continue
+
+    results = []
+    for index, (source, content) in enumerate(items, start=1):
+        entry = labels_by_id.get(index)
+        if (entry is None
+                or str(entry.get("format", "")).strip().lower() not in VALID_FORMATS
+                or str(entry.get("intent", "")).strip().lower() not in {i.lower() for i in VALID_INTENTS}):
+            results.append(combined_classification(source, content))
+        else:
+            results.append(validate_labels(source, entry.get("format"), entry.get("intent")))
+    return results
+
+def classify_and_route_batch(items: list) -> list:
+    """Batch counterpart of classify_and_route for a list of (source, content) pairs"""
+    results = [None] * len(items)
+    pending = []
+    for position, (source, content) in enumerate(items):
+        heuristic = heuristic_classification(source, content)
+        if heuristic is not None:
+            results[position] = heuristic
+        else:
+            pending.append(position)
+
+    for offset in range(0, len(pending), CLASSIFIER_BATCH_SIZE):
+        positions = pending[offset:offset + CLASSIFIER_BATCH_SIZE]
+        labelled = batch_classification([items[position] for position in positions])
+        for position, classification in zip(positions, labelled):
+            results[position] = classification
+    return results
+
+class ClassificationBatcher:
+    """Coalesces concurrent classify requests into batched LLM calls.
+
+    Callers block in ``classify`` while a background thread gathers up to
+    ``batch_size`` requests (or whatever arrived within ``linger`` seconds)
+    and sends them through ``batch_classification``.
+    """
+    def __init__(self, batch_size: int = CLASSIFIER_BATCH_SIZE, linger: float = 0.05):
+        self.batch_size = batch_size
+        self.linger = linger
+        self.queue = queue.Queue()
+        # Flushes get their own small pool so they never wait behind work
+        # that is itself blocked on a classification result
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="classifier-batch")
+        self.thread = threading.Thread(target=self._run, name="classifier-batcher", daemon=True)
+        self.thread.start()
+
+    def classify(self, source: str, content: str) -> dict:
+        future = Future()
+        self.queue.put((source, content, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.executor.submit(self._flush, batch)
+
+    def _flush(self, batch: list):
+        try:
+            results = batch_classification([(source, content) for source, content, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), classification in zip(batch, results):
+            future.set_result(classification)
+
+_batcher = None
+
+def enable_batching(batch_size: int = CLASSIFIER_BATCH_SIZE, linger: float = 0.05):
+    """Route concurrent combined-mode classifications through a shared batcher"""
+    global _batcher
+    _batcher = ClassificationBatcher(batch_size, linger)
+
+def get_llm_classification(prompt: str) -> str:
+    """Get a single-word classification from the LLM; API errors propagate"""
+    response = chat(
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.1,
+        max_tokens=10,
+        agent="classifier",
+    )
+    return response.strip()
\ No newline at end of file
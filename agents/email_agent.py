@@ -1,73 +1,87 @@
-from groq import Groq
-import os
-import json
-import re
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from config import EMAIL_TOKEN_BUDGET, EMAIL_ATTACHMENT_CONCURRENCY
+from llm_gateway import chat_json
+from agents.json_agent import process_json
+from agents.pdf_agent import process_pdf
+from utils.email_parse import parse_email
+from utils.text_budget import compact, describe
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+def process_email(content, conversation_id: str, memory, on_token=None) -> dict:
+    """Process email content with improved entity extraction.
 
-def process_email(content: str, conversation_id: str, memory) -> dict:
-    """Process email content with improved entity extraction"""
+    Headers are read with the stdlib ``email`` parser, so only the decoded
+    text body is sent to the model, cleaned of quoted replies and boilerplate
+    and cut to EMAIL_TOKEN_BUDGET tokens. PDF and JSON attachments are processed
+    concurrently by their agents, each in a child conversation of its own
+    (see ``attachment_conversation_id``), and reported under "Attachments"
+    with a link to it, so their writes never mix with the email's state. An
+    attachment that fails is reported with its error instead of its result.
+
+    Pass ``on_token`` to receive the model output incrementally while it is
+    generated; the final JSON is parsed and standardized the same way.
+    """
     try:
-        # Pre-process email content
-        clean_content = re.sub(r'\n{3,}', '\n\n', content.strip())
-        
-        prompt = f"""
-        Extract structured information from this email:
-        {{
-            "Sender": {{
-                "name": "extracted from signature or from address",
-                "email": "from address"
-            }},
-            "Recipient": "to address",
-            "Subject": "email subject",
-            "KeyDates": ["list of important dates"],
-            "Urgency": "low/medium/high",
-            "ActionItems": ["list of requested actions"],
-            "Entities": {{
-                "Products": ["mentioned products"],
-                "Quantities": ["mentioned quantities"],
-                "Companies": ["mentioned organizations"]
-            }}
-        }}
+        parsed = parse_email(content)
+        headers = parsed["headers"]
+        budget_stats = {}
+        body = compact(parsed["body"], EMAIL_TOKEN_BUDGET, "email_agent", stats=budget_stats)
 
-        Email Content:
-        {clean_content[:10000]}
+        with ThreadPoolExecutor(max_workers=EMAIL_ATTACHMENT_CONCURRENCY) as pool:
+            # Attachments run while the body is being analyzed
+            attachment_futures = []
+            for index, attachment in enumerate(parsed["attachments"], start=1):
+                child_id = attachment_conversation_id(conversation_id, index)
+                future = pool.submit(contextvars.copy_context().run, process_attachment,
+                                     attachment, child_id, conversation_id, memory)
+                attachment_futures.append((attachment, child_id, future))
+            result = analyze_body(body, headers, on_token=on_token)
+            attachments = []
+            for attachment, child_id, future in attachment_futures:
+                try:
+                    attachments.append(describe_attachment(attachment, child_id, future.result()))
+                except Exception as e:
+                    # One broken attachment leaves the email and the other attachments intact
+                    attachments.append(describe_attachment(attachment, child_id, None,
+                                                           error=f"Attachment processing failed: {str(e)}"))
+
+        # Header fields are exact; the model only fills what they cannot give
+        sender = result.get("Sender", {})
+        if headers.get("from_email"):
+            sender = {
+                "name": headers["from_name"] or (sender.get("name", "") if isinstance(sender, dict) else ""),
+                "email": headers["from_email"]
+            }
 
-        Return ONLY valid JSON. Do not include any commentary or markdown formatting.
-        """
-        
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[
-                {"role": "system", "content": "You are a precise email parsing assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            response_format={"type": "json_object"},
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        
         # Standardize output format
         standardized = {
-            "Sender": result.get("Sender", {}),
-            "Recipient": result.get("Recipient", ""),
-            "Subject": result.get("Subject", ""),
+            "Sender": sender,
+            "Recipient": ", ".join(headers["to"]) if headers.get("to") else result.get("Recipient", ""),
+            "Subject": headers.get("subject") or result.get("Subject", ""),
+            "Date": headers.get("date"),
             "KeyDates": result.get("KeyDates", []),
             "Urgency": result.get("Urgency", "medium").lower(),
             "ActionItems": result.get("ActionItems", []),
             "Entities": result.get("Entities", {})
         }
-        
+        if attachments:
+            standardized["Attachments"] = attachments
+
+        steps = ["Email parsed", describe(budget_stats)]
+        if attachments:
+            processed = sum(1 for item in attachments if "agent" in item and "error" not in item)
+            steps.append(f"Processed {processed} of {len(attachments)} attachments")
+        steps.append("Email processed successfully")
+
         memory.append_to_conversation(
             conversation_id,
             {
                 "agent": "email_processor",
                 "results": standardized,
-                "processing_steps": ["Email processed successfully"]
+                "processing_steps": steps
             }
         )
-        
+
         return standardized
 
     except Exception as e:
@@ -80,4 +94,96 @@ def process_email(content: str, conversation_id: str, memory) -> dict:
                 "processing_steps": ["Email processing failed"]
             }
         )
-        return {"error": error_msg}
\ No newline at end of file
+        return {"error": error_msg}
+
+def analyze_body(body: str, headers: dict, on_token=None) -> dict:
+    """Ask the model for the fields that need reading the message text"""
+    if headers.get("from_email"):
+        # Sender, recipient and subject come from the headers
+        fields = """
+            "Sender": {
+                "name": "sender name from the signature"
+            },"""
+    else:
+        fields = """
+            "Sender": {
+                "name": "extracted from signature or from address",
+                "email": "from address"
+            },
+            "Recipient": "to address",
+            "Subject": "email subject","""
+
+    subject = f"\n        Subject: {headers['subject']}" if headers.get("subject") else ""
+    prompt = f"""
+        Extract structured information from this email:
+        {{{fields}
+            "KeyDates": ["list of important dates"],
+            "Urgency": "low/medium/high",
+            "ActionItems": ["list of requested actions"],
+            "Entities": {{
+                "Products": ["mentioned products"],
+                "Quantities": ["mentioned quantities"],
+                "Companies": ["mentioned organizations"]
+            }}
+        }}
+{subject}
+        Email Content:
+        {body}
+
+        Return ONLY valid JSON. Do not include any commentary or markdown formatting.
+        """
+
+    return chat_json(
+        messages=[
+            {"role": "system", "content": "You are a precise email parsing assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.1,
+        on_token=on_token,
+        agent="email_agent",
+    )
+
+def attachment_kind(attachment: dict) -> str:
+    """"pdf", "json" or None for attachments no agent handles"""
+    filename = attachment["filename"].lower()
+    content_type = attachment["content_type"]
+    if content_type == "application/pdf" or filename.endswith(".pdf"):
+        return "pdf"
+    if content_type == "application/json" or filename.endswith(".json"):
+        return "json"
+    return None
+
+def attachment_conversation_id(conversation_id: str, index: int) -> str:
+    """Id of the child conversation holding an email's ``index``-th attachment (from 1)"""
+    # No "/", so the id fits the API's document routes
+    return f"{conversation_id}-attachment-{index}"
+
+def process_attachment(attachment: dict, conversation_id: str, parent_id: str, memory):
+    kind = attachment_kind(attachment)
+    if kind is None:
+        return None
+    memory.append_to_conversation(conversation_id, {
+        "source": f"attachment:{attachment['filename']}",
+        "parent_conversation_id": parent_id
+    })
+    if kind == "pdf":
+        return process_pdf(attachment["data"], conversation_id, memory)
+    return process_json(attachment["data"].decode("utf-8", errors="ignore"), conversation_id, memory)
+
+def describe_attachment(attachment: dict, conversation_id: str, result, error: str = None) -> dict:
+    described = {
+        "filename": attachment["filename"],
+        "content_type": attachment["content_type"],
+        "size": len(attachment["data"])
+    }
+    kind = attachment_kind(attachment)
+    if kind is None:
+        described["skipped"] = "no agent for this attachment type"
+    else:
+        described["agent"] = kind
+        described["conversation_id"] = conversation_id
+        if error is None:
+            described["result"] = result
+        else:
+            described["error"] = error
+    return described
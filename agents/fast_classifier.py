@@ -0,0 +1,248 @@
+"""Local format/intent classifier trained from output_logs.
+
+Hashed character 3-grams and word unigrams feed two multinomial logistic
+regression heads (format and intent) trained with plain SGD, so neither
+training nor inference needs anything beyond the standard library. The
+model is a JSON file loaded once per process; classify_and_route consults it
+before the LLM and only escalates when its confidence is below
+FAST_CLASSIFIER_THRESHOLD.
+
+Train it from the conversation log:
+
+    python -m agents.fast_classifier train --log output_logs/log.jsonl --out models/fast_classifier.json
+"""
+import argparse
+import glob
+import gzip
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import zlib
+from collections import Counter
+
+from config import FAST_CLASSIFIER_ENABLED, FAST_CLASSIFIER_PATH, FAST_CLASSIFIER_THRESHOLD
+
+DIMENSIONS = 2 ** 18
+# Same prefix the store step keeps as original_content, so training and
+# inference see comparable text
+MAX_CHARS = 1000
+HEADS = ("format", "intent")
+_WORD = re.compile(r"[a-z0-9_$#@.]+")
+
+def extract_features(text: str, dimensions: int = DIMENSIONS) -> dict:
+    """Hashed, log-scaled and L2-normalized n-gram counts"""
+    text = text[:MAX_CHARS].lower()
+    counts = Counter()
+    for word in _WORD.findall(text):
+        counts[zlib.crc32(b"w:" + word.encode("utf-8")) % dimensions] += 1
+    for start in range(max(0, len(text) - 2)):
+        counts[zlib.crc32(b"c:" + text[start:start + 3].encode("utf-8")) % dimensions] += 1
+    features = {index: math.log1p(count) for index, count in counts.items()}
+    norm = math.sqrt(sum(value * value for value in features.values())) or 1.0
+    return {index: value / norm for index, value in features.items()}
+
+class SoftmaxHead:
+    """Sparse multinomial logistic regression over hashed features"""
+    def __init__(self, labels: list, weights: dict = None, bias: dict = None):
+        self.labels = list(labels)
+        self.weights = weights or {label: {} for label in self.labels}
+        self.bias = bias or {label: 0.0 for label in self.labels}
+
+    def probabilities(self, features: dict) -> dict:
+        scores = {}
+        for label in self.labels:
+            weights = self.weights[label]
+            scores[label] = self.bias[label] + sum(
+                weights.get(index, 0.0) * value for index, value in features.items()
+            )
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def update(self, features: dict, target: str, learning_rate: float, l2: float):
+        probabilities = self.probabilities(features)
+        for label in self.labels:
+            gradient = probabilities[label] - (1.0 if label == target else 0.0)
+            weights = self.weights[label]
+            for index, value in features.items():
+                weight = weights.get(index, 0.0)
+                weights[index] = weight - learning_rate * (gradient * value + l2 * weight)
+            self.bias[label] -= learning_rate * gradient
+
+    def to_dict(self) -> dict:
+        return {
+            "labels": self.labels,
+            "bias": self.bias,
+            "weights": {
+                label: {str(index): round(weight, 6) for index, weight in weights.items() if abs(weight) > 1e-6}
+                for label, weights in self.weights.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SoftmaxHead":
+        weights = {
+            label: {int(index): weight for index, weight in values.items()}
+            for label, values in data["weights"].items()
+        }
+        return cls(data["labels"], weights, data["bias"])
+
+class FastClassifier:
+    def __init__(self, heads: dict, dimensions: int = DIMENSIONS):
+        self.heads = heads
+        self.dimensions = dimensions
+
+    def predict(self, content: str) -> dict:
+        """Most likely format and intent, with confidence = the weaker head's probability"""
+        features = extract_features(content, self.dimensions)
+        prediction = {}
+        confidence = 1.0
+        for head_name, head in self.heads.items():
+            probabilities = head.probabilities(features)
+            label = max(probabilities, key=probabilities.get)
+            prediction[head_name] = label
+            confidence = min(confidence, probabilities[label])
+        prediction["confidence"] = confidence
+        return prediction
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": 1,
+                "dimensions": self.dimensions,
+                "heads": {name: head.to_dict() for name, head in self.heads.items()}
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> "FastClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        heads = {name: SoftmaxHead.from_dict(head) for name, head in data["heads"].items()}
+        return cls(heads, data.get("dimensions", DIMENSIONS))
+
+def train(examples: list, epochs: int = 8, learning_rate: float = 0.5, l2: float = 1e-6,
+          seed: int = 13) -> FastClassifier:
+    """Fit both heads on (text, format, intent) examples"""
+    featurized = [(extract_features(text), labels) for text, *labels in examples]
+    heads = {
+        name: SoftmaxHead(sorted({labels[position] for _, labels in featurized}))
+        for position, name in enumerate(HEADS)
+    }
+    rng = random.Random(seed)
+    for epoch in range(epochs):
+        rng.shuffle(featurized)
+        rate = learning_rate / (1 + epoch)
+        for features, labels in featurized:
+            for position, name in enumerate(HEADS):
+                heads[name].update(features, labels[position], rate, l2)
+    return FastClassifier(heads)
+
+def iter_log_entries(patterns: list):
+    """Yield entries from JSONL logs, including gzipped rotated segments"""
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+def load_examples(patterns: list) -> list:
+    """Join each conversation's stored content with its classification"""
+    contents = {}
+    labels = {}
+    for entry in iter_log_entries(patterns):
+        conversation_id = entry.get("conversation_id")
+        data = entry.get("data")
+        if not isinstance(data, dict):
+            continue
+        if isinstance(data.get("original_content"), str):
+            contents[conversation_id] = data["original_content"]
+        classification = data.get("classification")
+        if isinstance(classification, dict) and classification.get("format"):
+            labels[conversation_id] = (classification["format"], classification.get("intent", "Other"))
+    return [
+        (contents[conversation_id], format_label, intent)
+        for conversation_id, (format_label, intent) in labels.items()
+        if conversation_id in contents
+    ]
+
+_model = None
+_model_lock = threading.Lock()
+_model_loaded = False
+
+def get_model():
+    """The trained model, loaded once per process; None if none is available"""
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                if FAST_CLASSIFIER_ENABLED and os.path.exists(FAST_CLASSIFIER_PATH):
+                    _model = FastClassifier.load(FAST_CLASSIFIER_PATH)
+                _model_loaded = True
+    return _model
+
+def evaluate(model: FastClassifier, examples: list, threshold: float) -> dict:
+    covered = correct = correct_covered = 0
+    for text, format_label, intent in examples:
+        prediction = model.predict(text)
+        hit = prediction["format"] == format_label and prediction["intent"] == intent
+        correct += hit
+        if prediction["confidence"] >= threshold:
+            covered += 1
+            correct_covered += hit
+    total = len(examples) or 1
+    return {
+        "accuracy": correct / total,
+        "fast_path_share": covered / total,
+        "fast_path_accuracy": correct_covered / covered if covered else 0.0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the local fast-path classifier from output logs.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    train_parser = subcommands.add_parser("train", help="Fit a model from logged classifications")
+    train_parser.add_argument("--log", action="append", default=None,
+                              help="Log file or glob (repeatable); defaults to output_logs/log*.jsonl*")
+    train_parser.add_argument("--out", default=FAST_CLASSIFIER_PATH)
+    train_parser.add_argument("--epochs", type=int, default=8)
+    train_parser.add_argument("--holdout", type=float, default=0.1, help="Share of examples kept for evaluation")
+    train_parser.add_argument("--threshold", type=float, default=None, help="Confidence threshold to report on")
+    train_parser.add_argument("--min-examples", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    threshold = FAST_CLASSIFIER_THRESHOLD if args.threshold is None else args.threshold
+    examples = load_examples(args.log or ["output_logs/log*.jsonl*"])
+    if len(examples) < args.min_examples:
+        print(f"Only {len(examples)} labelled examples found; need at least {args.min_examples}", file=sys.stderr)
+        return 1
+
+    random.Random(7).shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout))
+    training, holdout = examples[:split], examples[split:]
+    model = train(training, epochs=args.epochs)
+    single_label = [name for name, head in model.heads.items() if len(head.labels) < 2]
+    if single_label:
+        # A one-label head would be "certain" about everything
+        print(f"Training data has a single label for: {', '.join(single_label)}", file=sys.stderr)
+        return 1
+
+    model.save(args.out)
+    print(f"Trained on {len(training)} examples, saved to {args.out}")
+    if holdout:
+        metrics = evaluate(model, holdout, threshold)
+        print(f"Holdout ({len(holdout)}): accuracy {metrics['accuracy']:.3f}, "
+              f"fast path {metrics['fast_path_share']:.1%} at threshold {threshold} "
+              f"with accuracy {metrics['fast_path_accuracy']:.3f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
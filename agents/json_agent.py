@@ -1,66 +1,58 @@
-from groq import Groq
-import os
 import json
+from config import JSON_SCHEMAS_PATH, JSON_LLM_ENHANCEMENTS, JSON_ENHANCE_TOKEN_BUDGET
+from llm_gateway import chat_json
+from agents.json_schemas import SchemaRegistry
+from utils.text_budget import estimate_tokens, fit, describe
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+SCHEMAS = SchemaRegistry.from_file(JSON_SCHEMAS_PATH)
 
-def process_json(content: str, conversation_id: str, memory) -> dict:
-    """Process JSON content with robust validation"""
+def process_json(content: str, conversation_id: str, memory, on_token=None, intent: str = None,
+                 enhance: bool = JSON_LLM_ENHANCEMENTS) -> dict:
+    """Process JSON content with robust validation.
+
+    ``validation`` is computed locally against the schema for the classified
+    ``intent`` (or the one the document matches), so no model call is needed.
+    With ``enhance`` the model is asked for the ``enhancements`` section and
+    given the document re-serialized without whitespace; pass ``on_token`` to
+    receive its output incrementally while it is generated.
+    """
     try:
         # First validate basic JSON structure
         data = json.loads(content)
-        
-        prompt = f"""
-        Analyze this JSON document:
-        {{
-            "validation": {{
-                "missing_fields": ["list of expected but missing fields"],
-                "anomalies": ["list of data anomalies"]
-            }},
-            "enhancements": {{
-                "suggested_fields": ["list of recommended additional fields"],
-                "normalization": ["suggested data formatting improvements"]
-            }}
-        }}
 
-        JSON Content:
-        {content}
+        schema = SCHEMAS.select(data, intent)
+        if schema is not None:
+            validation = schema.validate(data)
+            steps = [f"Validated against the {schema.intent} schema"]
+        else:
+            validation = {"missing_fields": [], "anomalies": []}
+            steps = ["No schema matched; checked JSON structure only"]
 
-        Rules:
-        1. For invoices: expect 'id', 'type', 'amount', 'currency', 'date', 'due_date'
-        2. For RFQs: expect 'items', 'delivery_date', 'payment_terms'
-        3. Return empty arrays if nothing is missing/anomalous
+        enhancements = {"suggested_fields": [], "normalization": []}
+        if enhance:
+            budget_stats = {}
+            compacted = fit(json.dumps(data, separators=(",", ":"), ensure_ascii=False),
+                            JSON_ENHANCE_TOKEN_BUDGET, "json_agent", raw_tokens=estimate_tokens(content),
+                            stats=budget_stats)
+            enhancements = suggest_enhancements(compacted, on_token=on_token)
+            steps.extend([describe(budget_stats), "Enhancements suggested by the model"])
 
-        Return ONLY valid JSON. Do not include commentary or markdown formatting.
-        """
-        
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[
-                {"role": "system", "content": "You are a precise JSON validator."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            response_format={"type": "json_object"},
-        )
-        
-        analysis = json.loads(response.choices[0].message.content)
-        
         result = {
             "original": data,
-            "validation": analysis.get("validation", {}),
-            "enhancements": analysis.get("enhancements", {})
+            "validation": validation,
+            "enhancements": enhancements
         }
-        
+        steps.append("JSON processed successfully")
+
         memory.append_to_conversation(
             conversation_id,
             {
                 "agent": "json_processor",
                 "results": result,
-                "processing_steps": ["JSON processed successfully"]
+                "processing_steps": steps
             }
         )
-        
+
         return result
 
     except json.JSONDecodeError as e:
@@ -84,4 +76,37 @@ def process_json(content: str, conversation_id: str, memory) -> dict:
                 "processing_steps": ["JSON processing failed"]
             }
         )
-        return {"error": error_msg}
\ No newline at end of file
+        return {"error": error_msg}
+
+def suggest_enhancements(content: str, on_token=None) -> dict:
+    """Ask the model for recommended fields and formatting improvements"""
+    prompt = f"""
+        Suggest improvements for this JSON document:
+        {{
+            "enhancements": {{
+                "suggested_fields": ["list of recommended additional fields"],
+                "normalization": ["suggested data formatting improvements"]
+            }}
+        }}
+
+        JSON Content:
+        {content}
+
+        Return empty arrays if nothing should change.
+        Return ONLY valid JSON. Do not include commentary or markdown formatting.
+        """
+
+    analysis = chat_json(
+        messages=[
+            {"role": "system", "content": "You are a precise JSON validator."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.1,
+        on_token=on_token,
+        agent="json_agent",
+    )
+    enhancements = analysis.get("enhancements", {})
+    return {
+        "suggested_fields": enhancements.get("suggested_fields", []),
+        "normalization": enhancements.get("normalization", [])
+    }
@@ -0,0 +1,149 @@
+"""Declarative per-intent schemas for JSON documents.
+
+Schemas live in a JSON file keyed by intent. Each lists ``required`` fields,
+per-field constraints under ``fields`` (``type``, ``pattern``, ``format``,
+``minimum``, ``min_items``) and ``ordered`` pairs of date fields that must not
+run backwards. They are compiled once into plain check functions, so
+validating a document is a handful of dict lookups and ``isinstance`` calls.
+"""
+import json
+import re
+from datetime import date, datetime
+
+_EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+def _parse_email(value: str):
+    if not _EMAIL.fullmatch(value):
+        raise ValueError(value)
+
+def _parse_date_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def _parse_date(value: str) -> date:
+    """A date, or the date of a complete date-time; trailing junk is an error"""
+    if len(value) > 10:
+        return _parse_date_time(value).date()
+    return date.fromisoformat(value)
+
+FORMATS = {
+    "date": _parse_date,
+    "date-time": _parse_date_time,
+    "email": _parse_email,
+}
+
+def _type_name(value) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return "null" if value is None else type(value).__name__
+
+def _compile_field(field: str, spec: dict) -> list:
+    checks = []
+    if "type" in spec:
+        names = spec["type"] if isinstance(spec["type"], list) else [spec["type"]]
+        expected = " or ".join(names)
+
+        def check_type(value, names=names, expected=expected):
+            name = _type_name(value)
+            # Integers are numbers too
+            if name not in names and not (name == "integer" and "number" in names):
+                return f"{field}: expected {expected}, got {name}"
+        checks.append(check_type)
+    if "pattern" in spec:
+        pattern = re.compile(spec["pattern"])
+
+        def check_pattern(value, pattern=pattern):
+            if isinstance(value, str) and not pattern.search(value):
+                return f"{field}: '{value}' does not match {pattern.pattern}"
+        checks.append(check_pattern)
+    if "format" in spec:
+        parse = FORMATS[spec["format"]]
+
+        def check_format(value, parse=parse, name=spec["format"]):
+            if isinstance(value, str):
+                try:
+                    parse(value)
+                except ValueError:
+                    return f"{field}: '{value}' is not a valid {name}"
+        checks.append(check_format)
+    if "minimum" in spec:
+        def check_minimum(value, minimum=spec["minimum"]):
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and value < minimum:
+                return f"{field}: {value} is below the minimum {minimum}"
+        checks.append(check_minimum)
+    if "min_items" in spec:
+        def check_min_items(value, minimum=spec["min_items"]):
+            if isinstance(value, list) and len(value) < minimum:
+                return f"{field}: expected at least {minimum} item(s), got {len(value)}"
+        checks.append(check_min_items)
+    return checks
+
+class Schema:
+    def __init__(self, intent: str, spec: dict):
+        self.intent = intent
+        self.required = tuple(spec.get("required", []))
+        self.fields = {
+            field: _compile_field(field, field_spec)
+            for field, field_spec in spec.get("fields", {}).items()
+        }
+        self.ordered = [tuple(pair) for pair in spec.get("ordered", [])]
+
+    def validate(self, data) -> dict:
+        """``missing_fields`` and ``anomalies`` for one parsed document"""
+        if not isinstance(data, dict):
+            return {"missing_fields": list(self.required),
+                    "anomalies": [f"expected a JSON object, got {_type_name(data)}"]}
+
+        missing = [field for field in self.required if data.get(field) in (None, "")]
+        anomalies = []
+        for field, checks in self.fields.items():
+            value = data.get(field)
+            if value is None:
+                continue
+            for check in checks:
+                problem = check(value)
+                if problem:
+                    anomalies.append(problem)
+                    break
+        for earlier, later in self.ordered:
+            try:
+                if _parse_date(str(data[later])) < _parse_date(str(data[earlier])):
+                    anomalies.append(f"{later} ({data[later]}) is before {earlier} ({data[earlier]})")
+            except (KeyError, ValueError):
+                continue
+        return {"missing_fields": missing, "anomalies": anomalies}
+
+class SchemaRegistry:
+    def __init__(self, schemas: dict):
+        self.schemas = {intent: Schema(intent, spec) for intent, spec in schemas.items()}
+        self.by_name = {intent.lower(): schema for intent, schema in self.schemas.items()}
+
+    @classmethod
+    def from_file(cls, path: str) -> "SchemaRegistry":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def select(self, data, intent: str = None):
+        """Schema for the classified intent, else the one the document names or fits best"""
+        if intent and intent.lower() in self.by_name:
+            return self.by_name[intent.lower()]
+        if not isinstance(data, dict):
+            return None
+        declared = data.get("type")
+        if isinstance(declared, str) and declared.lower() in self.by_name:
+            return self.by_name[declared.lower()]
+        best, best_hits = None, 0
+        for schema in self.schemas.values():
+            hits = sum(1 for field in schema.required if field in data)
+            if hits > best_hits:
+                best, best_hits = schema, hits
+        return best
@@ -1,68 +1,97 @@
-from groq import Groq
-import os
 import json
-import PyPDF2
-from io import BytesIO
 import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    PDF_CHAR_BUDGET,
+    PDF_TOKEN_BUDGET,
+    PDF_ANALYSIS_MODE,
+    PDF_CHUNK_CHARS,
+    PDF_CHUNK_CONCURRENCY,
+    PDF_MAX_CHUNKS,
+)
+from llm_gateway import chat_json
+from utils.pdf_extract import extract_pdf_text
+from utils.text_budget import clean_pages, clean_text, describe, estimate_tokens, fit, record_savings
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+def process_pdf(content, conversation_id: str, memory, char_budget: int = PDF_CHAR_BUDGET,
+                mode: str = PDF_ANALYSIS_MODE, on_token=None, extraction: dict = None) -> dict:
+    """Process PDF content (pasted text, or PDF bytes / path / file object).
 
-def process_pdf(content: str | bytes, conversation_id: str, memory) -> dict:
-    """Process PDF content (either binary or text)"""
+    ``char_budget`` caps the raw characters extracted; ``None`` extracts the
+    whole document, fanning page extraction out to worker processes for long
+    PDFs. The text is cleaned of whitespace noise and running headers/footers
+    before it is measured in tokens. ``mode`` selects how text beyond the
+    prompt window is handled: "truncate" analyzes only the first
+    PDF_TOKEN_BUDGET tokens, "chunked" always maps the document in chunks and
+    merges the results, and "auto" chunks only when it must.
+    ``on_token`` streams the model output of single-call analyses.
+    ``extraction`` is an ``extract_pdf_text`` result for ``content`` made
+    with the same budget, when the caller already read the document.
+    """
     try:
-        # Handle both string (pasted) and bytes (uploaded) input
+        chunked = mode in ("chunked", "auto")
+        if chunked:
+            char_budget = None
+
+        # Handle both string (pasted) and binary (uploaded) input
         if isinstance(content, str):
+            extraction = None
             text = content
+            pages = None
             is_pasted_text = True
         else:
-            with BytesIO(content) as pdf_file:
-                reader = PyPDF2.PdfReader(pdf_file)
-                text = "\n".join(page.extract_text() for page in reader.pages)
+            if extraction is None:
+                # Only pages that can reach the prompt are extracted
+                extraction = extract_pdf_text(content, char_budget=char_budget)
+            extraction = dict(extraction)
+            text = extraction.pop("text")
+            pages = extraction.pop("pages")
             is_pasted_text = False
 
         if not text.strip():
             raise ValueError("No extractable content found")
 
         # Store metadata
-        memory.append_to_conversation(
-            conversation_id,
-            {
-                "pdf_text_sample": text[:1000] + "..." if len(text) > 1000 else text,
-                "is_pasted_text": is_pasted_text,
-                "processing_steps": ["PDF content extracted"]
-            }
-        )
+        metadata = {
+            "pdf_text_sample": text[:1000] + "..." if len(text) > 1000 else text,
+            "is_pasted_text": is_pasted_text,
+            "processing_steps": ["PDF content extracted"]
+        }
+        if extraction is not None:
+            metadata["extraction"] = extraction
+        memory.append_to_conversation(conversation_id, metadata)
+
+        raw_tokens = estimate_tokens(text)
+        if pages is not None:
+            sections = clean_pages(pages)
+            cleaned = "\n".join(sections)
+        else:
+            cleaned = clean_text(text)
+            sections = None
+        cleaned_tokens = estimate_tokens(cleaned)
+        budget_stats = {}
+
+        if chunked and (mode == "chunked" or cleaned_tokens > PDF_TOKEN_BUDGET):
+            chunks = split_into_chunks(sections if sections is not None else split_sections(cleaned), PDF_CHUNK_CHARS)
+            result = analyze_chunks(chunks[:PDF_MAX_CHUNKS], is_pasted_text)
+            record_savings("pdf_agent", raw_tokens, cleaned_tokens,
+                           sum(estimate_tokens(chunk) for chunk in chunks[:PDF_MAX_CHUNKS]), budget_stats)
+            steps = [describe(budget_stats), f"PDF analysis completed across {min(len(chunks), PDF_MAX_CHUNKS)} chunks"]
+            if len(chunks) > PDF_MAX_CHUNKS:
+                steps.append(f"Skipped {len(chunks) - PDF_MAX_CHUNKS} chunks beyond PDF_MAX_CHUNKS")
+        else:
+            prompt_text = fit(cleaned, PDF_TOKEN_BUDGET, "pdf_agent", raw_tokens=raw_tokens,
+                              cleaned_tokens=cleaned_tokens, stats=budget_stats)
+            result = analyze_text(prompt_text, is_pasted_text, on_token=on_token)
+            steps = [describe(budget_stats), "PDF analysis completed"]
 
-        # Analyze content
-        prompt = f"""
-        Analyze this {'pasted text' if is_pasted_text else 'PDF document'}:
-        1. Document type (invoice, contract, report, etc.)
-        2. Key entities (names, dates, amounts)
-        3. Anomalies or special formatting
-        
-        Return JSON with:
-        - document_type: string
-        - key_entities: dict
-        - anomalies: array
-        
-        Content:
-        {text[:15000]}
-        """
-        
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            response_format={"type": "json_object"},
-        )
-        
-        result = json.loads(response.choices[0].message.content)
         memory.append_to_conversation(
             conversation_id,
             {
                 "agent": "pdf_processor",
                 "results": result,
-                "processing_steps": ["PDF analysis completed"]
+                "processing_steps": steps
             }
         )
         
@@ -78,4 +107,136 @@ def process_pdf(content: str | bytes, conversation_id: str, memory) -> dict:
                 "processing_steps": ["PDF processing failed"]
             }
         )
-        return {"error": error_msg}
\ No newline at end of file
+        return {"error": error_msg}
+
+def analyze_text(text: str, is_pasted_text: bool, part: int = None, parts: int = None,
+                 on_token=None) -> dict:
+    """Run the analysis prompt over one piece of text"""
+    scope = ""
+    if part is not None:
+        scope = f"\n        This is part {part} of {parts} of the document; report only what appears in this part.\n"
+
+    prompt = f"""
+        Analyze this {'pasted text' if is_pasted_text else 'PDF document'}:
+        1. Document type (invoice, contract, report, etc.)
+        2. Key entities (names, dates, amounts)
+        3. Anomalies or special formatting
+        {scope}
+        Return JSON with:
+        - document_type: string
+        - key_entities: dict
+        - anomalies: array
+        
+        Content:
+        {text}
+        """
+    
+    return chat_json(
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.1,
+        on_token=on_token,
+        agent="pdf_agent",
+    )
+
+def split_sections(text: str) -> list:
+    """Split pasted text on blank lines so chunks end at section boundaries"""
+    return [section for section in re.split(r"\n\s*\n", text) if section.strip()]
+
+def split_into_chunks(sections: list, max_chars: int) -> list:
+    """Greedily pack pages/sections into chunks of at most ``max_chars``"""
+    chunks = []
+    current = []
+    size = 0
+    for section in sections:
+        # A single oversized page is cut at line breaks, or hard-cut if it has none
+        pieces = [section] if len(section) <= max_chars else _split_long(section, max_chars)
+        for piece in pieces:
+            if current and size + len(piece) + 1 > max_chars:
+                chunks.append("\n".join(current))
+                current = []
+                size = 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _split_long(text: str, max_chars: int) -> list:
+    pieces = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > max_chars:
+            # The lines gathered so far come first
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+def analyze_chunks(chunks: list, is_pasted_text: bool) -> dict:
+    """Map: analyze chunks concurrently. Reduce: merge into one result"""
+    with ThreadPoolExecutor(max_workers=PDF_CHUNK_CONCURRENCY) as pool:
+        futures = [
+            pool.submit(analyze_text, chunk, is_pasted_text, index, len(chunks))
+            for index, chunk in enumerate(chunks, start=1)
+        ]
+        results = [future.result() for future in futures]
+    return merge_results(results)
+
+def merge_results(results: list) -> dict:
+    """Combine per-chunk analyses into the single-call result schema"""
+    document_types = [
+        str(result.get("document_type")).strip() for result in results
+        if isinstance(result, dict) and result.get("document_type")
+    ]
+    key_entities = {}
+    anomalies = []
+    seen_anomalies = set()
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        entities = result.get("key_entities")
+        if isinstance(entities, dict):
+            key_entities = _merge_values(key_entities, entities)
+        for anomaly in result.get("anomalies") or []:
+            marker = json.dumps(anomaly, sort_keys=True, default=str)
+            if marker not in seen_anomalies:
+                seen_anomalies.add(marker)
+                anomalies.append(anomaly)
+
+    # The most common label wins (case-insensitively); ties go to the earliest chunk
+    document_type = ""
+    if document_types:
+        winner = Counter(label.lower() for label in document_types).most_common(1)[0][0]
+        document_type = next(label for label in document_types if label.lower() == winner)
+
+    return {
+        "document_type": document_type,
+        "key_entities": key_entities,
+        "anomalies": anomalies
+    }
+
+def _merge_values(existing, incoming):
+    if isinstance(existing, dict) and isinstance(incoming, dict):
+        merged = dict(existing)
+        for key, value in incoming.items():
+            merged[key] = _merge_values(merged[key], value) if key in merged else value
+        return merged
+    existing_items = existing if isinstance(existing, list) else [existing]
+    incoming_items = incoming if isinstance(incoming, list) else [incoming]
+    merged = list(existing_items)
+    for item in incoming_items:
+        if item not in merged:
+            merged.append(item)
+    # Identical scalars from several chunks stay scalars
+    if not isinstance(existing, list) and not isinstance(incoming, list) and len(merged) == 1:
+        return merged[0]
+    return merged
@@ -0,0 +1,83 @@
+"""Compiled heuristic rules for the classifier.
+
+The rules (document JSON keys, intent keywords and PDF structure patterns)
+live in a JSON file and are compiled once when the engine is built. A call to
+``RuleEngine.classify`` parses JSON at most once, lowercases the text once and
+only evaluates the rules the decision actually needs:
+
+* keywords are plain substrings, checked against the lowercased text with the
+  interpreter's native substring search, and each distinct keyword is looked
+  up at most once per document even if several rule sets share it;
+* each structure regex may declare ``requires_any`` literals; the regex only
+  runs when one of them occurs in the text, so unrelated documents never pay
+  for a backtracking scan.
+"""
+import json
+import re
+
+INTENT_RULE_SETS = ("json_intents", "pdf_intents")
+
+class RuleEngine:
+    def __init__(self, rules: dict):
+        self.document_json_keys = frozenset(rules.get("document_json_keys", []))
+        self.intents = {
+            rule_set: [
+                (rule["intent"], tuple(keyword.lower() for keyword in rule.get("keywords", [])))
+                for rule in rules.get(rule_set, [])
+            ]
+            for rule_set in INTENT_RULE_SETS
+        }
+        self.structure_rules = []
+        for rule in rules.get("pdf_structure_patterns", []):
+            if isinstance(rule, str):
+                rule = {"pattern": rule}
+            self.structure_rules.append((
+                re.compile(rule["pattern"], re.IGNORECASE),
+                tuple(literal.lower() for literal in rule.get("requires_any", [])),
+            ))
+
+    @classmethod
+    def from_file(cls, path: str) -> "RuleEngine":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def parse_document_json(self, content: str):
+        """Return the parsed dict if content is document-like JSON, else None"""
+        # Only a JSON object can qualify, so skip the parse for anything else
+        if not content.lstrip().startswith("{"):
+            return None
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return None
+        if isinstance(data, dict) and not self.document_json_keys.isdisjoint(data):
+            return data
+        return None
+
+    def intent(self, rule_set: str, lowered: str, seen: dict = None) -> str:
+        """First intent of the rule set (in file order) with a keyword present"""
+        seen = {} if seen is None else seen
+        for intent, keywords in self.intents[rule_set]:
+            for keyword in keywords:
+                if keyword not in seen:
+                    seen[keyword] = keyword in lowered
+                if seen[keyword]:
+                    return intent
+        return "Other"
+
+    def is_pdf_like(self, lowered: str) -> bool:
+        for pattern, requires_any in self.structure_rules:
+            if requires_any and not any(literal in lowered for literal in requires_any):
+                continue
+            if pattern.search(lowered):
+                return True
+        return False
+
+    def classify(self, content: str):
+        """Return (format, intent) when a heuristic rule applies, else None"""
+        lowered = content.lower()
+        if self.parse_document_json(content) is not None:
+            return "json", self.intent("json_intents", lowered)
+        if self.is_pdf_like(lowered):
+            return "pdf", self.intent("pdf_intents", lowered)
+        return None
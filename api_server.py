@@ -0,0 +1,397 @@
+"""HTTP API for submitting documents to the pipeline from other systems.
+
+Usage:
+    python api_server.py --port 8080 --workers 8
+
+Endpoints:
+    POST   /v1/documents              multipart/form-data ("file" field) or JSON:
+                                      {"content": "..."} or {"file_name": "a.pdf", "content_base64": "..."},
+                                      optional "source". ?mode=sync (default) answers with the result,
+                                      ?mode=async answers 202 at once; ?stream=1 streams the agent output
+    GET    /v1/documents/{id}         status, classification and result
+    GET    /v1/documents/{id}/events  server-sent events: status, token, result
+    DELETE /v1/documents/{id}         cancel a queued or running document
+    GET    /healthz                   job queue metrics
+    GET    /metrics                   Prometheus metrics
+
+Connections are served by one asyncio event loop, so thousands of waiting
+clients cost no threads. Documents run on the ``JobQueue`` worker pool
+(JOB_WORKERS) through the same pipeline, agents and memory as the app; when
+JOB_QUEUE_MAX_DEPTH documents are waiting, submissions get 503 with
+Retry-After. A sync request still waiting after API_SYNC_TIMEOUT gets 202
+and can be polled.
+
+Agents only stream their output (which Groq cannot combine with JSON mode)
+when it has a reader: the submission asked for ``stream=1``, or an events
+subscriber connected while the document was still queued. Everything else
+runs on the non-streamed JSON-mode path. Bodies over API_MAX_BODY_BYTES are refused with 413
+before they are read.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import re
+import sys
+from email import policy
+from email.parser import BytesParser
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import telemetry
+from config import (
+    API_HOST,
+    API_PORT,
+    API_MAX_BODY_BYTES,
+    API_MAX_HEADER_BYTES,
+    API_SYNC_TIMEOUT,
+    API_READ_TIMEOUT,
+    API_EVENT_INTERVAL,
+    JOB_WORKERS,
+)
+from job_queue import JobQueue, QueueFullError, SUCCEEDED, FAILED, CANCELLED, TIMED_OUT
+from memory.shared_memory import ThreadSafeSharedMemory, create_memory
+from pipeline import SUPPORTED_EXTENSIONS, prepare_content
+
+_DOCUMENT = re.compile(r"^/v1/documents/([\w-]+)(/events)?$")
+# Sync response status by job outcome
+_OUTCOME_STATUS = {SUCCEEDED: 200, FAILED: 422, TIMED_OUT: 504, CANCELLED: 409}
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+class Request:
+    def __init__(self, method: str, target: str, version: str, headers: dict, body: bytes = b""):
+        self.method = method
+        self.version = version
+        self.headers = headers
+        self.body = body
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+async def read_request(reader: asyncio.StreamReader, max_body: int):
+    """The next request on a connection, or None once the client closed it"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), API_READ_TIMEOUT)
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise HTTPError(400, "Incomplete request")
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, f"Request headers exceed {API_MAX_HEADER_BYTES} bytes")
+    except asyncio.TimeoutError:
+        return None
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    if "transfer-encoding" in headers:
+        raise HTTPError(411, "Chunked bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > max_body:
+        raise HTTPError(413, f"Request body exceeds {max_body} bytes")
+    body = b""
+    if length:
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), API_READ_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+            raise HTTPError(400, "Incomplete request body")
+    return Request(method.upper(), target, version, headers, body)
+
+def encode_response(status: int, body, headers: dict = None, keep_alive: bool = True) -> bytes:
+    payload = json.dumps(body, default=str).encode("utf-8") if not isinstance(body, bytes) else body
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+             f"Content-Length: {len(payload)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    headers = {"Content-Type": "application/json", **(headers or {})}
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+def parse_submission(request: Request) -> tuple:
+    """(source, file_name, data) of a submission; ``file_name`` is None for plain text"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + request.body
+        )
+        if not message.is_multipart():
+            raise HTTPError(400, "Malformed multipart body")
+        fields, upload = {}, None
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file" and part.get_filename():
+                upload = (part.get_filename(), part.get_payload(decode=True) or b"")
+            elif name:
+                fields[name] = (part.get_payload(decode=True) or b"").decode("utf-8", errors="ignore")
+        if upload is not None:
+            return fields.get("source") or f"api:{upload[0]}", upload[0], upload[1]
+        if fields.get("content"):
+            return fields.get("source") or "api:text_input", None, fields["content"]
+        raise HTTPError(400, 'Expected a "file" or "content" field')
+
+    if content_type.startswith("application/json"):
+        try:
+            payload = json.loads(request.body)
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON body: {e}")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Expected a JSON object")
+        file_name = payload.get("file_name")
+        if payload.get("content_base64") is not None:
+            if not file_name:
+                raise HTTPError(400, '"content_base64" needs a "file_name"')
+            try:
+                data = base64.b64decode(payload["content_base64"], validate=True)
+            except (binascii.Error, TypeError):
+                raise HTTPError(400, '"content_base64" is not valid base64')
+            return payload.get("source") or f"api:{file_name}", file_name, data
+        if isinstance(payload.get("content"), str) and payload["content"].strip():
+            if file_name:
+                return payload.get("source") or f"api:{file_name}", file_name, payload["content"].encode("utf-8")
+            return payload.get("source") or "api:text_input", None, payload["content"]
+        raise HTTPError(400, 'Expected "content" or "content_base64"')
+
+    raise HTTPError(415, "Send multipart/form-data or application/json")
+
+class APIServer:
+    def __init__(self, jobs: JobQueue, max_body: int = API_MAX_BODY_BYTES,
+                 sync_timeout: float = API_SYNC_TIMEOUT):
+        self.jobs = jobs
+        self.memory = jobs.memory
+        self.max_body = max_body
+        self.sync_timeout = sync_timeout
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader, self.max_body)
+                except HTTPError as e:
+                    # The rest of the request was not read, so the connection can't be reused
+                    telemetry.inc("api_requests_total", route="invalid", status=str(e.status))
+                    writer.write(encode_response(e.status, {"error": e.message}, e.headers, keep_alive=False))
+                    await writer.drain()
+                    return
+                if request is None:
+                    return
+                if not await self.respond(request, writer):
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """Answer one request; False when the connection should be closed"""
+        route = "unknown"
+        try:
+            match = _DOCUMENT.match(request.path)
+            if request.path == "/v1/documents" and request.method == "POST":
+                route = "submit"
+                status, body, headers = await self.submit(request)
+            elif match and match.group(2) and request.method == "GET":
+                route = "events"
+                telemetry.inc("api_requests_total", route=route, status="200")
+                await self.events(match.group(1), writer)
+                return False
+            elif match and request.method == "GET":
+                route = "status"
+                status, body, headers = await self.status(match.group(1))
+            elif match and request.method == "DELETE":
+                route = "cancel"
+                status, body, headers = self.cancel(match.group(1))
+            elif request.path == "/healthz" and request.method == "GET":
+                route = "health"
+                status, body, headers = 200, {"status": "ok", **self.jobs.metrics()}, {}
+            elif request.path == "/metrics" and request.method == "GET":
+                route = "metrics"
+                status, body = 200, telemetry.render_prometheus().encode("utf-8")
+                headers = {"Content-Type": "text/plain; version=0.0.4"}
+            else:
+                raise HTTPError(404, f"No route for {request.method} {request.path}")
+        except HTTPError as e:
+            status, body, headers = e.status, {"error": e.message}, e.headers
+        except Exception as e:
+            status, body, headers = 500, {"error": f"Internal error: {e}"}, {}
+        telemetry.inc("api_requests_total", route=route, status=str(status))
+        writer.write(encode_response(status, body, headers, keep_alive=request.keep_alive))
+        await writer.drain()
+        return request.keep_alive
+
+    async def submit(self, request: Request) -> tuple:
+        mode = request.query.get("mode", "sync")
+        if mode not in ("sync", "async"):
+            raise HTTPError(400, 'mode must be "sync" or "async"')
+        stream = request.query.get("stream", "0")
+        if stream not in ("0", "1"):
+            raise HTTPError(400, 'stream must be "0" or "1"')
+        loop = asyncio.get_running_loop()
+        source, file_name, data = await loop.run_in_executor(None, parse_submission, request)
+        if file_name is None:
+            content, classification_input = data, data
+        elif not file_name.lower().endswith(SUPPORTED_EXTENSIONS):
+            raise HTTPError(415, f"Unsupported file type; expected one of {', '.join(SUPPORTED_EXTENSIONS)}")
+        else:
+            content, classification_input = await loop.run_in_executor(
+                None, prepare_content, file_name.lower(), data
+            )
+
+        try:
+            job = self.jobs.submit(source, content, classification_input, stream=stream == "1")
+        except QueueFullError as e:
+            raise HTTPError(503, str(e), {"Retry-After": "1"})
+        if mode == "sync" and await self.wait(job, self.sync_timeout):
+            return _OUTCOME_STATUS[job.status], await self.describe(job.conversation_id), {}
+        body = {
+            "conversation_id": job.conversation_id,
+            "status": job.status,
+            "status_url": f"/v1/documents/{job.conversation_id}",
+            "events_url": f"/v1/documents/{job.conversation_id}/events"
+        }
+        return 202, body, {"Location": body["status_url"]}
+
+    async def status(self, conversation_id: str) -> tuple:
+        body = await self.describe(conversation_id)
+        if body is None:
+            raise HTTPError(404, f"Unknown document: {conversation_id}")
+        return 200, body, {}
+
+    def cancel(self, conversation_id: str) -> tuple:
+        if self.jobs.get(conversation_id) is None:
+            raise HTTPError(404, f"Unknown document: {conversation_id}")
+        if not self.jobs.cancel(conversation_id):
+            raise HTTPError(409, "Document already finished")
+        return 200, {"conversation_id": conversation_id, "status": CANCELLED}, {}
+
+    def finished(self, job) -> asyncio.Future:
+        """A future of the running loop resolved once ``job`` finishes"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def done(_job):
+            try:
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+            except RuntimeError:
+                # The loop already closed
+                pass
+
+        self.jobs.add_done_callback(job, done)
+        return future
+
+    async def wait(self, job, timeout: float) -> bool:
+        """Wait without blocking the loop until ``job`` finishes; False after ``timeout`` seconds"""
+        try:
+            await asyncio.wait_for(self.finished(job), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def describe(self, conversation_id: str):
+        """Status and outcome of a document, from the queue or (once forgotten there) from memory"""
+        job = self.jobs.get(conversation_id)
+        conversation = await asyncio.get_running_loop().run_in_executor(
+            None, self.memory.retrieve_conversation, conversation_id
+        )
+        if job is None and conversation is None:
+            return None
+        conversation = conversation or {}
+        if job is not None:
+            body = job.to_dict()
+            body["result"] = job.result
+        else:
+            status = FAILED if conversation.get("error") else (SUCCEEDED if "results" in conversation else "unknown")
+            body = {"conversation_id": conversation_id, "source": conversation.get("source"), "status": status,
+                    "error": conversation.get("error"), "result": conversation.get("results")}
+        body["classification"] = conversation.get("classification")
+        body["duplicate_of"] = conversation.get("duplicate_of")
+        return body
+
+    async def events(self, conversation_id: str, writer: asyncio.StreamWriter):
+        """Stream status changes and agent output as server-sent events until the document finishes"""
+        job = self.jobs.get(conversation_id)
+        if job is None:
+            body = await self.describe(conversation_id)
+            if body is None:
+                writer.write(encode_response(404, {"error": f"Unknown document: {conversation_id}"},
+                                             keep_alive=False))
+                await writer.drain()
+                return
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+
+        def send(event: str, data):
+            writer.write(f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8"))
+
+        if job is not None:
+            # Tokens only flow if the job has not started yet
+            self.jobs.request_stream(job)
+            status, sent = None, 0
+            finished = self.finished(job)
+            while True:
+                # Read before the updates, so nothing written before it finished is missed
+                done = job.finished
+                if len(job.output) > sent:
+                    output = job.output[sent:]
+                    sent += len(output)
+                    send("token", {"delta": "".join(output)})
+                if job.status != status:
+                    status = job.status
+                    send("status", {"status": status})
+                await writer.drain()
+                if done:
+                    break
+                await asyncio.wait([finished], timeout=API_EVENT_INTERVAL)
+            body = await self.describe(conversation_id)
+        send("result", body)
+        await writer.drain()
+
+async def serve(host: str = API_HOST, port: int = API_PORT, workers: int = JOB_WORKERS):
+    # Mirrored into the JSONL log like the app's uploads
+    jobs = JobQueue(ThreadSafeSharedMemory(create_memory()), workers=workers)
+    api = APIServer(jobs)
+    server = await asyncio.start_server(api.handle_connection, host, port, limit=API_MAX_HEADER_BYTES)
+    print(f"Serving on http://{host}:{port} with {workers} workers", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        jobs.shutdown(wait=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the document pipeline over HTTP.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="Documents processed concurrently")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
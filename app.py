@@ -1,94 +1,27 @@
 import streamlit as st
-from agents.classifier_agent import classify_and_route
-from agents.email_agent import process_email
-from agents.json_agent import process_json
-from agents.pdf_agent import process_pdf
-from memory.shared_memory import SharedMemory
-import uuid
-from datetime import datetime
-import sqlite3
-import threading
+from job_queue import JobQueue, QueueFullError, SUCCEEDED, RETRYABLE
+from memory.shared_memory import ThreadSafeSharedMemory, create_memory
+from memory.document_index import get_document_index
+from pipeline import prepare_content
+from utils.json_stream import STREAM_EXTENSIONS, is_record_stream, iter_records
+from config import TELEMETRY_METRICS_PORT, JOB_POLL_INTERVAL
+import telemetry
+import io
+import time
 import json
-import os
 import streamlit.components.v1 as components
 
-# ---------- Persistent Log Setup ----------
-LOG_PATH = "output_logs/log.jsonl"
-os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-
-def log_to_file(conversation_id: str, step: str, data: dict):
-    log_entry = {
-        "timestamp": datetime.now().isoformat(),
-        "conversation_id": conversation_id,
-        "step": step,
-        "data": data
-    }
-    with open(LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(json.dumps(log_entry) + "\n")
-
-# ---------- Thread-Safe Shared Memory ----------
-local_storage = threading.local()
-
-def get_db_connection():
-    if not hasattr(local_storage, "conn"):
-        local_storage.conn = sqlite3.connect(":memory:", check_same_thread=False)
-        local_storage.conn.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            conversation_id TEXT PRIMARY KEY,
-            data TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-    return local_storage.conn
-
-class ThreadSafeSharedMemory:
-    def __init__(self):
-        self.lock = threading.Lock()
-        
-    def store(self, conversation_id: str, data: dict):
-        with self.lock:
-            conn = get_db_connection()
-            conn.execute(
-                "INSERT INTO conversations (conversation_id, data) VALUES (?, ?)",
-                (conversation_id, str(data))
-            )
-            conn.commit()
-            log_to_file(conversation_id, "store", data)
-    
-    def append_to_conversation(self, conversation_id: str, data: dict):
-        with self.lock:
-            conn = get_db_connection()
-            cursor = conn.execute(
-                "SELECT data FROM conversations WHERE conversation_id = ?",
-                (conversation_id,)
-            )
-            result = cursor.fetchone()
-            
-            if result:
-                existing_data = eval(result[0])
-                updated_data = {**existing_data, **data}
-                conn.execute(
-                    "UPDATE conversations SET data = ? WHERE conversation_id = ?",
-                    (str(updated_data), conversation_id)
-                )
-                log_to_file(conversation_id, "append", data)
-            else:
-                conn.execute(
-                    "INSERT INTO conversations (conversation_id, data) VALUES (?, ?)",
-                    (conversation_id, str(data))
-                )
-                log_to_file(conversation_id, "store", data)
-            conn.commit()
-    
-    def retrieve_conversation(self, conversation_id: str) -> dict:
-        with self.lock:
-            conn = get_db_connection()
-            cursor = conn.execute(
-                "SELECT data FROM conversations WHERE conversation_id = ?",
-                (conversation_id,)
-            )
-            result = cursor.fetchone()
-            return eval(result[0]) if result else None
+# ---------- Shared Memory ----------
+@st.cache_resource
+def get_memory() -> ThreadSafeSharedMemory:
+    return ThreadSafeSharedMemory(create_memory())
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Expose /metrics once per server process when a port is configured"""
+    if TELEMETRY_METRICS_PORT:
+        return telemetry.start_metrics_server(TELEMETRY_METRICS_PORT)
+    return None
 
 # ---------- Display JSON ----------
 def display_json(data):
@@ -107,22 +40,173 @@ def display_json(data):
     """
     components.html(html, height=min(800, 200 + len(json_str) // 2), scrolling=True)
 
+# ---------- Background Jobs ----------
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """One worker pool per server process, shared by every session"""
+    return JobQueue(get_memory())
+
+def render_job(conversation_id: str, expanded: bool):
+    job = jobs.get(conversation_id)
+    history = memory.retrieve_conversation(conversation_id)
+    status = job.status if job is not None else "unknown"
+    label = (history or {}).get("source", conversation_id)
+
+    with st.expander(f"{label} · {status}", expanded=expanded):
+        st.caption(f"Conversation {conversation_id}" + (f" · attempt {job.attempts}" if job else ""))
+
+        if history and history.get("duplicate_of"):
+            duplicate = history["duplicate_of"]
+            match = "exact match" if duplicate["exact"] else f"similarity {duplicate['similarity']:.0%}"
+            st.info(f"🔁 Duplicate of conversation {duplicate['conversation_id']} ({match})")
+
+        if history and "classification" in history:
+            st.subheader("🔍 Classification Results")
+            display_json(history["classification"])
+
+        if job is not None and not job.finished:
+            partial = job.partial_output()
+            if partial:
+                st.code(partial, language="json")
+            else:
+                st.info("⏳ Queued..." if status == "queued" else "⚙️ Processing...")
+            if st.button("Cancel", key=f"cancel_{conversation_id}"):
+                jobs.cancel(conversation_id)
+                st.rerun()
+            return
+
+        if job is not None and job.status == SUCCEEDED:
+            st.subheader("📝 Processing Results")
+            display_json(job.result)
+        elif job is not None:
+            st.error(f"❌ {job.error}")
+
+        if history:
+            st.subheader("🕒 Processing History")
+            display_json(history)
+
+        if job is not None and job.status in RETRYABLE:
+            if st.button("Retry", key=f"retry_{conversation_id}"):
+                try:
+                    jobs.retry(conversation_id)
+                except QueueFullError as e:
+                    st.error(f"❌ {e}")
+                else:
+                    st.rerun()
+
+def render_feed(feed, expanded: bool):
+    state = "reading" if not feed.done else ("finished" if feed.finished else "processing")
+    with st.expander(f"{feed.source} · {state}", expanded=expanded):
+        counts = feed.counts
+        columns = st.columns(4)
+        columns[0].metric("Records read", counts["read"])
+        columns[1].metric("Succeeded", counts["succeeded"])
+        columns[2].metric("Failed", counts["failed"] + counts["timed_out"] + counts["cancelled"])
+        columns[3].metric("Malformed", counts["bad"])
+        if counts["submitted"]:
+            settled = counts["succeeded"] + counts["failed"] + counts["timed_out"] + counts["cancelled"]
+            st.progress(min(1.0, settled / counts["submitted"]),
+                        text=f"{settled} of {counts['submitted']} queued records processed")
+        if feed.error:
+            st.error(f"❌ {feed.error}")
+        if feed.errors:
+            st.caption("Malformed records: " + "; ".join(feed.errors))
+        if not feed.done and st.button("Stop reading", key=f"stop_{feed.id}"):
+            feed.cancel()
+            st.rerun()
+        st.caption("Latest records")
+        for conversation_id in reversed(feed.recent):
+            job = jobs.get(conversation_id)
+            if job is not None:
+                st.text(f"{job.source} · {job.status} · {conversation_id}")
+
+def render_history():
+    columns = st.columns(3)
+    query = columns[0].text_input("Search text and results", key="history_query")
+    source = columns[1].text_input("Source starts with", key="history_source")
+    since = columns[2].date_input("Processed since", value=None, key="history_since")
+    columns = st.columns(4)
+    document_format = columns[0].selectbox("Format", ["", "email", "json", "pdf"], key="history_format")
+    intent = columns[1].selectbox("Intent", ["", "Invoice", "RFQ", "Complaint", "Regulation", "Other"],
+                                  key="history_intent")
+    agent = columns[2].selectbox("Agent", ["", "email_processor", "json_processor", "pdf_processor"],
+                                 key="history_agent")
+    status = columns[3].selectbox("Status", ["", "ok", "error", "duplicate"], key="history_status")
+
+    # Cursors of the pages seen so far; new filters start again from the newest page
+    filters = (query, source, since, document_format, intent, agent, status)
+    if st.session_state.get("history_filters") != filters:
+        st.session_state.history_filters = filters
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
+
+    page = get_document_index().search(
+        query, source=source, since=since.isoformat() if since else None, limit=25, cursor=cursors[-1],
+        format=document_format, intent=intent, agent=agent, status=status
+    )
+    if not page["items"]:
+        st.info("No matching documents.")
+        return
+    st.dataframe(
+        [{key: item[key] for key in ("created_at", "source", "format", "intent", "status", "snippet", "conversation_id")}
+         for item in page["items"]],
+        hide_index=True, use_container_width=True
+    )
+
+    columns = st.columns([1, 1, 4])
+    if len(cursors) > 1 and columns[0].button("← Newer", key="history_newer"):
+        cursors.pop()
+        st.rerun()
+    if page["next_cursor"] and columns[1].button("Older →", key="history_older"):
+        cursors.append(page["next_cursor"])
+        st.rerun()
+    columns[2].caption(f"Page {len(cursors)}")
+
+    labels = {item["conversation_id"]: f"{item['source']} · {item['created_at'][:19]}" for item in page["items"]}
+    selected = st.selectbox("Open conversation", list(labels), format_func=labels.get, key="history_selected")
+    conversation = memory.retrieve_conversation(selected)
+    if conversation:
+        display_json(conversation)
+    else:
+        st.caption("This conversation is no longer in memory.")
+
 # ---------- Main App ----------
-memory = ThreadSafeSharedMemory()
+memory = get_memory()
+jobs = get_job_queue()
+start_metrics_endpoint()
+st.session_state.setdefault("jobs", [])
+st.session_state.setdefault("feeds", [])
 
 st.title("📨 Multi-Agent AI System")
 
-tab1, tab2 = st.tabs(["📁 Upload File", "✍️ Text Input"])
+with st.sidebar:
+    st.subheader("📊 Job Queue")
+    queue_metrics = jobs.metrics()
+    st.metric("Waiting", f"{queue_metrics['queue_depth']} / {queue_metrics['max_depth']}")
+    st.metric("Busy workers", f"{queue_metrics['busy_workers']} / {queue_metrics['workers']}")
+    st.caption(
+        f"Succeeded {queue_metrics['succeeded']} · Failed {queue_metrics['failed']} · "
+        f"Timed out {queue_metrics['timed_out']} · Cancelled {queue_metrics['cancelled']} · "
+        f"Rejected {queue_metrics['rejected']}"
+    )
+
+tab1, tab2, tab3 = st.tabs(["📁 Upload File", "✍️ Text Input", "🗂️ History"])
+
+stream_output = st.toggle(
+    "Stream agent output", value=False,
+    help="Shows the analysis as it is generated. Streamed replies are not requested in JSON mode."
+)
 
 process_file = False
 process_text = False
 
 with tab1:
     uploaded_file = st.file_uploader(
-        "Upload a file (PDF, JSON, or Email)", 
-        type=["pdf", "json", "txt", "eml"],
+        "Upload a file (PDF, JSON, NDJSON, or Email)",
+        type=["pdf", "json", "ndjson", "jsonl", "txt", "eml"],
         key="file_uploader"
     )
+    skip_bad_records = st.checkbox("Skip malformed records in JSON arrays and NDJSON feeds", value=True)
     process_file = st.button("Process File", key="process_file")
 
 with tab2:
@@ -134,6 +218,9 @@ with tab2:
     )
     process_text = st.button("Process Text", key="process_text")
 
+with tab3:
+    render_history()
+
 if process_file and uploaded_file is not None:
     content_source = uploaded_file
     content_type = "file"
@@ -144,76 +231,40 @@ else:
     content_source = None
 
 if content_source:
-    conversation_id = str(uuid.uuid4())
-    timestamp = datetime.now().isoformat()
-    
     try:
-        if content_type == "file":
-            source = f"file:{uploaded_file.name}"
-            raw_content = uploaded_file.getvalue()
-
-            if uploaded_file.name.endswith(".pdf"):
-                content = raw_content
-                classification_input = "[PDF FILE]"
-            elif uploaded_file.name.endswith((".txt", ".eml", ".json")):
-                content = raw_content.decode("utf-8", errors="ignore")
-                classification_input = content
-            else:
-                raise ValueError("Unsupported file format.")
+        # The job outlives this script run, so it gets the upload's bytes
+        # rather than the uploader's buffer
+        data = uploaded_file.getvalue() if content_type == "file" else None
+        if content_type == "file" and is_record_stream(uploaded_file.name, data[:64], len(data)):
+            # Every record becomes its own job; the upload is never decoded as a whole
+            ndjson = uploaded_file.name.lower().endswith(STREAM_EXTENSIONS)
+            feed = jobs.submit_records(f"file:{uploaded_file.name}", iter_records(io.BytesIO(data), ndjson=ndjson),
+                                       skip_bad=skip_bad_records)
+            st.session_state.feeds.insert(0, feed)
         else:
-            source = "text_input"
-            content = input_text
-            classification_input = content
-
-        preview = classification_input
-
-        memory.store(
-            conversation_id=conversation_id,
-            data={
-                "source": source,
-                "upload_timestamp": timestamp,
-                "original_content": preview[:1000] + "..." if len(preview) > 1000 else preview,
-                "processing_steps": []
-            }
-        )
-        
-        with st.spinner("Classifying content..."):
-            classification = classify_and_route(source, classification_input)
-        
-        memory.append_to_conversation(
-            conversation_id=conversation_id,
-            data={
-                "classification": classification,
-                "processing_steps": [f"Classified as {classification['format']} with intent {classification['intent']}"]
-            }
-        )
-        
-        with st.expander("🔍 Classification Results", expanded=True):
-            display_json(classification)
-        
-        with st.spinner(f"Processing {classification['format']}..."):
-            if classification["format"] == "email":
-                result = process_email(content, conversation_id, memory)
-            elif classification["format"] == "json":
-                result = process_json(content, conversation_id, memory)
-            elif classification["format"] == "pdf":
-                result = process_pdf(content, conversation_id, memory)
+            if content_type == "file":
+                source = f"file:{uploaded_file.name}"
+                content, classification_input = prepare_content(uploaded_file.name, data)
             else:
-                raise ValueError("Unsupported format for processing.")
-            
-            st.subheader("📝 Processing Results")
-            display_json(result)
-            
-            st.subheader("🕒 Processing History")
-            history = memory.retrieve_conversation(conversation_id)
-            display_json(history)
-            
+                source = "text_input"
+                content = input_text
+                classification_input = content
+
+            job = jobs.submit(source, content, classification_input, stream=stream_output)
+            st.session_state.jobs.insert(0, job.conversation_id)
+    except QueueFullError as e:
+        st.error(f"❌ {e}. Please try again in a moment.")
     except Exception as e:
         st.error(f"❌ Error processing content: {str(e)}")
-        memory.append_to_conversation(
-            conversation_id=conversation_id,
-            data={
-                "error": str(e),
-                "processing_steps": ["Error during processing"]
-            }
-        )
+
+for index, feed in enumerate(st.session_state.feeds):
+    render_feed(feed, expanded=index == 0)
+
+for index, conversation_id in enumerate(st.session_state.jobs):
+    render_job(conversation_id, expanded=index == 0)
+
+# Poll until every job of this session has finished
+pending = [job for job in map(jobs.get, st.session_state.jobs) if job is not None and not job.finished]
+if pending or any(not feed.finished for feed in st.session_state.feeds):
+    time.sleep(JOB_POLL_INTERVAL)
+    st.rerun()
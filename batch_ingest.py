@@ -0,0 +1,303 @@
+"""Headless bulk ingestion for directories of documents.
+
+Usage:
+    python batch_ingest.py "sample inputs" --output output_logs/batch_results.jsonl --workers 8
+    python batch_ingest.py --manifest files.txt --executor process --workers 4
+    python batch_ingest.py exports/ --stream-json --skip-bad-records
+
+Each finished document is appended as one JSON line to the output file, so an
+interrupted run can be restarted with the same arguments and will skip every
+document that already completed successfully.
+
+NDJSON files, and JSON arrays from JSON_STREAM_MIN_BYTES up (any size with
+``--stream-json``), are read incrementally and every record is processed as
+its own document under the path ``<file>#<index>``.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from pathlib import Path
+
+import llm_scheduler
+import telemetry
+from agents.classifier_agent import enable_batching, get_classification_stats
+from config import TELEMETRY_METRICS_PORT, JSON_STREAM_MIN_BYTES
+from memory.shared_memory import ThreadSafeSharedMemory, create_memory
+from pipeline import SUPPORTED_EXTENSIONS, prepare_content, process_document
+from utils.json_stream import STREAM_EXTENSIONS, is_record_stream, iter_records
+from utils.log_writer import get_log_writer
+
+DEFAULT_OUTPUT = "output_logs/batch_results.jsonl"
+
+_memory = None
+
+def get_memory():
+    """One store per process; worker threads share it, processes share the backend.
+
+    Writes are mirrored into the JSONL log like the app's and the API's, so
+    batch documents also train the fast classifier and survive a reindex.
+    """
+    global _memory
+    if _memory is None:
+        _memory = ThreadSafeSharedMemory(create_memory())
+    return _memory
+
+def discover_documents(directory: str, recursive: bool = True) -> list:
+    """List supported documents under a directory in a stable order"""
+    root = Path(directory)
+    candidates = root.rglob("*") if recursive else root.glob("*")
+    return sorted(
+        str(path) for path in candidates
+        if path.is_file() and path.name.lower().endswith(SUPPORTED_EXTENSIONS + STREAM_EXTENSIONS)
+    )
+
+def read_manifest(manifest_path: str) -> list:
+    """Read one document path per line; relative paths resolve against the manifest"""
+    base = Path(manifest_path).parent
+    paths = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = Path(line)
+            paths.append(str(path if path.is_absolute() else base / path))
+    return paths
+
+def load_completed(output_path: str) -> set:
+    """Paths that already have a successful record in the output file"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash mid-write can leave a truncated last line
+                continue
+            # Skipped records are malformed in the source and would only be skipped again
+            if record.get("status") in ("ok", "skipped"):
+                completed.add(record.get("path"))
+    return completed
+
+def iter_documents(paths: list, stream_min_bytes: int = JSON_STREAM_MIN_BYTES):
+    """Yield ``(path, text, error)`` per document; ``text`` is set for records of JSON streams"""
+    for path in paths:
+        try:
+            f = open(path, "rb")
+        except OSError:
+            # process_path records the failure
+            yield path, None, None
+            continue
+        with f:
+            if not is_record_stream(path, f.read(64), os.fstat(f.fileno()).st_size, stream_min_bytes):
+                yield path, None, None
+                continue
+            f.seek(0)
+            try:
+                for index, text, error in iter_records(f, ndjson=path.lower().endswith(STREAM_EXTENSIONS)):
+                    yield f"{path}#{index}", text, error
+            except (OSError, ValueError) as e:
+                yield path, None, str(e)
+
+def process_path(path: str, text: str = None) -> dict:
+    """Worker entry point: process a single file, or one record of a JSON stream
+    when ``text`` is given, and return its result record"""
+    timings = {}
+    record = {"path": path, "status": "error"}
+    started = time.perf_counter()
+    try:
+        name = os.path.basename(path)
+        if text is None:
+            content, classification_input = prepare_content(name.lower(), Path(path))
+            source = f"file:{name}"
+        else:
+            content = classification_input = text
+            source = f"record:{name}"
+        outcome = process_document(source, content, classification_input, get_memory(), timings=timings)
+        record.update(outcome)
+        if isinstance(outcome["result"], dict) and "error" in outcome["result"]:
+            record["error"] = outcome["result"]["error"]
+        else:
+            record["status"] = "ok"
+    except Exception as e:
+        record["error"] = str(e)
+    timings["total"] = time.perf_counter() - started
+    record["timings"] = timings
+    record["finished_at"] = datetime.now().isoformat()
+    return record
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def init_worker(classify_batch: int = 0, processes: int = 1):
+    """Set up LLM access for batch work in this process.
+
+    Batch calls queue behind interactive ones, and with several processes
+    each one gets an equal share of the per-minute rate limits.
+    """
+    llm_scheduler.set_default_priority(llm_scheduler.BATCH)
+    if processes > 1:
+        scheduler = llm_scheduler.get_scheduler()
+        scheduler.configure(rpm=scheduler.requests.capacity / processes,
+                            tpm=scheduler.tokens.capacity / processes)
+    if classify_batch > 1:
+        # Each process batches the classifications of its own workers
+        enable_batching(classify_batch)
+    if multiprocessing.parent_process() is not None:
+        # Forked pool workers exit without running atexit; flush the log when the pool stops them
+        multiprocessing.util.Finalize(None, get_log_writer().close, exitpriority=10)
+
+def run_batch(paths: list, output_path: str, workers: int = 4, executor: str = "thread",
+              progress_every: int = 100, classify_batch: int = 0, completed: set = None,
+              stream_min_bytes: int = JSON_STREAM_MIN_BYTES, skip_bad_records: bool = False) -> dict:
+    """Process paths concurrently, appending one record per document as it finishes.
+
+    Documents listed in ``completed`` are skipped. A malformed record in a
+    JSON stream stops the run (after the documents in flight finish) unless
+    ``skip_bad_records`` is set, in which case it is written out as skipped.
+    """
+    completed = completed or set()
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    if executor == "process":
+        pool_args = {"initializer": init_worker, "initargs": (classify_batch, workers)}
+        pool_cls = ProcessPoolExecutor
+    else:
+        init_worker(classify_batch)
+        pool_args = {}
+        pool_cls = ThreadPoolExecutor
+    stage_timings = {}
+    counts = {"ok": 0, "error": 0, "skipped": 0, "already_done": 0}
+    aborted = None
+    # Keep a bounded number of documents in flight so huge backlogs (and
+    # huge JSON streams) don't materialize one future per document up front
+    window = max(1, workers * 4)
+    pending = set()
+    remaining = iter_documents(paths, stream_min_bytes)
+    started = time.perf_counter()
+
+    with pool_cls(max_workers=workers, **pool_args) as pool, open(output_path, "a", encoding="utf-8") as out:
+        def fill():
+            nonlocal aborted
+            if aborted:
+                return
+            for path, text, error in remaining:
+                if path in completed:
+                    counts["already_done"] += 1
+                    continue
+                if error:
+                    if not skip_bad_records:
+                        aborted = f"{path}: {error}"
+                        return
+                    out.write(json.dumps({"path": path, "status": "skipped", "error": error,
+                                          "finished_at": datetime.now().isoformat()}) + "\n")
+                    counts["skipped"] += 1
+                    continue
+                pending.add(pool.submit(process_path, path, text))
+                if len(pending) >= window:
+                    break
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                record = future.result()
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                counts[record["status"]] += 1
+                for stage, seconds in record["timings"].items():
+                    stage_timings.setdefault(stage, []).append(seconds)
+                finished = counts["ok"] + counts["error"]
+                if progress_every and finished % progress_every == 0:
+                    rate = finished / (time.perf_counter() - started)
+                    print(f"[batch] {finished} documents processed ({rate:.1f}/s, "
+                          f"{counts['skipped']} bad records skipped)", file=sys.stderr)
+            fill()
+
+    elapsed = time.perf_counter() - started
+    processed = counts["ok"] + counts["error"]
+    return {
+        "processed": processed,
+        "succeeded": counts["ok"],
+        "failed": counts["error"],
+        "skipped": counts["skipped"],
+        "already_done": counts["already_done"],
+        "aborted": aborted,
+        "elapsed_seconds": elapsed,
+        "docs_per_second": processed / elapsed if elapsed > 0 else 0.0,
+        "stages": {
+            stage: {"p50": percentile(values, 50), "p95": percentile(values, 95)}
+            for stage, values in stage_timings.items()
+        }
+    }
+
+def print_summary(stats: dict):
+    print(f"Processed {stats['processed']} documents "
+          f"({stats['succeeded']} ok, {stats['failed']} failed, {stats['skipped']} bad records skipped, "
+          f"{stats['already_done']} skipped as already done) in {stats['elapsed_seconds']:.1f}s")
+    if stats["aborted"]:
+        print(f"Stopped at a malformed record: {stats['aborted']} (rerun with --skip-bad-records to skip it)")
+    print(f"Throughput: {stats['docs_per_second']:.2f} docs/sec")
+    for stage, latency in sorted(stats["stages"].items()):
+        print(f"  {stage:<10} p50 {latency['p50'] * 1000:8.1f} ms   p95 {latency['p95'] * 1000:8.1f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the classifier and agents over many documents.")
+    parser.add_argument("directory", nargs="?",
+                        help="Directory to scan for .pdf/.json/.txt/.eml files and .ndjson/.jsonl feeds")
+    parser.add_argument("--manifest", help="File listing one document path per line")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSONL file receiving one record per document")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent workers")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread",
+                        help="Use a thread pool (default, LLM-bound work) or a process pool")
+    parser.add_argument("--classify-batch", type=int, default=0, metavar="N",
+                        help="Pack up to N concurrent LLM classifications into one request")
+    parser.add_argument("--stream-json", action="store_true",
+                        help="Split every top-level JSON array into records, not only those over JSON_STREAM_MIN_BYTES")
+    parser.add_argument("--skip-bad-records", action="store_true",
+                        help="Skip malformed records in JSON streams instead of stopping the run")
+    parser.add_argument("--no-recursive", action="store_true", help="Only scan the top level of the directory")
+    parser.add_argument("--no-resume", action="store_true", help="Reprocess documents already in the output file")
+    parser.add_argument("--metrics-port", type=int, default=TELEMETRY_METRICS_PORT,
+                        help="Serve Prometheus metrics on this port while running (thread executor only)")
+    args = parser.parse_args(argv)
+
+    if not args.directory and not args.manifest:
+        parser.error("provide a directory or --manifest")
+
+    paths = read_manifest(args.manifest) if args.manifest else []
+    if args.directory:
+        paths.extend(discover_documents(args.directory, recursive=not args.no_recursive))
+
+    if args.metrics_port:
+        telemetry.start_metrics_server(args.metrics_port)
+
+    completed = set() if args.no_resume else load_completed(args.output)
+
+    stats = run_batch(paths, args.output, workers=args.workers, executor=args.executor,
+                      classify_batch=args.classify_batch, completed=completed,
+                      stream_min_bytes=0 if args.stream_json else JSON_STREAM_MIN_BYTES,
+                      skip_bad_records=args.skip_bad_records)
+    print_summary(stats)
+    if args.executor == "thread":
+        # Counters live in the worker processes when a process pool is used
+        routes = get_classification_stats()
+        print("Classified by: " + ", ".join(f"{route} {count}" for route, count in routes.items()))
+    return 0 if stats["failed"] == 0 and not stats["aborted"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Load test for the HTTP API (``api_server.py``).
+
+Usage:
+    python -m bench.load_test --spawn --requests 500 --concurrency 64
+    python -m bench.load_test --url http://127.0.0.1:8080 --mode async --requests 200
+
+Uploads the files in ``sample inputs/`` round-robin from ``--concurrency``
+keep-alive connections and reports throughput, latency percentiles and
+response status counts. In ``sync`` mode each request waits for its result;
+in ``async`` mode each document is submitted and then followed over its
+server-sent event stream until the result arrives.
+
+With ``--spawn`` an API server is started in a subprocess against the stub
+Groq server, with a throwaway memory store and the response cache and the
+duplicate index off, so every request runs the full pipeline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from bench.stub_server import StubGroqServer
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_DIR = ROOT / "sample inputs"
+
+def multipart(file_name: str, data: bytes) -> tuple:
+    """(content type, body) of a form upload with one "file" field"""
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{file_name}\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n").encode("utf-8") + data + f"\r\n--{boundary}--\r\n".encode()
+    return f"multipart/form-data; boundary={boundary}", body
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection over asyncio streams"""
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, body: bytes = b"", content_type: str = None) -> tuple:
+        """(status, headers, body) of one request; reconnects when the server closed the connection"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if content_type:
+            head += f"Content-Type: {content_type}\r\n"
+        self.writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await self.writer.drain()
+        status, headers = await self._read_head()
+        length = int(headers.get("content-length", 0))
+        payload = await self.reader.readexactly(length) if length else b""
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, headers, payload
+
+    async def events(self, path: str):
+        """Yield (event, data) from a server-sent event stream on a fresh connection"""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            if b" 200 " not in head.split(b"\r\n", 1)[0]:
+                raise RuntimeError(head.split(b"\r\n", 1)[0].decode("latin-1"))
+            event = None
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                line = line.decode("utf-8").rstrip("\n")
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    yield event, json.loads(line[6:])
+        finally:
+            writer.close()
+
+    async def _read_head(self) -> tuple:
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split(" ")[1])
+        headers = {}
+        for line in head[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+async def run(url: str, documents: list, requests: int, concurrency: int, mode: str) -> dict:
+    target = urlsplit(url)
+    counter = iter(range(requests))
+    latencies, statuses, errors = [], Counter(), Counter()
+
+    async def client():
+        connection = Connection(target.hostname, target.port or 80)
+        for index in counter:
+            file_name, data = documents[index % len(documents)]
+            content_type, body = multipart(file_name, data)
+            started = time.perf_counter()
+            try:
+                # Async documents are followed over their event stream, so their output is streamed
+                path = "/v1/documents?mode=async&stream=1" if mode == "async" else "/v1/documents?mode=sync"
+                status, _, payload = await connection.request("POST", path, body, content_type)
+                if mode == "async" and status == 202:
+                    events_url = json.loads(payload)["events_url"]
+                    async for event, data in connection.events(events_url):
+                        if event == "result":
+                            status = 200 if data["status"] == "succeeded" else data["status"]
+            except (OSError, asyncio.IncompleteReadError, RuntimeError, ValueError) as e:
+                connection.close()
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return {"elapsed_s": time.perf_counter() - started, "latencies": latencies,
+            "statuses": statuses, "errors": errors}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def spawn_server(stub_url: str, workers: int) -> tuple:
+    """(process, url) of an API server using the stub Groq server and a temporary store"""
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    env = dict(os.environ, GROQ_BASE_URL=stub_url, GROQ_API_KEY=os.environ.get("GROQ_API_KEY") or "stub",
+               LLM_CACHE_ENABLED="0", DEDUP_ENABLED="0", MEMORY_DB_PATH=os.path.join(workdir, "memory.db"),
+               LOG_PATH=os.path.join(workdir, "log.jsonl"), JOB_QUEUE_MAX_DEPTH="1000")
+    process = subprocess.Popen([sys.executable, str(ROOT / "api_server.py"), "--host", "127.0.0.1",
+                                "--port", str(port), "--workers", str(workers)], cwd=ROOT, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("API server did not start")
+
+def main(argv=None):
+    from batch_ingest import percentile
+
+    parser = argparse.ArgumentParser(description="Load-test the HTTP API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="API server to test")
+    parser.add_argument("--spawn", action="store_true", help="Start an API server against the stub Groq server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="Open connections")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--workers", type=int, default=8, help="Job workers of a spawned server")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Stub LLM latency for a spawned server")
+    args = parser.parse_args(argv)
+
+    documents = [(path.name, path.read_bytes()) for path in sorted(SAMPLE_DIR.glob("*")) if path.is_file()]
+    server = process = None
+    url = args.url
+    if args.spawn:
+        server = StubGroqServer(latency_ms=args.latency_ms).start()
+        process, url = spawn_server(server.url, args.workers)
+    try:
+        result = asyncio.run(run(url, documents, args.requests, args.concurrency, args.mode))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if server is not None:
+            server.stop()
+
+    latencies = result["latencies"]
+    print(f"Requests: {len(latencies)} completed in {result['elapsed_s']:.2f}s "
+          f"({len(latencies) / result['elapsed_s']:.1f} req/s, {args.concurrency} connections, {args.mode})")
+    print("  latency  " + "  ".join(f"p{pct} {percentile(latencies, pct) * 1000:8.1f}ms" for pct in (50, 95, 99)))
+    print("  status   " + ", ".join(f"{status}: {count}" for status, count in sorted(result["statuses"].items(),
+                                                                                     key=str)))
+    if result["errors"]:
+        print("  errors   " + ", ".join(f"{name}: {count}" for name, count in result["errors"].items()))
+    return 0 if not result["errors"] and set(result["statuses"]) <= {200} else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""End-to-end pipeline benchmark against the local stub Groq server.
+
+Usage:
+    python -m bench.run_benchmark --latency-ms 200 --workers 8
+    python -m bench.run_benchmark --save-baseline
+    python -m bench.run_benchmark --baseline bench/baseline.json --tolerance 0.2
+
+Drives the files in ``sample inputs/`` plus synthetic large PDFs, JSON
+invoices and long emails through ``pipeline.process_document`` (classifier
+then agent), then reports throughput, per-stage latency percentiles and peak
+RSS. With a baseline file present the run exits non-zero when throughput
+drops, or p95 latency / peak RSS grows, by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bench.stub_server import StubGroqServer
+from bench import synthetic
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_DIR = ROOT / "sample inputs"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+def build_corpus(samples_dir: Path, copies: int, pdf_pages: int, json_items: int,
+                 email_paragraphs: int) -> list:
+    """(name, file name, raw bytes) for every document in the run"""
+    corpus = []
+    for path in sorted(samples_dir.glob("*")):
+        if path.is_file():
+            corpus.append((f"sample/{path.name}", path.name, path.read_bytes()))
+    for index in range(copies):
+        corpus.append((f"synthetic/invoice_{index}.pdf", "invoice.pdf",
+                       synthetic.invoice_pdf(pdf_pages, seed=index)))
+        corpus.append((f"synthetic/invoice_{index}.json", "invoice.json",
+                       synthetic.invoice_json(json_items, seed=index).encode("utf-8")))
+        corpus.append((f"synthetic/rfq_{index}.eml", "rfq.eml",
+                       synthetic.long_email(email_paragraphs, seed=index).encode("utf-8")))
+    return corpus
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run(corpus: list, workers: int, rounds: int) -> dict:
+    """Process the corpus ``rounds`` times and collect per-stage timings"""
+    # Imported late so GROQ_BASE_URL and friends are read from the stub settings
+    from memory.shared_memory import create_memory
+    from pipeline import prepare_content, process_document
+
+    memory = create_memory()
+    stages = {"classify": [], "agent": [], "total": []}
+    failures = []
+
+    def process(item):
+        name, file_name, raw = item
+        timings = {}
+        started = time.perf_counter()
+        try:
+            content, classification_input = prepare_content(file_name, raw)
+            result = process_document(name, content, classification_input, memory, timings=timings)
+            if isinstance(result["result"], dict) and result["result"].get("error"):
+                raise RuntimeError(result["result"]["error"])
+        except Exception as e:
+            failures.append(f"{name}: {e}")
+        timings["total"] = time.perf_counter() - started
+        return timings
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for timings in pool.map(process, corpus * rounds):
+            for stage, values in stages.items():
+                if stage in timings:
+                    values.append(timings[stage])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "documents": len(corpus) * rounds,
+        "failures": failures,
+        "elapsed_s": elapsed,
+        "stages": stages,
+    }
+
+def summarize(run_result: dict) -> dict:
+    from batch_ingest import percentile
+
+    return {
+        "documents": run_result["documents"],
+        "failed": len(run_result["failures"]),
+        "throughput_docs_per_s": round(run_result["documents"] / run_result["elapsed_s"], 3),
+        "stages": {
+            stage: {
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1) if values else 0.0,
+            }
+            for stage, values in run_result["stages"].items()
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list:
+    """Human-readable regressions beyond ``tolerance`` (a fraction)"""
+    regressions = []
+    old = baseline.get("throughput_docs_per_s")
+    new = summary["throughput_docs_per_s"]
+    if old and new < old * (1 - tolerance):
+        regressions.append(f"throughput {new} docs/s < baseline {old} docs/s")
+    for stage, stats in summary["stages"].items():
+        old = baseline.get("stages", {}).get(stage, {}).get("p95_ms")
+        if old and stats["p95_ms"] > old * (1 + tolerance):
+            regressions.append(f"{stage} p95 {stats['p95_ms']}ms > baseline {old}ms")
+    old = baseline.get("peak_rss_mb")
+    if old and summary["peak_rss_mb"] > old * (1 + tolerance):
+        regressions.append(f"peak RSS {summary['peak_rss_mb']}MB > baseline {old}MB")
+    return regressions
+
+def print_report(summary: dict, server: StubGroqServer, failures: list):
+    print(f"Documents: {summary['documents']} ({summary['failed']} failed)")
+    print(f"Throughput: {summary['throughput_docs_per_s']} docs/s")
+    print(f"LLM requests served by stub: {server.requests} ({server.errors} injected errors)")
+    for stage, stats in summary["stages"].items():
+        print(f"  {stage:<9} p50 {stats['p50_ms']:>9.1f}ms  p95 {stats['p95_ms']:>9.1f}ms  "
+              f"max {stats['max_ms']:>9.1f}ms")
+    print(f"Peak RSS: {summary['peak_rss_mb']} MB")
+    for failure in failures[:10]:
+        print(f"  FAILED {failure}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a stub Groq server.")
+    parser.add_argument("--workers", type=int, default=8, help="Documents processed concurrently")
+    parser.add_argument("--rounds", type=int, default=1, help="Times the corpus is processed")
+    parser.add_argument("--copies", type=int, default=4, help="Synthetic documents of each kind")
+    parser.add_argument("--pdf-pages", type=int, default=60)
+    parser.add_argument("--json-items", type=int, default=2000)
+    parser.add_argument("--email-paragraphs", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed fractional regression against the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    server = StubGroqServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            error_rate=args.error_rate, seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    # The response cache and the duplicate index would short-circuit every
+    # repeated copy, so both are off
+    os.environ.update({
+        "GROQ_BASE_URL": server.url,
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY") or "stub",
+        "LLM_CACHE_ENABLED": "0",
+        "DEDUP_ENABLED": "0",
+        "MEMORY_DB_PATH": os.path.join(workdir, "memory.db"),
+        "LOG_PATH": os.path.join(workdir, "log.jsonl"),
+    })
+
+    try:
+        corpus = build_corpus(SAMPLE_DIR, args.copies, args.pdf_pages, args.json_items, args.email_paragraphs)
+        run_result = run(corpus, args.workers, args.rounds)
+    finally:
+        server.stop()
+
+    summary = summarize(run_result)
+    summary["settings"] = {
+        key: getattr(args, key)
+        for key in ("workers", "rounds", "copies", "pdf_pages", "json_items", "email_paragraphs",
+                    "latency_ms", "jitter_ms", "error_rate")
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary, server, run_result["failures"])
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != summary["settings"]:
+        print("Warning: baseline was recorded with different settings.")
+    regressions = compare(summary, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} of baseline.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Local stand-in for the Groq chat completions API.
+
+Serves ``POST /openai/v1/chat/completions`` with canned bodies chosen from the
+prompt, after a configurable latency (plus jitter), and fails a configurable
+share of requests with 429/500 responses. Streaming requests are answered as
+server-sent events. Point the agents at it with ``GROQ_BASE_URL``:
+
+    python -m bench.stub_server --port 8900 --latency-ms 400 --jitter-ms 100
+    GROQ_BASE_URL=http://127.0.0.1:8900 GROQ_API_KEY=stub streamlit run app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSES = {
+    "format": "text",
+    "intent": "Other",
+    "combined": {"format": "text", "intent": "Other"},
+    "email": {
+        "Sender": {"name": "Supplier Corp.", "email": "supplier@example.com"},
+        "Recipient": "procurement@yourcompany.com",
+        "Subject": "Request for Quotation - Widget A",
+        "KeyDates": [],
+        "Urgency": "medium",
+        "ActionItems": ["Provide a quotation"],
+        "Entities": {"Products": ["Widget A"], "Quantities": ["1,000 units"], "Companies": ["Supplier Corp."]}
+    },
+    "json": {
+        "validation": {"missing_fields": [], "anomalies": []},
+        "enhancements": {"suggested_fields": [], "normalization": []}
+    },
+    "pdf": {
+        "document_type": "invoice",
+        "key_entities": {"invoice_number": "#INV-2024-1001", "total": 855.0},
+        "anomalies": []
+    }
+}
+
+def guess_format(content: str, default: str) -> str:
+    """Cheap format guess so classifier prompts route documents to the right agent"""
+    content = content.strip()
+    if content.startswith("%PDF") or "[PDF FILE]" in content:
+        return "pdf"
+    if content.startswith(("{", "[")):
+        return "json"
+    if re.search(r"^(From|Subject):", content, re.MULTILINE):
+        return "email"
+    return default
+
+def pick_response(body: dict, responses: dict) -> str:
+    """Choose the canned completion text for a request"""
+    messages = body.get("messages") or []
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    combined = responses["combined"]
+
+    if '"results"' in prompt:
+        documents = re.findall(r"^Document (\d+):\n<<<\n(.*?)\n>>>", prompt, re.MULTILINE | re.DOTALL)
+        return json.dumps({"results": [
+            dict(combined, id=int(index), format=guess_format(content, combined["format"]))
+            for index, content in documents
+        ]})
+    document = prompt.split("Content:", 1)[-1]
+    if '"format": "<format>"' in prompt:
+        return json.dumps(dict(combined, format=guess_format(document, combined["format"])))
+    if "content's format" in prompt:
+        return guess_format(document, responses["format"])
+    if "content's intent" in prompt or "Classify the following text" in prompt:
+        return responses["intent"]
+    if "email parsing assistant" in prompt:
+        return json.dumps(responses["email"])
+    if "JSON validator" in prompt:
+        return json.dumps(responses["json"])
+    if "Analyze this" in prompt:
+        return json.dumps(responses["pdf"])
+    return "{}"
+
+class StubGroqServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 200,
+                 jitter_ms: float = 50, error_rate: float = 0.0, responses: dict = None, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.responses = dict(DEFAULT_RESPONSES, **(responses or {}))
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubGroqServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="stub-groq", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _delay_and_outcome(self):
+        with self.random_lock:
+            self.requests += 1
+            delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            failed = self.random.random() < self.error_rate
+            status = self.random.choice([429, 500]) if failed else 200
+            if failed:
+                self.errors += 1
+        return delay, status
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict, headers: dict = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "invalid JSON body"}})
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+
+                delay, status = server._delay_and_outcome()
+                time.sleep(delay)
+                if status != 200:
+                    headers = {"Retry-After": "1"} if status == 429 else {}
+                    self._send_json(status, {"error": {"message": "stub failure", "type": "stub"}}, headers)
+                    return
+
+                content = pick_response(body, server.responses)
+                prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages") or [])
+                usage = {
+                    "prompt_tokens": prompt_chars // 4,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": prompt_chars // 4 + len(content) // 4
+                }
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                if body.get("stream"):
+                    self._stream(completion_id, body.get("model"), content, usage)
+                    return
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": usage
+                })
+
+            def _stream(self, completion_id: str, model: str, content: str, usage: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+                for index, piece in enumerate(pieces):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": piece},
+                            "finish_reason": "stop" if index == len(pieces) - 1 else None
+                        }]
+                    }
+                    if index == len(pieces) - 1:
+                        chunk["x_groq"] = {"id": completion_id, "usage": usage}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a stub Groq chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--responses", help="JSON file overriding the canned response bodies")
+    args = parser.parse_args(argv)
+
+    responses = None
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+    server = StubGroqServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, responses)
+    print(f"Stub Groq server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
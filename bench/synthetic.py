@@ -0,0 +1,91 @@
+"""Synthetic documents for benchmarking: large PDFs, JSON invoices and emails."""
+import json
+import random
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: list) -> bytes:
+    """Build a minimal PDF with one Helvetica text block per page"""
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    page_ids = []
+    next_id = 4
+    for lines in pages:
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        stream = "BT /F1 10 Tf 50 800 Td 12 TL\n" + "\n".join(
+            f"({_pdf_escape(line)}) Tj T*" for line in lines
+        ) + "\nET"
+        stream_bytes = stream.encode("latin-1", errors="replace")
+        objects[content_id] = (
+            b"<< /Length " + str(len(stream_bytes)).encode() + b" >>\nstream\n" + stream_bytes + b"\nendstream"
+        )
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        page_ids.append(page_id)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += f"{object_id} 0 obj\n".encode() + objects[object_id] + b"\nendobj\n"
+    xref_offset = len(output)
+    size = max(objects) + 1
+    output += f"xref\n0 {size}\n".encode() + b"0000000000 65535 f \n"
+    for object_id in range(1, size):
+        output += f"{offsets.get(object_id, 0):010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(output)
+
+def invoice_pdf(page_count: int = 50, lines_per_page: int = 45, seed: int = 0) -> bytes:
+    """Multi-page invoice with line items on every page and a total at the end"""
+    rng = random.Random(seed)
+    pages = []
+    total = 0.0
+    for page in range(page_count):
+        lines = [f"INVOICE #INV-{seed:04d}   Page {page + 1} of {page_count}", ""]
+        for item in range(lines_per_page - 3):
+            quantity = rng.randint(1, 500)
+            price = rng.randint(100, 9999) / 100
+            total += quantity * price
+            lines.append(f"Widget {page}-{item}: {quantity} units @ ${price:.2f}")
+        if page == page_count - 1:
+            lines.append(f"TOTAL: ${total:.2f}")
+        pages.append(lines)
+    return make_pdf(pages)
+
+def invoice_json(item_count: int = 2000, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    items = [
+        {"sku": f"W-{index:05d}", "description": f"Widget {index}", "quantity": rng.randint(1, 100),
+         "unit_price": rng.randint(100, 9999) / 100}
+        for index in range(item_count)
+    ]
+    return json.dumps({
+        "id": f"INV-{seed:05d}",
+        "type": "Invoice",
+        "amount": round(sum(item["quantity"] * item["unit_price"] for item in items), 2),
+        "currency": "USD",
+        "date": "2024-05-20",
+        "due_date": "2024-06-20",
+        "items": items
+    })
+
+def long_email(paragraphs: int = 200, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    body = "\n\n".join(
+        f"Paragraph {index}: please confirm delivery of {rng.randint(10, 999)} units of Widget "
+        f"{rng.choice('ABCDEF')} by 2024-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}."
+        for index in range(paragraphs)
+    )
+    return (
+        f"From: buyer{seed}@example.com\nTo: sales@example.com\n"
+        f"Subject: Request for Quotation #{seed}\n\nDear Sales Team,\n\n{body}\n\nBest regards,\nProcurement"
+    )
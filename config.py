@@ -6,3 +6,133 @@ load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_TTL = int(os.getenv("REDIS_TTL", 7 * 24 * 3600))  # conversation expiry in seconds, 0 keeps forever
+REDIS_EVENTS_MAXLEN = int(os.getenv("REDIS_EVENTS_MAXLEN", 1000))  # approximate events kept per conversation, 0 keeps all
+
+# Shared LLM gateway
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None  # e.g. a local stub server
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3-70b-8192")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30))
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", 0))  # 0 looks the model's window up
+
+# Prompt budgets in estimated tokens (~4 characters) of document text per call,
+# further capped by the model's context window
+CLASSIFIER_TOKEN_BUDGET = int(os.getenv("CLASSIFIER_TOKEN_BUDGET", 500))
+EMAIL_TOKEN_BUDGET = int(os.getenv("EMAIL_TOKEN_BUDGET", 1000))
+PDF_TOKEN_BUDGET = int(os.getenv("PDF_TOKEN_BUDGET", 3750))
+JSON_ENHANCE_TOKEN_BUDGET = int(os.getenv("JSON_ENHANCE_TOKEN_BUDGET", 2000))
+
+# LLM rate limits and retries (0 disables a limit; set them to the account's Groq limits)
+LLM_RPM_LIMIT = float(os.getenv("LLM_RPM_LIMIT", 0))
+LLM_TPM_LIMIT = float(os.getenv("LLM_TPM_LIMIT", 0))
+LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", 512))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 30))
+
+# LLM response cache
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "output_logs/llm_cache.db")
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", 1024))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", 100000))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+
+# Classifier
+CLASSIFIER_MODE = os.getenv("CLASSIFIER_MODE", "combined")  # "combined" or "separate"
+CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", 8))
+CLASSIFIER_RULES_PATH = os.getenv(
+    "CLASSIFIER_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents", "classifier_rules.json")
+)
+
+# Conversation memory
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "sqlite")  # "sqlite" or "redis"
+MEMORY_DB_PATH = os.getenv("MEMORY_DB_PATH", "output_logs/memory.db")
+
+# Duplicate detection
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+DEDUP_ACTION = os.getenv("DEDUP_ACTION", "reuse")  # "reuse" returns the original's results, "flag" only links it
+# Near matches can differ in the details that matter (an amount, an invoice number), so by default
+# they are only linked and still classified and processed
+DEDUP_NEAR_ACTION = os.getenv("DEDUP_NEAR_ACTION", "flag")
+DEDUP_DB_PATH = os.getenv("DEDUP_DB_PATH", os.path.join(os.path.dirname(MEMORY_DB_PATH), "dedup.db"))
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 3))  # SimHash bits out of 64; at most 3
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", 30))  # shorter texts only match exactly
+
+# Document history index
+DOCUMENT_INDEX_ENABLED = os.getenv("DOCUMENT_INDEX_ENABLED", "1") == "1"
+DOCUMENT_INDEX_PATH = os.getenv(
+    "DOCUMENT_INDEX_PATH", os.path.join(os.path.dirname(MEMORY_DB_PATH), "documents.db")
+)
+DOCUMENT_INDEX_TEXT_CHARS = int(os.getenv("DOCUMENT_INDEX_TEXT_CHARS", 20000))  # per document, for full-text search
+
+# Pipeline stages
+# Threads for the short stages (store, extract, dedup, link, label) of all documents in a process;
+# LLM classification and agents run on the thread processing the document
+PIPELINE_STAGE_THREADS = int(os.getenv("PIPELINE_STAGE_THREADS", 32))
+# Start the agent of a locally classified document before the duplicate check has finished;
+# a duplicate then costs the calls already made, whose results are discarded
+PIPELINE_SPECULATE = os.getenv("PIPELINE_SPECULATE", "0") == "1"
+
+# Background jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", 100))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", 300))  # seconds per attempt, 0 disables
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", 1000))  # finished jobs kept for polling
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 0.5))
+
+# HTTP API
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", 8080))
+API_MAX_BODY_BYTES = int(os.getenv("API_MAX_BODY_BYTES", 25 * 1024 * 1024))
+API_MAX_HEADER_BYTES = int(os.getenv("API_MAX_HEADER_BYTES", 16 * 1024))
+API_SYNC_TIMEOUT = float(os.getenv("API_SYNC_TIMEOUT", 60))  # seconds a sync request waits before answering 202
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", 30))  # seconds to receive a request, also the keep-alive idle limit
+API_EVENT_INTERVAL = float(os.getenv("API_EVENT_INTERVAL", 0.1))  # seconds between server-sent event updates
+
+# Output log
+LOG_PATH = os.getenv("LOG_PATH", "output_logs/log.jsonl")
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 200))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 1.0))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024))
+LOG_ROTATE_DAILY = os.getenv("LOG_ROTATE_DAILY", "1") == "1"
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "1") == "1"
+
+# PDF extraction
+# Raw characters extracted before cleanup; extraction noise often halves the text
+PDF_CHAR_BUDGET = int(os.getenv("PDF_CHAR_BUDGET", 2 * 4 * PDF_TOKEN_BUDGET))
+PDF_SPOOL_MAX_BYTES = int(os.getenv("PDF_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 32))
+PDF_ANALYSIS_MODE = os.getenv("PDF_ANALYSIS_MODE", "truncate")  # "truncate", "chunked" or "auto"
+PDF_CHUNK_CHARS = int(os.getenv("PDF_CHUNK_CHARS", 12000))
+PDF_CHUNK_CONCURRENCY = int(os.getenv("PDF_CHUNK_CONCURRENCY", 4))
+PDF_MAX_CHUNKS = int(os.getenv("PDF_MAX_CHUNKS", 32))
+
+# Email agent
+EMAIL_ATTACHMENT_CONCURRENCY = int(os.getenv("EMAIL_ATTACHMENT_CONCURRENCY", 4))
+
+# JSON agent
+JSON_SCHEMAS_PATH = os.getenv(
+    "JSON_SCHEMAS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents", "json_schemas.json")
+)
+JSON_LLM_ENHANCEMENTS = os.getenv("JSON_LLM_ENHANCEMENTS", "0") == "1"
+JSON_STREAM_CHUNK_BYTES = int(os.getenv("JSON_STREAM_CHUNK_BYTES", 1024 * 1024))
+JSON_STREAM_MIN_BYTES = int(os.getenv("JSON_STREAM_MIN_BYTES", 1024 * 1024))  # .json arrays from this size are split into records
+
+# Local fast-path classifier
+FAST_CLASSIFIER_ENABLED = os.getenv("FAST_CLASSIFIER_ENABLED", "1") == "1"
+FAST_CLASSIFIER_PATH = os.getenv("FAST_CLASSIFIER_PATH", "models/fast_classifier.json")
+FAST_CLASSIFIER_THRESHOLD = float(os.getenv("FAST_CLASSIFIER_THRESHOLD", 0.9))
+
+# Telemetry
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1") == "1"
+TELEMETRY_METRICS_PORT = int(os.getenv("TELEMETRY_METRICS_PORT", 0))  # 0 disables the /metrics endpoint
+TELEMETRY_TRACE_LOG = os.getenv("TELEMETRY_TRACE_LOG", "0") == "1"
+TELEMETRY_TRACE_PATH = os.getenv("TELEMETRY_TRACE_PATH", "output_logs/traces.jsonl")
+TELEMETRY_TRACE_SAMPLE = float(os.getenv("TELEMETRY_TRACE_SAMPLE", 1.0))
@@ -0,0 +1,96 @@
+"""Search the history of processed documents.
+
+Usage:
+    python history.py --intent Invoice --source file: --since 7d
+    python history.py "late payment" --format email --status error --limit 20
+    python history.py --intent RFQ --cursor 48213          # the next page
+    python history.py --show 3f0c9a52-...                  # one conversation in full
+    python history.py --reindex "output_logs/log*.jsonl*"  # backfill from the conversation log
+
+Results are listed newest first. When more match than ``--limit``, the last
+line prints the cursor to pass back for the next page.
+"""
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timedelta
+
+from memory.document_index import DocumentIndex, reindex_from_log
+from memory.shared_memory import create_memory
+from config import DOCUMENT_INDEX_PATH
+
+_RELATIVE = re.compile(r"^(\d+)([mhdw])$")
+_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+def parse_time(value: str) -> str:
+    """An ISO timestamp from an ISO date/time or an age such as 30m, 12h, 7d or 2w"""
+    match = _RELATIVE.match(value.strip())
+    if match:
+        delta = timedelta(**{_UNITS[match.group(2)]: int(match.group(1))})
+        return (datetime.now() - delta).isoformat()
+    try:
+        return datetime.fromisoformat(value.strip()).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an ISO date or an age like 7d, got {value!r}")
+
+def print_page(page: dict):
+    for item in page["items"]:
+        label = f"{item['format'] or '-'}/{item['intent'] or '-'}"
+        line = f"{item['created_at'][:19]}  {item['conversation_id']}  {item['status']:<9} {label:<22} {item['source']}"
+        if item["error"]:
+            line += f"\n    error: {item['error']}"
+        if item["duplicate_of"]:
+            line += f"\n    duplicate of {item['duplicate_of']}"
+        if item["snippet"]:
+            line += "\n    " + " ".join(item["snippet"].split())
+        print(line)
+    if not page["items"]:
+        print("No matching documents.")
+    if page["next_cursor"]:
+        print(f"More results: --cursor {page['next_cursor']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the history of processed documents.")
+    parser.add_argument("query", nargs="*", help="Words that must appear in the document text or its results")
+    parser.add_argument("--format", help="email, json or pdf")
+    parser.add_argument("--intent", help="Invoice, RFQ, Complaint, Regulation, ...")
+    parser.add_argument("--agent", help="email_processor, json_processor or pdf_processor")
+    parser.add_argument("--status", choices=["ok", "error", "duplicate"])
+    parser.add_argument("--source", help="Source prefix, e.g. file: or file:invoice")
+    parser.add_argument("--since", type=parse_time, help="ISO date/time or an age such as 7d")
+    parser.add_argument("--until", type=parse_time, help="ISO date/time or an age such as 1d")
+    parser.add_argument("--limit", type=int, default=50, help="Results per page")
+    parser.add_argument("--cursor", help="Cursor printed by the previous page")
+    parser.add_argument("--json", action="store_true", help="Print the page as JSON")
+    parser.add_argument("--show", metavar="CONVERSATION_ID", help="Print one stored conversation")
+    parser.add_argument("--reindex", nargs="*", metavar="LOG",
+                        help="Index the conversations in these JSONL logs (default output_logs/log*.jsonl*)")
+    parser.add_argument("--index", default=DOCUMENT_INDEX_PATH, help="Index database path")
+    args = parser.parse_args(argv)
+
+    if args.show:
+        conversation = create_memory().retrieve_conversation(args.show)
+        if conversation is None:
+            print(f"No conversation {args.show}", file=sys.stderr)
+            return 1
+        print(json.dumps(conversation, indent=2, default=str))
+        return 0
+
+    index = DocumentIndex(args.index)
+    if args.reindex is not None:
+        count = reindex_from_log(index, args.reindex or ["output_logs/log*.jsonl*"])
+        print(f"Indexed {count} conversations into {args.index}")
+        return 0
+
+    page = index.search(" ".join(args.query), source=args.source, since=args.since, until=args.until,
+                        limit=args.limit, cursor=args.cursor, format=args.format, intent=args.intent,
+                        agent=args.agent, status=args.status)
+    if args.json:
+        print(json.dumps(page, indent=2))
+    else:
+        print_page(page)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
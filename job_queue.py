@@ -0,0 +1,412 @@
+"""Background job queue that runs documents through the pipeline off the UI thread.
+
+``submit`` enqueues a document under its conversation_id and returns at once;
+a fixed pool of worker threads runs ``pipeline.process_document`` for each
+job. The queue is bounded: once JOB_QUEUE_MAX_DEPTH jobs are waiting, new
+submissions are rejected with ``QueueFullError`` so callers can push back.
+
+Callers poll ``get(conversation_id)`` for status, streamed agent output and
+the final result. Jobs can be cancelled while queued or running and retried
+after they fail, time out or are cancelled. A running job stops at its next
+memory write or streamed token once it is cancelled or exceeds its timeout;
+work that finishes after that point is discarded.
+
+``submit_records`` feeds the records of a JSON stream into the queue from a
+background thread, one job per record, waiting for space instead of
+rejecting them, and tracks progress on a ``RecordFeed``.
+"""
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import telemetry
+from config import JOB_WORKERS, JOB_QUEUE_MAX_DEPTH, JOB_TIMEOUT, JOB_MAX_RETAINED, JOB_POLL_INTERVAL
+from pipeline import process_document
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+RETRYABLE = (FAILED, CANCELLED, TIMED_OUT)
+
+_STOP = object()
+
+class QueueFullError(RuntimeError):
+    pass
+
+class JobCancelled(BaseException):
+    """Raised inside a running job once it is cancelled or has timed out.
+
+    Derives from BaseException so the agents' ``except Exception`` handlers
+    let it through instead of recording it as a processing error.
+    """
+
+class Job:
+    def __init__(self, conversation_id: str, source: str, content, classification_input: str,
+                 timeout: float, stream: bool = False, attempts: int = 0, feed=None):
+        self.conversation_id = conversation_id
+        self.source = source
+        self.content = content
+        self.classification_input = classification_input
+        self.timeout = timeout
+        self.stream = stream
+        self.attempts = attempts
+        self.feed = feed
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.output = []
+        self.timings = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.callbacks = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def partial_output(self) -> str:
+        """Agent output streamed so far"""
+        return "".join(self.output)
+
+    def check(self):
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def on_token(self, delta: str):
+        self.check()
+        self.output.append(delta)
+
+    def to_dict(self) -> dict:
+        return {
+            "conversation_id": self.conversation_id,
+            "source": self.source,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": dict(self.timings)
+        }
+
+class RecordFeed:
+    """Progress of the records of one JSON stream being fed into the queue"""
+    def __init__(self, feed_id: str, source: str, skip_bad: bool, recent: int = 20):
+        self.id = feed_id
+        self.source = source
+        self.skip_bad = skip_bad
+        self.counts = {"read": 0, "submitted": 0, "bad": 0, SUCCEEDED: 0, FAILED: 0, CANCELLED: 0, TIMED_OUT: 0}
+        self.errors = deque(maxlen=recent)
+        self.recent = deque(maxlen=recent)
+        self.error = None
+        self.done = False
+        self.cancel_requested = False
+
+    @property
+    def finished(self) -> bool:
+        """All records read and every submitted job has finished"""
+        settled = sum(self.counts[status] for status in FINISHED)
+        return self.done and settled >= self.counts["submitted"]
+
+    def cancel(self):
+        """Stop reading further records; jobs already queued still run"""
+        self.cancel_requested = True
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "source": self.source, "done": self.done, "error": self.error,
+                "errors": list(self.errors), **self.counts}
+
+class _JobMemory:
+    """Memory proxy that stops its job at the next write once it is cancelled"""
+    def __init__(self, memory, job: Job):
+        self.memory = memory
+        self.job = job
+
+    def store(self, conversation_id: str, data: dict):
+        self.job.check()
+        self.memory.store(conversation_id, data)
+
+    def append_to_conversation(self, conversation_id: str, data: dict) -> str:
+        self.job.check()
+        return self.memory.append_to_conversation(conversation_id, data)
+
+    def __getattr__(self, name):
+        return getattr(self.memory, name)
+
+class JobQueue:
+    def __init__(self, memory, workers: int = JOB_WORKERS, max_depth: int = JOB_QUEUE_MAX_DEPTH,
+                 timeout: float = JOB_TIMEOUT, max_retained: int = JOB_MAX_RETAINED):
+        self.memory = memory
+        self.workers = workers
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.max_retained = max_retained
+        self.queue = queue.Queue(maxsize=max_depth)
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.busy = 0
+        self.counters = {"submitted": 0, "rejected": 0, "retried": 0,
+                         SUCCEEDED: 0, FAILED: 0, CANCELLED: 0, TIMED_OUT: 0}
+        self.stopped = threading.Event()
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        self.threads.append(threading.Thread(target=self._monitor, name="job-monitor", daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, source: str, content, classification_input: str, conversation_id: str = None,
+               timeout: float = None, stream: bool = False) -> Job:
+        """Queue a document; raises QueueFullError when the queue is at capacity.
+
+        With ``stream`` the agent's output is collected as it is generated
+        and can be read from ``Job.partial_output()`` while the job runs.
+        """
+        job = Job(conversation_id or str(uuid.uuid4()), source, content, classification_input,
+                  timeout if timeout is not None else self.timeout, stream=stream)
+        self._enqueue(job)
+        with self.lock:
+            self.counters["submitted"] += 1
+        telemetry.inc("jobs_total", status="submitted")
+        return job
+
+    def submit_records(self, source: str, records, skip_bad: bool = True, stream: bool = False) -> RecordFeed:
+        """Queue one job per record of ``records`` from a background thread.
+
+        ``records`` yields ``(index, text, error)`` as produced by
+        ``utils.json_stream.iter_records``. Malformed records are counted and
+        skipped with ``skip_bad``, otherwise the first one stops the feed.
+        """
+        feed = RecordFeed(str(uuid.uuid4()), source, skip_bad)
+        threading.Thread(target=self._feed, args=(feed, records, stream),
+                         name=f"job-feed-{feed.id[:8]}", daemon=True).start()
+        return feed
+
+    def _feed(self, feed: RecordFeed, records, stream: bool):
+        try:
+            for index, text, error in records:
+                if feed.cancel_requested or self.stopped.is_set():
+                    break
+                feed.counts["read"] += 1
+                if error:
+                    feed.counts["bad"] += 1
+                    feed.errors.append(f"Record {index}: {error}")
+                    if not feed.skip_bad:
+                        feed.error = f"Stopped at record {index}: {error}"
+                        break
+                    continue
+                job = Job(str(uuid.uuid4()), f"{feed.source}#{index}", text, text, self.timeout,
+                          stream=stream, feed=feed)
+                if not self._enqueue_waiting(job):
+                    break
+                feed.counts["submitted"] += 1
+                feed.recent.append(job.conversation_id)
+                with self.lock:
+                    self.counters["submitted"] += 1
+                telemetry.inc("jobs_total", status="submitted")
+        except Exception as e:
+            feed.error = str(e)
+        finally:
+            feed.done = True
+
+    def _enqueue_waiting(self, job: Job) -> bool:
+        """Queue a feed's job once there is space; False if the feed or queue stopped first"""
+        # Registered first so a worker that takes it at once finds it
+        with self.lock:
+            self.jobs[job.conversation_id] = job
+            self._prune()
+        while not self.stopped.is_set() and not job.feed.cancel_requested:
+            try:
+                self.queue.put(job, timeout=JOB_POLL_INTERVAL)
+            except queue.Full:
+                continue
+            self._update_gauges()
+            return True
+        with self.lock:
+            self.jobs.pop(job.conversation_id, None)
+        return False
+
+    def _enqueue(self, job: Job):
+        with self.lock:
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self.counters["rejected"] += 1
+                telemetry.inc("jobs_total", status="rejected")
+                raise QueueFullError(f"Job queue is full ({self.max_depth} jobs waiting)")
+            self.jobs[job.conversation_id] = job
+            self.jobs.move_to_end(job.conversation_id)
+            self._prune()
+        self._update_gauges()
+
+    def get(self, conversation_id: str) -> Job:
+        with self.lock:
+            return self.jobs.get(conversation_id)
+
+    def add_done_callback(self, job: Job, callback):
+        """Call ``callback(job)`` once the job finishes, at once if it already has.
+
+        The callback runs on the thread finishing the job with the queue lock
+        held, so it must only hand off (e.g. ``loop.call_soon_threadsafe``).
+        """
+        with self.lock:
+            if not job.finished:
+                job.callbacks.append(callback)
+                return
+        callback(job)
+
+    def request_stream(self, job: Job) -> bool:
+        """Collect a queued job's agent output as it is generated; whether the job streams.
+
+        Streaming is decided when a job starts, so a running job is left as it is.
+        """
+        with self.lock:
+            if job.status == QUEUED:
+                job.stream = True
+            return job.stream
+
+    def cancel(self, conversation_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it already finished"""
+        with self.lock:
+            job = self.jobs.get(conversation_id)
+            if job is None or job.finished:
+                return False
+            self._finish(job, CANCELLED, "Cancelled by user")
+            return True
+
+    def retry(self, conversation_id: str) -> Job:
+        """Queue a failed, timed-out or cancelled job again under the same conversation_id"""
+        with self.lock:
+            previous = self.jobs.get(conversation_id)
+        if previous is None:
+            raise KeyError(f"Unknown job: {conversation_id}")
+        if previous.status not in RETRYABLE:
+            raise ValueError(f"Job {conversation_id} is {previous.status} and cannot be retried")
+        # A fresh Job, so a cancelled run that is still unwinding cannot touch it
+        job = Job(conversation_id, previous.source, previous.content, previous.classification_input,
+                  previous.timeout, stream=previous.stream, attempts=previous.attempts)
+        self._enqueue(job)
+        with self.lock:
+            self.counters["retried"] += 1
+        telemetry.inc("jobs_total", status="retried")
+        return job
+
+    def metrics(self) -> dict:
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+            return {
+                "queue_depth": self.queue.qsize(),
+                "max_depth": self.max_depth,
+                "workers": self.workers,
+                "busy_workers": self.busy,
+                "queued": statuses.count(QUEUED),
+                "running": statuses.count(RUNNING),
+                **self.counters
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once the jobs already queued have run"""
+        self.stopped.set()
+        for _ in range(self.workers):
+            self.queue.put(_STOP)
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                return
+            with self.lock:
+                if job.status != QUEUED or self.jobs.get(job.conversation_id) is not job:
+                    continue
+                job.status = RUNNING
+                job.attempts += 1
+                job.started_at = time.time()
+                self.busy += 1
+            telemetry.observe("pipeline_stage_duration_seconds", job.started_at - job.created_at,
+                              stage="job.queue_wait")
+            self._update_gauges()
+            try:
+                self._run(job)
+            finally:
+                with self.lock:
+                    self.busy -= 1
+                self._update_gauges()
+
+    def _run(self, job: Job):
+        status, result, error, raised = SUCCEEDED, None, None, False
+        try:
+            with telemetry.span("job"):
+                outcome = process_document(
+                    job.source, job.content, job.classification_input, _JobMemory(self.memory, job),
+                    conversation_id=job.conversation_id, timings=job.timings,
+                    on_token=job.on_token if job.stream else None
+                )
+            result = outcome["result"]
+            if isinstance(result, dict) and result.get("error"):
+                status, error = FAILED, result["error"]
+        except JobCancelled:
+            return
+        except Exception as e:
+            status, error, raised = FAILED, str(e), True
+
+        with self.lock:
+            # A job cancelled, timed out or replaced by a retry keeps that state
+            if job.status != RUNNING or self.jobs.get(job.conversation_id) is not job:
+                return
+            job.result = result
+            self._finish(job, status, error)
+        # Agents record their own errors; anything that escaped them is noted here
+        if raised:
+            try:
+                self.memory.append_to_conversation(job.conversation_id, {
+                    "error": error,
+                    "processing_steps": ["Error during processing"]
+                })
+            except Exception:
+                pass
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        # Called with self.lock held
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.cancel_requested = status in (CANCELLED, TIMED_OUT)
+        self.counters[status] += 1
+        if job.feed is not None:
+            job.feed.counts[status] += 1
+        telemetry.inc("jobs_total", status=status)
+        callbacks, job.callbacks = job.callbacks, []
+        for callback in callbacks:
+            callback(job)
+
+    def _monitor(self):
+        while not self.stopped.wait(0.5):
+            now = time.time()
+            with self.lock:
+                for job in self.jobs.values():
+                    if job.status == RUNNING and job.timeout and now - job.started_at > job.timeout:
+                        self._finish(job, TIMED_OUT, f"Timed out after {job.timeout:g}s")
+
+    def _prune(self):
+        # Called with self.lock held; forget the oldest finished jobs
+        excess = len(self.jobs) - self.max_retained
+        if excess <= 0:
+            return
+        for conversation_id in [cid for cid, job in self.jobs.items() if job.finished][:excess]:
+            del self.jobs[conversation_id]
+
+    def _update_gauges(self):
+        telemetry.set_gauge("job_queue_depth", self.queue.qsize())
+        telemetry.set_gauge("job_workers_busy", self.busy)
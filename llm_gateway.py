@@ -0,0 +1,279 @@
+"""Process-wide access point for LLM calls.
+
+Every agent goes through this module instead of building its own Groq client,
+so the whole process shares one pooled keep-alive HTTP connection set, and
+every request is admitted by ``llm_scheduler`` (concurrency cap, rate-limit
+budgets, priorities and retries). Calls can be made synchronously with ``chat`` or
+concurrently with ``submit_chat`` (returns a Future) and ``achat`` (asyncio).
+Responses are served from ``llm_cache`` when an identical request was seen
+before; pass ``cache=False`` to bypass it for a single call. A reply is only
+cached once the caller could parse it (``parse``/``validate``), so a failed
+call is asked again on retry instead of being served from the cache. ``stream_chat``
+and ``chat_json(on_token=...)`` deliver output incrementally as it arrives.
+Every call is timed as an "llm" span and its token usage is counted under
+the ``agent`` label passed by the caller (see ``telemetry``).
+"""
+import contextvars
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import httpx
+from groq import Groq
+
+import telemetry
+from llm_cache import LLMCache, make_key
+from llm_scheduler import estimate_tokens, get_scheduler
+from config import (
+    GROQ_API_KEY,
+    GROQ_BASE_URL,
+    LLM_CACHE_ENABLED,
+    LLM_MODEL,
+    LLM_MAX_CONCURRENCY,
+    LLM_TIMEOUT,
+    LLM_MAX_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+)
+
+_lock = threading.Lock()
+_client = None
+_executor = None
+_cache = None
+
+def get_client() -> Groq:
+    """Return the shared Groq client, creating its connection pool on first use"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                    ),
+                    timeout=LLM_TIMEOUT,
+                )
+                _client = Groq(
+                    api_key=GROQ_API_KEY,
+                    base_url=GROQ_BASE_URL,
+                    http_client=http_client,
+                    timeout=LLM_TIMEOUT,
+                    # Retries are handled by the scheduler, which knows about the rate limits
+                    max_retries=0,
+                )
+    return _client
+
+def get_cache() -> LLMCache:
+    """Return the shared response cache"""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+    return _executor
+
+def _request_params(messages: list, model: str, temperature: float, max_tokens: int,
+                    response_format: dict) -> dict:
+    params = {"model": model, "messages": messages, "temperature": temperature}
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    if response_format is not None:
+        params["response_format"] = response_format
+    return params
+
+def _cache_lookup(key: str):
+    cached = get_cache().get(key)
+    telemetry.inc("llm_cache_lookups_total", result="miss" if cached is None else "hit")
+    return cached
+
+def _cached_reply(key: str, parse):
+    """(hit, value) for a cached reply; a reply ``parse`` rejects is dropped from the cache"""
+    cached = _cache_lookup(key)
+    if cached is None:
+        return False, None
+    try:
+        return True, parse(cached) if parse is not None else cached
+    except Exception:
+        get_cache().delete(key)
+        return False, None
+
+def chat(messages: list, model: str = LLM_MODEL, temperature: float = 0.1, max_tokens: int = None,
+         response_format: dict = None, timeout: float = None, cache: bool = True,
+         agent: str = "other", parse=None):
+    """Run one chat completion and return the message content.
+
+    With ``parse`` the result is ``parse(content)``, and the content is only
+    cached once that succeeded; its exceptions propagate.
+    """
+    use_cache = cache and LLM_CACHE_ENABLED
+    if use_cache:
+        key = make_key(model, messages, temperature, response_format, max_tokens)
+        hit, value = _cached_reply(key, parse)
+        if hit:
+            return value
+
+    params = _request_params(messages, model, temperature, max_tokens, response_format)
+
+    def create():
+        return get_client().chat.completions.create(
+            **params,
+            timeout=timeout if timeout is not None else LLM_TIMEOUT,
+        )
+
+    with telemetry.span("llm", agent=agent) as span:
+        span.set("model", model)
+        try:
+            with get_scheduler().request(create, estimate_tokens(messages, max_tokens)) as (grant, response):
+                grant.used(response.usage)
+        except Exception:
+            telemetry.inc("llm_requests_total", agent=agent, model=model, status="error")
+            raise
+    telemetry.inc("llm_requests_total", agent=agent, model=model, status="ok")
+    telemetry.record_usage(agent, model, response.usage)
+    content = response.choices[0].message.content
+    value = parse(content) if parse is not None else content
+    if use_cache:
+        get_cache().set(key, content)
+    return value
+
+def stream_chat(messages: list, model: str = LLM_MODEL, temperature: float = 0.1, max_tokens: int = None,
+                timeout: float = None, cache: bool = True, agent: str = "other", validate=None):
+    """Yield the completion text incrementally as it is generated.
+
+    A cached response is yielded in one piece. JSON mode cannot be combined
+    with streaming on Groq, so callers rely on the prompt asking for JSON and
+    parse the joined text with ``parse_json_reply``. The full text is only
+    cached when ``validate(text)`` does not raise.
+    """
+    use_cache = cache and LLM_CACHE_ENABLED
+    if use_cache:
+        key = make_key(model, messages, temperature, None, max_tokens)
+
+        def check(text: str) -> str:
+            validate(text)
+            return text
+
+        hit, cached = _cached_reply(key, check if validate is not None else None)
+        if hit:
+            yield cached
+            return
+
+    params = _request_params(messages, model, temperature, max_tokens, None)
+
+    def create():
+        return get_client().chat.completions.create(
+            **params,
+            stream=True,
+            timeout=timeout if timeout is not None else LLM_TIMEOUT,
+        )
+
+    parts = []
+    usage = None
+    # A generator cannot hold the span's context across yields, so it is timed by hand
+    span = telemetry.Span("llm", {"agent": agent}, telemetry.current_span())
+    span.set("model", model)
+    span.set("stream", True)
+    try:
+        # Only opening the stream is retried; tokens already yielded cannot be taken back
+        with get_scheduler().request(create, estimate_tokens(messages, max_tokens)) as (grant, stream):
+            for chunk in stream:
+                # Groq reports usage on the final chunk
+                x_groq = getattr(chunk, "x_groq", None)
+                usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            grant.used(usage)
+    except GeneratorExit:
+        span.status = "cancelled"
+        raise
+    except BaseException:
+        span.status = "error"
+        raise
+    finally:
+        span.duration = time.perf_counter() - span.started
+        telemetry.finish(span)
+        telemetry.inc("llm_requests_total", agent=agent, model=model, status=span.status)
+    telemetry.record_usage(agent, model, usage)
+    if use_cache:
+        text = "".join(parts)
+        if validate is not None:
+            try:
+                validate(text)
+            except Exception:
+                # The caller's own parse reports the error
+                return
+        get_cache().set(key, text)
+
+def parse_json_reply(text: str):
+    """Parse a JSON object from a reply that may carry fences or commentary"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        start = text.find("{")
+        end = text.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return json.loads(text[start:end + 1])
+
+def chat_json(messages: list, on_token=None, validate=None, **kwargs) -> dict:
+    """JSON-mode completion; streams through ``on_token(delta)`` when given.
+
+    ``validate(reply)`` may check the parsed reply and raise; a reply that
+    fails to parse or validate is not cached.
+    """
+    def parse(text: str, loads=json.loads):
+        reply = loads(text)
+        if validate is not None:
+            validate(reply)
+        return reply
+
+    if on_token is None:
+        return chat(messages, response_format={"type": "json_object"}, parse=parse, **kwargs)
+    parts = []
+    for delta in stream_chat(messages, validate=lambda text: parse(text, parse_json_reply), **kwargs):
+        parts.append(delta)
+        on_token(delta)
+    return parse("".join(parts), parse_json_reply)
+
+def submit(fn, *args, **kwargs) -> Future:
+    """Run ``fn`` on the gateway's worker pool, e.g. to overlap several LLM calls"""
+    # Carry the caller's context so spans started in the pool nest under its span
+    context = contextvars.copy_context()
+    return _get_executor().submit(context.run, fn, *args, **kwargs)
+
+def submit_chat(messages: list, **kwargs) -> Future:
+    """Start a chat completion in the background and return its Future"""
+    return submit(chat, messages, **kwargs)
+
+async def achat(messages: list, **kwargs) -> str:
+    """asyncio flavour of ``chat`` sharing the same connection pool and cap"""
+    return await asyncio.wrap_future(submit_chat(messages, **kwargs))
+
+def close():
+    """Drain the worker pool and close pooled connections"""
+    global _client, _executor, _cache
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        if _client is not None:
+            _client.close()
+            _client = None
+        if _cache is not None:
+            _cache.close()
+            _cache = None
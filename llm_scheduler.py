@@ -0,0 +1,278 @@
+"""Rate-limit-aware admission control for LLM calls.
+
+Every request made by ``llm_gateway`` first takes a slot from the shared
+``LLMScheduler``. A slot is granted when a concurrency slot is free, the
+requests-per-minute bucket holds a request and the tokens-per-minute bucket
+holds the call's estimated tokens (prompt text / 4 plus the completion
+allowance). Once the response arrives the estimate is corrected with the
+reported usage. Waiting calls are served by priority, so interactive UI
+requests go ahead of batch work, and in arrival order within a priority.
+
+429 and 5xx responses, timeouts and connection errors are retried with
+exponential backoff and full jitter, up to LLM_MAX_RETRIES times. A
+Retry-After header sets the minimum delay, and after a 429 every caller
+pauses until the server says the window has reset.
+"""
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import groq
+
+import telemetry
+from config import (
+    LLM_RPM_LIMIT,
+    LLM_TPM_LIMIT,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_COMPLETION_TOKEN_ESTIMATE,
+)
+
+INTERACTIVE = 0
+BATCH = 10
+
+_priority = contextvars.ContextVar("llm_priority", default=None)
+_default_priority = INTERACTIVE
+_scheduler = None
+_lock = threading.Lock()
+
+def set_default_priority(level: int):
+    """Priority for calls made outside a ``priority()`` block in this process"""
+    global _default_priority
+    _default_priority = level
+
+def current_priority() -> int:
+    level = _priority.get()
+    return _default_priority if level is None else level
+
+@contextmanager
+def priority(level: int):
+    """Run the enclosed LLM calls at ``level`` (lower runs first)"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def estimate_tokens(messages: list, max_tokens: int = None) -> int:
+    """Rough token cost of a request: ~4 characters per prompt token plus the completion allowance"""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+    prompt_tokens = prompt_chars // 4 + 4 * len(messages)
+    return prompt_tokens + (max_tokens if max_tokens is not None else LLM_COMPLETION_TOKEN_ESTIMATE)
+
+class TokenBucket:
+    """Refills ``per_minute`` units evenly over a minute, holding at most a minute's worth"""
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available (0 if they are now)"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        # Negative amounts charge for usage beyond the estimate; the level may
+        # go below zero, which delays later calls until it has refilled
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+class Grant:
+    __slots__ = ("tokens", "used_tokens")
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.used_tokens = None
+
+    def used(self, usage):
+        """Record the usage reported for the request (object or dict)"""
+        if usage is None:
+            return
+        total = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+        if total is not None:
+            self.used_tokens = total
+
+class LLMScheduler:
+    def __init__(self, rpm: float = LLM_RPM_LIMIT, tpm: float = LLM_TPM_LIMIT,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.counters = {"granted": 0, "retries": 0, "rate_limited": 0, "gave_up": 0}
+
+    def configure(self, rpm: float = None, tpm: float = None):
+        """Change the per-minute budgets, e.g. to split them across worker processes"""
+        with self.condition:
+            if rpm is not None:
+                self.requests = TokenBucket(rpm)
+            if tpm is not None:
+                self.tokens = TokenBucket(tpm)
+            self.condition.notify_all()
+
+    def acquire(self, tokens: int, level: int = None) -> Grant:
+        """Block until the call may start; waiters are served in priority order"""
+        level = current_priority() if level is None else level
+        started = time.monotonic()
+        with self.condition:
+            entry = [level, next(self.sequence)]
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    timeout = None
+                    if self.waiting[0] is entry and self.in_flight < self.max_concurrency:
+                        now = time.monotonic()
+                        timeout = max(
+                            self.paused_until - now,
+                            self.requests.wait_time(1, now),
+                            self.tokens.wait_time(tokens, now),
+                        )
+                        if timeout <= 0:
+                            break
+                    self.condition.wait(timeout)
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            self.counters["granted"] += 1
+            # The next waiter may be able to start as well
+            self.condition.notify_all()
+        telemetry.observe("pipeline_stage_duration_seconds", time.monotonic() - started,
+                          stage="llm.queue_wait", priority="batch" if level >= BATCH else "interactive")
+        return Grant(tokens)
+
+    def release(self, grant: Grant):
+        with self.condition:
+            self.in_flight -= 1
+            if grant.used_tokens is not None:
+                self.tokens.give_back(grant.tokens - grant.used_tokens)
+            self.condition.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold every caller for ``seconds``, e.g. after a 429"""
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.condition.notify_all()
+
+    @contextmanager
+    def request(self, fn, tokens: int, level: int = None):
+        """Run ``fn`` (which starts the API request) under a slot, retrying transient errors.
+
+        Yields ``(grant, result)``; the slot is held until the block exits, so
+        a streamed response keeps its slot while it is being read.
+        """
+        attempt = 0
+        while True:
+            grant = self.acquire(tokens, level)
+            try:
+                result = fn()
+            except Exception as e:
+                self.release(grant)
+                if not is_retryable(e):
+                    raise
+                if attempt >= self.max_retries:
+                    with self.condition:
+                        self.counters["gave_up"] += 1
+                    raise
+                delay = self.backoff(attempt, e)
+                attempt += 1
+                with self.condition:
+                    self.counters["retries"] += 1
+                telemetry.inc("llm_retries_total", reason=_reason(e))
+                time.sleep(delay)
+                continue
+            try:
+                yield grant, result
+            finally:
+                self.release(grant)
+            return
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if getattr(error, "status_code", None) == 429:
+            with self.condition:
+                self.counters["rate_limited"] += 1
+            self.pause(retry_after if retry_after is not None else delay)
+        return delay
+
+    def stats(self) -> dict:
+        with self.condition:
+            return dict(self.counters, in_flight=self.in_flight, waiting=len(self.waiting))
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, groq.APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+def retry_after_seconds(error: Exception):
+    """Delay requested by the server's Retry-After header, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _reason(error: Exception) -> str:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return str(status)
+    return "timeout" if isinstance(error, groq.APITimeoutError) else "connection"
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
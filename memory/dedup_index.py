@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from config import DEDUP_DB_PATH, DEDUP_MAX_DISTANCE, DEDUP_MIN_WORDS
+from utils.fingerprint import bands, distance
+
+_index = None
+_lock = threading.Lock()
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+class DedupIndex:
+    """Fingerprints of processed documents, keyed by conversation_id.
+
+    Kept in its own WAL-mode SQLite file next to the conversation store. An
+    exact match is looked up by hash; near matches are the documents sharing
+    a SimHash band whose SimHash is at most ``max_distance`` bits away.
+    """
+    def __init__(self, path: str = DEDUP_DB_PATH, max_distance: int = DEDUP_MAX_DISTANCE,
+                 min_words: int = DEDUP_MIN_WORDS):
+        self.path = path
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = self._connect()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        with self.conn:
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                conversation_id TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                words INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_sha256 ON documents (sha256, created_at)")
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS simhash_bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                conversation_id TEXT NOT NULL,
+                PRIMARY KEY (band, value, conversation_id)
+            ) WITHOUT ROWID
+            """)
+
+    def _query(self, sql: str, params: tuple) -> list:
+        if self.path == ":memory:":
+            with self.lock:
+                return self.conn.execute(sql, params).fetchall()
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn.execute(sql, params).fetchall()
+
+    def add(self, conversation_id: str, fingerprint: dict):
+        """Record a processed document as a possible original for later uploads"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents (conversation_id, sha256, simhash, words, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, fingerprint["sha256"], _signed(fingerprint["simhash"]),
+                 fingerprint["words"], datetime.now().isoformat())
+            )
+            if fingerprint["words"] >= self.min_words:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO simhash_bands (band, value, conversation_id) VALUES (?, ?, ?)",
+                    [(band, value, conversation_id) for band, value in enumerate(bands(fingerprint["simhash"]))]
+                )
+
+    def find(self, fingerprint: dict):
+        """The closest earlier document, or None.
+
+        Returns ``conversation_id``, ``exact``, the SimHash ``distance`` and
+        ``similarity`` (1 - distance / 64). Ties go to the oldest document.
+        """
+        rows = self._query(
+            "SELECT conversation_id FROM documents WHERE sha256 = ? ORDER BY created_at LIMIT 1",
+            (fingerprint["sha256"],)
+        )
+        if rows:
+            return {"conversation_id": rows[0][0], "exact": True, "distance": 0, "similarity": 1.0}
+        # Short texts share too many shingles by chance
+        if fingerprint["words"] < self.min_words:
+            return None
+
+        best = None
+        for band, value in enumerate(bands(fingerprint["simhash"])):
+            candidates = self._query(
+                "SELECT d.conversation_id, d.simhash, d.created_at FROM simhash_bands b "
+                "JOIN documents d ON d.conversation_id = b.conversation_id "
+                "WHERE b.band = ? AND b.value = ? LIMIT 200",
+                (band, value)
+            )
+            for conversation_id, simhash, created_at in candidates:
+                bits = distance(fingerprint["simhash"], simhash & ((1 << 64) - 1))
+                if bits <= self.max_distance and (best is None or (bits, created_at) < best[:2]):
+                    best = (bits, created_at, conversation_id)
+        if best is None:
+            return None
+        return {"conversation_id": best[2], "exact": False, "distance": best[0],
+                "similarity": round(1 - best[0] / 64, 4)}
+
+def get_dedup_index() -> DedupIndex:
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = DedupIndex()
+    return _index
@@ -0,0 +1,210 @@
+"""Queryable index of processed documents.
+
+One row per conversation holds the columns history is filtered on (format,
+intent, agent, source, status, timestamp) with an index per column, and an
+FTS5 table holds the document text and the agent results (or error) for
+full-text search. Results come newest first and are paged by keyset on the row id
+("cursor"), so every page is an index range scan regardless of how deep it
+is or how many conversations are stored.
+
+Documents processed before the index existed can be added from the
+conversation log with ``python history.py --reindex``.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from config import DOCUMENT_INDEX_PATH, DOCUMENT_INDEX_TEXT_CHARS
+from utils.text_budget import normalize_whitespace
+
+FILTERS = ("format", "intent", "agent", "status")
+
+_index = None
+_lock = threading.Lock()
+
+class DocumentIndex:
+    def __init__(self, path: str = DOCUMENT_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = self._connect()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        with self.conn:
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL UNIQUE,
+                source TEXT NOT NULL,
+                format TEXT,
+                intent TEXT,
+                agent TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                duplicate_of TEXT,
+                created_at TEXT NOT NULL
+            )
+            """)
+            # Each filter column is paired with id so a filtered page is one range scan
+            for column in FILTERS + ("source", "created_at"):
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_documents_{column} ON documents ({column}, id)"
+                )
+            self.conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts
+            USING fts5(text, results, tokenize = 'unicode61 remove_diacritics 2')
+            """)
+
+    def _query(self, sql: str, params: tuple) -> list:
+        if self.path == ":memory:":
+            with self.lock:
+                return self.conn.execute(sql, params).fetchall()
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn.execute(sql, params).fetchall()
+
+    def add(self, conversation_id: str, source: str, classification: dict = None, agent: str = None,
+            result=None, error: str = None, text: str = "", duplicate_of: str = None,
+            created_at: str = None):
+        """Index (or re-index) one processed conversation"""
+        classification = classification or {}
+        status = "error" if error else ("duplicate" if duplicate_of else "ok")
+        with self.lock, self.conn:
+            previous = self.conn.execute(
+                "SELECT id FROM documents WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+            if previous is not None:
+                # A retried job replaces its earlier entry and moves to the top
+                self.conn.execute("DELETE FROM documents WHERE id = ?", previous)
+                self.conn.execute("DELETE FROM documents_fts WHERE rowid = ?", previous)
+            cursor = self.conn.execute(
+                "INSERT INTO documents (conversation_id, source, format, intent, agent, status, error, "
+                "duplicate_of, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (conversation_id, source, classification.get("format"), classification.get("intent"), agent,
+                 status, error, duplicate_of, created_at or datetime.now().isoformat())
+            )
+            self.conn.execute(
+                "INSERT INTO documents_fts (rowid, text, results) VALUES (?, ?, ?)",
+                (cursor.lastrowid, normalize_whitespace((text or "")[:DOCUMENT_INDEX_TEXT_CHARS]),
+                 " ".join(filter(None, (error, result_text(result)))))
+            )
+
+    def search(self, query: str = None, source: str = None, since: str = None, until: str = None,
+               limit: int = 50, cursor: str = None, **filters) -> dict:
+        """One page of documents, newest first.
+
+        ``filters`` match FILTERS columns exactly, ``source`` matches as a
+        prefix, ``since``/``until`` bound the ISO timestamp and ``query`` is
+        full-text (every word must appear). Pass the returned
+        ``next_cursor`` back as ``cursor`` for the following page.
+        """
+        conditions, params = [], []
+        for column, value in filters.items():
+            if column not in FILTERS:
+                raise ValueError(f"Unknown filter: {column}")
+            if value:
+                conditions.append(f"d.{column} = ?")
+                params.append(value)
+        if source:
+            # A prefix as a range, so the index is used
+            conditions.append("d.source >= ? AND d.source < ?")
+            params.extend([source, source + "\U0010ffff"])
+        if since:
+            conditions.append("d.created_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("d.created_at < ?")
+            params.append(until)
+        # Ordering by the FTS rowid lets a text match be read newest first and stop at the limit
+        key = "documents_fts.rowid" if query else "d.id"
+        if cursor:
+            conditions.append(f"{key} < ?")
+            params.append(int(cursor))
+
+        columns = ("d.id, d.conversation_id, d.source, d.format, d.intent, d.agent, d.status, d.error, "
+                   "d.duplicate_of, d.created_at")
+        if query:
+            sql = (f"SELECT {columns}, snippet(documents_fts, -1, '[', ']', '…', 12) "
+                   "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+                   "WHERE documents_fts MATCH ?")
+            params.insert(0, fts_query(query))
+        else:
+            sql = f"SELECT {columns}, NULL FROM documents d WHERE 1 = 1"
+        for condition in conditions:
+            sql += f" AND {condition}"
+        sql += f" ORDER BY {key} DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._query(sql, tuple(params))
+        names = ("id", "conversation_id", "source", "format", "intent", "agent", "status", "error",
+                 "duplicate_of", "created_at", "snippet")
+        items = [dict(zip(names, row)) for row in rows[:limit]]
+        return {
+            "items": items,
+            "next_cursor": str(items[-1]["id"]) if len(rows) > limit else None
+        }
+
+def fts_query(text: str) -> str:
+    """Quote each word so user input is never parsed as FTS5 syntax"""
+    words = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{word}"' for word in words)
+
+def result_text(result) -> str:
+    """The values of an agent result as plain text for the full-text index"""
+    values = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+        elif value is not None:
+            values.append(str(value))
+
+    walk(result)
+    return " ".join(values)[:DOCUMENT_INDEX_TEXT_CHARS]
+
+def get_document_index() -> DocumentIndex:
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = DocumentIndex()
+    return _index
+
+def reindex_from_log(index: DocumentIndex, patterns: list) -> int:
+    """Index every classified conversation found in the JSONL conversation log"""
+    from agents.fast_classifier import iter_log_entries
+
+    states = {}
+    for entry in iter_log_entries(patterns):
+        data = entry.get("data")
+        if isinstance(data, dict) and entry.get("conversation_id"):
+            state = states.setdefault(entry["conversation_id"], {"timestamp": entry.get("timestamp")})
+            state.update(data)
+    count = 0
+    for conversation_id, state in states.items():
+        if not isinstance(state.get("classification"), dict):
+            continue
+        duplicate = state.get("duplicate_of")
+        index.add(
+            conversation_id, state.get("source", ""), state["classification"], agent=state.get("agent"),
+            result=state.get("results"), error=state.get("error"),
+            text=state.get("pdf_text_sample") or state.get("original_content") or "",
+            duplicate_of=duplicate.get("conversation_id") if isinstance(duplicate, dict) else None,
+            created_at=state.get("upload_timestamp") or state.get("timestamp")
+        )
+        count += 1
+    return count
@@ -0,0 +1,96 @@
+import json
+from datetime import datetime
+
+import redis
+
+import telemetry
+from config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_TTL, REDIS_EVENTS_MAXLEN
+
+class RedisMemory:
+    """Conversation store in Redis, shared by every app replica.
+
+    Each conversation has a hash ``<prefix>:<id>:state`` with one JSON value
+    per field (the merged latest state) and a stream ``<prefix>:<id>:events``
+    with one entry per store/append. An append only sets the fields it
+    carries, and all of a write's commands go out in one MULTI/EXEC pipeline;
+    an append WATCHes the state so that of two first writers racing, only one
+    records "store". Both keys expire ``ttl`` seconds after the last write
+    (0 keeps them), and the stream is trimmed to about ``events_maxlen``
+    entries (0 keeps every event).
+
+    Pass ``client`` to use an existing connection, e.g. ``fakeredis.FakeRedis()``.
+    """
+    def __init__(self, client=None, host: str = REDIS_HOST, port: int = REDIS_PORT,
+                 db: int = REDIS_DB, ttl: int = REDIS_TTL, prefix: str = "conversation",
+                 events_maxlen: int = REDIS_EVENTS_MAXLEN):
+        self.client = client if client is not None else redis.Redis(host=host, port=port, db=db)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.events_maxlen = events_maxlen or None
+
+    def _keys(self, conversation_id: str) -> tuple:
+        base = f"{self.prefix}:{conversation_id}"
+        return f"{base}:state", f"{base}:events"
+
+    def _write(self, conversation_id: str, step: str, data: dict, replace: bool = False) -> str:
+        state_key, events_key = self._keys(conversation_id)
+        timestamp = datetime.now().isoformat()
+        fields = {field: json.dumps(value, default=str) for field, value in data.items()}
+
+        def queue(pipe, step: str):
+            pipe.multi()
+            if replace:
+                pipe.delete(state_key)
+            if fields:
+                pipe.hset(state_key, mapping=fields)
+            pipe.xadd(events_key, {
+                "step": step,
+                "data": json.dumps(data, default=str),
+                "timestamp": timestamp
+            }, maxlen=self.events_maxlen, approximate=True)
+            if self.ttl:
+                pipe.expire(state_key, self.ttl)
+                pipe.expire(events_key, self.ttl)
+
+        def append(pipe) -> str:
+            # Runs again if another writer touches the state before EXEC
+            step = "append" if pipe.exists(state_key) else "store"
+            queue(pipe, step)
+            return step
+
+        with telemetry.span("memory.write"):
+            if step is None:
+                return self.client.transaction(append, state_key, value_from_callable=True)
+            pipe = self.client.pipeline(transaction=True)
+            queue(pipe, step)
+            pipe.execute()
+        return step
+
+    def store(self, conversation_id: str, data: dict):
+        self._write(conversation_id, "store", data, replace=True)
+
+    def append_to_conversation(self, conversation_id: str, data: dict) -> str:
+        """Merge fields into a conversation; returns the recorded step name"""
+        return self._write(conversation_id, None, data)
+
+    def retrieve_conversation(self, conversation_id: str) -> dict:
+        state_key, _ = self._keys(conversation_id)
+        fields = self.client.hgetall(state_key)
+        return {_text(field): json.loads(value) for field, value in fields.items()} if fields else None
+
+    def conversation_events(self, conversation_id: str) -> list:
+        """Full ordered event history for a conversation"""
+        _, events_key = self._keys(conversation_id)
+        events = []
+        for _, entry in self.client.xrange(events_key):
+            entry = {_text(key): _text(value) for key, value in entry.items()}
+            events.append({
+                "step": entry["step"],
+                "data": json.loads(entry["data"]),
+                "timestamp": entry["timestamp"]
+            })
+        return events
+
+def _text(value) -> str:
+    # Clients created without decode_responses return bytes
+    return value.decode("utf-8") if isinstance(value, bytes) else value
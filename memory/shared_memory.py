@@ -1,43 +1,174 @@
+import json
+import os
 import sqlite3
+import threading
 from datetime import datetime
+import telemetry
+from config import MEMORY_BACKEND, MEMORY_DB_PATH
+from utils.log_writer import get_log_writer
 
 class SharedMemory:
-    def __init__(self):
-        self.conn = sqlite3.connect(":memory:")
+    """Append-only conversation store backed by a WAL-mode SQLite file.
+
+    Every store/append is recorded as one row in ``conversation_events``. The
+    merged "latest state" of each conversation is materialized one field per
+    row in ``conversation_state``, so an append only touches the fields it
+    carries instead of rewriting the whole conversation. Writes are serialized
+    on one connection; reads use a per-thread connection and run concurrently
+    with the writer.
+    """
+    def __init__(self, path: str = MEMORY_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = self._connect()
         self._init_db()
-        
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
     def _init_db(self):
-        self.conn.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            conversation_id TEXT PRIMARY KEY,
-            data TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-    
-    def store(self, conversation_id: str, data: dict):
-        self.conn.execute(
-            "INSERT INTO conversations (conversation_id, data) VALUES (?, ?)",
-            (conversation_id, str(data))
-        )
-        self.conn.commit()
-    
-    def append_to_conversation(self, conversation_id: str, data: dict):
-        existing = self.retrieve_conversation(conversation_id)
-        if existing:
-            updated = {**existing, **data}
+        with self.conn:
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_events (
+                event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                step TEXT NOT NULL,
+                data TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+            """)
+            self.conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_events_conversation
+            ON conversation_events (conversation_id, event_id)
+            """)
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_state (
+                conversation_id TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (conversation_id, field)
+            ) WITHOUT ROWID
+            """)
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self.local.conn = conn
+        return conn
+
+    def _write(self, conversation_id: str, step: str, data: dict, replace: bool = False) -> str:
+        timestamp = datetime.now().isoformat()
+        fields = [
+            (conversation_id, field, json.dumps(value, default=str), timestamp)
+            for field, value in data.items()
+        ]
+        with telemetry.span("memory.write"), self.lock, self.conn:
+            if step is None:
+                step = "append" if self._exists(conversation_id) else "store"
             self.conn.execute(
-                "UPDATE conversations SET data = ? WHERE conversation_id = ?",
-                (str(updated), conversation_id)
+                "INSERT INTO conversation_events (conversation_id, step, data, timestamp) VALUES (?, ?, ?, ?)",
+                (conversation_id, step, json.dumps(data, default=str), timestamp)
+            )
+            if replace:
+                self.conn.execute(
+                    "DELETE FROM conversation_state WHERE conversation_id = ?",
+                    (conversation_id,)
+                )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO conversation_state (conversation_id, field, value, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                fields
             )
-        else:
-            self.store(conversation_id, data)
-        self.conn.commit()
-    
+        return step
+
+    def _exists(self, conversation_id: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM conversation_state WHERE conversation_id = ? LIMIT 1",
+            (conversation_id,)
+        ).fetchone() is not None
+
+    def store(self, conversation_id: str, data: dict):
+        self._write(conversation_id, "store", data, replace=True)
+
+    def append_to_conversation(self, conversation_id: str, data: dict) -> str:
+        """Merge fields into a conversation; returns the recorded step name"""
+        return self._write(conversation_id, None, data)
+
+    def _query(self, sql: str, params: tuple) -> list:
+        # An in-memory database is private to its connection, so reads have
+        # to share the writer's connection
+        if self.path == ":memory:":
+            with self.lock:
+                return self.conn.execute(sql, params).fetchall()
+        return self._reader().execute(sql, params).fetchall()
+
     def retrieve_conversation(self, conversation_id: str) -> dict:
-        cursor = self.conn.execute(
-            "SELECT data FROM conversations WHERE conversation_id = ?",
+        rows = self._query(
+            "SELECT field, value FROM conversation_state WHERE conversation_id = ?",
+            (conversation_id,)
+        )
+        return {field: json.loads(value) for field, value in rows} if rows else None
+
+    def conversation_events(self, conversation_id: str) -> list:
+        """Full ordered event history for a conversation"""
+        rows = self._query(
+            "SELECT step, data, timestamp FROM conversation_events WHERE conversation_id = ? ORDER BY event_id",
             (conversation_id,)
         )
-        result = cursor.fetchone()
-        return eval(result[0]) if result else None
\ No newline at end of file
+        return [
+            {"step": step, "data": json.loads(data), "timestamp": timestamp}
+            for step, data, timestamp in rows
+        ]
+
+def log_to_file(conversation_id: str, step: str, data: dict):
+    """Queue a log entry for the background writer; never waits on disk"""
+    log_entry = {
+        "timestamp": datetime.now().isoformat(),
+        "conversation_id": conversation_id,
+        "step": step,
+        "data": data
+    }
+    get_log_writer().write(log_entry)
+
+class ThreadSafeSharedMemory:
+    """Wraps the configured memory backend and mirrors every write into the JSONL log.
+
+    The log is what the fast classifier trains from and what
+    ``history.py --reindex`` rebuilds the history index from, so every
+    process that runs documents for users (the app, the HTTP API) wraps its
+    store in this.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def store(self, conversation_id: str, data: dict):
+        self.backend.store(conversation_id, data)
+        log_to_file(conversation_id, "store", data)
+
+    def append_to_conversation(self, conversation_id: str, data: dict) -> str:
+        step = self.backend.append_to_conversation(conversation_id, data)
+        log_to_file(conversation_id, step, data)
+        return step
+
+    def retrieve_conversation(self, conversation_id: str) -> dict:
+        return self.backend.retrieve_conversation(conversation_id)
+
+    def conversation_events(self, conversation_id: str) -> list:
+        return self.backend.conversation_events(conversation_id)
+
+def create_memory(backend: str = MEMORY_BACKEND):
+    """Build the configured conversation store ("sqlite" or "redis")"""
+    if backend == "sqlite":
+        return SharedMemory()
+    if backend == "redis":
+        from memory.redis_memory import RedisMemory
+        return RedisMemory()
+    raise ValueError(f"Unknown memory backend: {backend}")
@@ -0,0 +1,364 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+import telemetry
+from config import (
+    DEDUP_ENABLED,
+    DEDUP_ACTION,
+    DEDUP_NEAR_ACTION,
+    DOCUMENT_INDEX_ENABLED,
+    PDF_ANALYSIS_MODE,
+    PDF_CHAR_BUDGET,
+    PIPELINE_SPECULATE,
+)
+from agents.classifier_agent import local_classification, llm_classification
+from agents.email_agent import process_email
+from agents.json_agent import process_json
+from agents.pdf_agent import process_pdf
+from memory.dedup_index import get_dedup_index
+from memory.document_index import get_document_index
+from utils.fingerprint import fingerprint
+from utils.pdf_extract import extract_pdf_text, limit_extraction
+from utils.stage_graph import StageGraph
+
+SUPPORTED_EXTENSIONS = (".pdf", ".json", ".txt", ".eml")
+
+AGENTS = {"email": "email_processor", "json": "json_processor", "pdf": "pdf_processor"}
+
+def prepare_content(file_name: str, raw_content) -> tuple:
+    """Return (content, classification_input) for an uploaded file.
+
+    ``raw_content`` may be bytes, a path or a binary file object. PDFs are
+    passed through untouched so the PDF agent can read them lazily.
+    """
+    if file_name.endswith(".pdf"):
+        return raw_content, "[PDF FILE]"
+    if file_name.endswith((".txt", ".eml", ".json")):
+        with telemetry.span("decode"):
+            if isinstance(raw_content, os.PathLike):
+                raw_content = Path(raw_content).read_bytes()
+            elif hasattr(raw_content, "read"):
+                raw_content = raw_content.read()
+            content = raw_content.decode("utf-8", errors="ignore")
+        return content, content
+    raise ValueError("Unsupported file format.")
+
+def route_to_agent(classification: dict, content, conversation_id: str, memory, on_token=None,
+                   extraction: dict = None) -> dict:
+    """Send content to the agent matching its classified format.
+
+    ``extraction`` is PDF text already extracted from ``content``, which the
+    PDF agent then does not read again.
+    """
+    with telemetry.span("agent", format=classification["format"]):
+        return _run_agent(classification, content, conversation_id, memory, on_token, extraction)
+
+def _run_agent(classification: dict, content, conversation_id: str, memory, on_token=None,
+               extraction: dict = None) -> dict:
+    if classification["format"] == "email":
+        return process_email(content, conversation_id, memory, on_token=on_token)
+    if classification["format"] == "json":
+        return process_json(content, conversation_id, memory, on_token=on_token,
+                            intent=classification.get("intent"))
+    if classification["format"] == "pdf":
+        return process_pdf(content, conversation_id, memory, on_token=on_token, extraction=extraction)
+    raise ValueError("Unsupported format for processing.")
+
+class SpeculationAbandoned(BaseException):
+    """Stops a speculative agent once its document turned out to be a reused duplicate.
+
+    Derives from BaseException so the agents' ``except Exception`` handlers
+    let it through.
+    """
+
+class BufferedMemory:
+    """Memory proxy holding an agent's writes until ``flush`` applies them in order"""
+    def __init__(self, memory):
+        self.memory = memory
+        self.writes = []
+        self.abandoned = False
+        self.lock = threading.Lock()
+
+    def append_to_conversation(self, conversation_id: str, data: dict) -> str:
+        with self.lock:
+            if self.abandoned:
+                raise SpeculationAbandoned()
+            self.writes.append((conversation_id, data))
+        return "append"
+
+    def flush(self):
+        with self.lock:
+            writes, self.writes = self.writes, []
+        for conversation_id, data in writes:
+            self.memory.append_to_conversation(conversation_id, data)
+
+    def abandon(self):
+        """Drop the held writes and stop the agent at its next write or token"""
+        with self.lock:
+            self.abandoned = True
+            self.writes = []
+
+    def wrap(self, on_token):
+        if on_token is None:
+            return None
+
+        def forward(delta: str):
+            if self.abandoned:
+                raise SpeculationAbandoned()
+            on_token(delta)
+
+        return forward
+
+    def __getattr__(self, name):
+        return getattr(self.memory, name)
+
+def read_document(content, char_budget: int = PDF_CHAR_BUDGET) -> tuple:
+    """(text, extraction) of a document read ahead of its agent; (None, None) when it can't be.
+
+    PDFs are extracted up to ``char_budget`` characters (every page with
+    None), so the text is available without an LLM call and ``extraction``
+    can be handed on to the agent.
+    """
+    if hasattr(content, "read") and not content.seekable():
+        # A one-shot stream is left for the agent to read
+        return None, None
+    if isinstance(content, str):
+        return content, None
+    try:
+        extraction = extract_pdf_text(content, char_budget)
+    except Exception:
+        # Unreadable content fails in its agent with a proper error
+        return None, None
+    return extraction["text"], extraction
+
+def find_duplicate(text: str) -> tuple:
+    """(fingerprint, match) for a document's text; the match is None for new documents"""
+    document = fingerprint(text)
+    match = get_dedup_index().find(document)
+    if match is None:
+        telemetry.inc("dedup_lookups_total", result="miss")
+    else:
+        telemetry.inc("dedup_lookups_total", result="exact" if match["exact"] else "near")
+    return document, match
+
+def index_document(conversation_id: str, source: str, classification: dict, result=None, error: str = None,
+                   text: str = None, duplicate: dict = None):
+    """Add a processed document to the history index"""
+    if error is None and isinstance(result, dict) and result.get("error"):
+        error = str(result["error"])
+    with telemetry.span("index"):
+        get_document_index().add(
+            conversation_id, source, classification,
+            agent=AGENTS.get((classification or {}).get("format")),
+            result=result, error=error, text=text or "",
+            duplicate_of=duplicate["conversation_id"] if duplicate else None
+        )
+
+def process_document(source: str, content, classification_input: str, memory,
+                     conversation_id: str = None, timings: dict = None, on_token=None,
+                     dedup: bool = DEDUP_ENABLED, index: bool = DOCUMENT_INDEX_ENABLED,
+                     speculate: bool = PIPELINE_SPECULATE) -> dict:
+    """Run the full classify-then-agent pipeline for one document.
+
+    Mirrors the steps the Streamlit app performs for a single upload, as a
+    graph of stages: after local classification (heuristics, then the
+    fast-path model), storing the upload, reading its text (a PDF is
+    extracted once, for the duplicate check, the index and its agent) and
+    the duplicate check run concurrently, and the LLM is only asked when
+    the local tiers have no confident answer. The LLM classification and
+    the agent run on the calling thread. Stage durations (seconds) are
+    written into ``timings`` when it is provided, and ``on_token`` receives
+    the agent's streamed output.
+
+    With ``speculate`` and a confident local classification the agent
+    starts without waiting for the duplicate check. Its memory writes are
+    held back and applied after the classification, in the same order as
+    without it; if the document turns out to be a reused duplicate they are
+    dropped. Documents that need the LLM classifier never speculate.
+
+    With ``dedup`` a document matching an earlier one (same normalized text,
+    or a SimHash within DEDUP_MAX_DISTANCE bits) is linked to it under
+    ``duplicate_of``. With the match's action "reuse" (DEDUP_ACTION for exact
+    matches, DEDUP_NEAR_ACTION for near ones) the original's classification
+    and result are returned without running the classifier or agent.
+
+    With ``index`` the outcome, including failures, is added to the history
+    index searched by ``history.py`` and the app's History tab.
+    """
+    conversation_id = conversation_id or str(uuid.uuid4())
+    timings = timings if timings is not None else {}
+    with telemetry.span("document") as span:
+        span.set("conversation_id", conversation_id)
+        span.set("source", source)
+        return _process_document(source, content, classification_input, memory, conversation_id, timings,
+                                 on_token, dedup, index, speculate)
+
+def _process_document(source: str, content, classification_input: str, memory, conversation_id: str,
+                      timings: dict, on_token, dedup: bool, index: bool, speculate: bool) -> dict:
+    preview = classification_input
+    read_pdf = not isinstance(content, str)
+    # Fingerprints cover the whole text: documents sharing only the pages within the budget are not duplicates
+    whole = dedup or PDF_ANALYSIS_MODE != "truncate"
+    # What the index needs even when a stage fails
+    state = {"text": None, "classification": None, "duplicate": None}
+
+    def store():
+        memory.store(
+            conversation_id=conversation_id,
+            data={
+                "source": source,
+                "upload_timestamp": datetime.now().isoformat(),
+                "original_content": preview[:1000] + "..." if len(preview) > 1000 else preview,
+                "processing_steps": []
+            }
+        )
+
+    def read() -> tuple:
+        if not (dedup or index or read_pdf):
+            return None, None
+        with telemetry.span("extract"):
+            text, extraction = read_document(content, None if whole else PDF_CHAR_BUDGET)
+        state["text"] = text
+        return text, extraction
+
+    def check_duplicate(read: tuple) -> tuple:
+        """(fingerprint, match, original conversation to reuse)"""
+        if not dedup or read[0] is None:
+            return None, None, None
+        with telemetry.span("dedup"):
+            document, duplicate = find_duplicate(read[0])
+        state["duplicate"] = duplicate
+        action = DEDUP_ACTION if duplicate is not None and duplicate["exact"] else DEDUP_NEAR_ACTION
+        if duplicate is None or action != "reuse":
+            return document, duplicate, None
+        original = memory.retrieve_conversation(duplicate["conversation_id"]) or {}
+        reusable = "classification" in original and "results" in original
+        return document, duplicate, original if reusable else None
+
+    # First match wins: the local tiers answer in microseconds, the LLM only when they can't.
+    # Their answer also decides whether the agent may run ahead of the duplicate check.
+    started = time.perf_counter()
+    local = local_classification(source, classification_input)
+    timings["triage"] = time.perf_counter() - started
+    speculative = speculate and local is not None
+
+    def classify(checked: tuple = (None, None, None)):
+        classification = local
+        if classification is None and checked[2] is None:
+            with telemetry.span("classify"):
+                classification = llm_classification(source, classification_input)
+        state["classification"] = classification
+        return classification
+
+    def link(_, checked: tuple):
+        """Record the duplicate match; the reused outcome, if any, ends the run"""
+        _, duplicate, original = checked
+        if duplicate is None:
+            return None
+        match = "exact" if duplicate["exact"] else f"near ({duplicate['distance']} bits apart)"
+        step = f"Duplicate of {duplicate['conversation_id']}: {match} match"
+        if original is None:
+            memory.append_to_conversation(
+                conversation_id=conversation_id,
+                data={"duplicate_of": duplicate, "processing_steps": [step]}
+            )
+            return None
+        memory.append_to_conversation(
+            conversation_id=conversation_id,
+            data={
+                "duplicate_of": duplicate,
+                "classification": original["classification"],
+                "results": original["results"],
+                "processing_steps": [step, "Reused the original's classification and results"]
+            }
+        )
+        return {
+            "conversation_id": conversation_id,
+            "classification": original["classification"],
+            "result": original["results"],
+            "duplicate_of": duplicate
+        }
+
+    def label(_, classification):
+        if classification is None:
+            return
+        memory.append_to_conversation(
+            conversation_id=conversation_id,
+            data={
+                "classification": classification,
+                "processing_steps": [f"Classified as {classification['format']} with intent {classification['intent']}"]
+            }
+        )
+
+    buffered = BufferedMemory(memory) if speculative else None
+
+    def agent(classification, read: tuple, *_):
+        if classification is None:
+            return None
+        extraction = read[1]
+        if extraction is not None and PDF_ANALYSIS_MODE == "truncate":
+            # What the agent would extract itself
+            extraction = limit_extraction(extraction, PDF_CHAR_BUDGET)
+        if buffered is None:
+            return route_to_agent(classification, content, conversation_id, memory, on_token=on_token,
+                                  extraction=extraction)
+        return route_to_agent(classification, content, conversation_id, buffered,
+                              on_token=buffered.wrap(on_token), extraction=extraction)
+
+    def reused(name: str, output) -> bool:
+        if name != "link" or output is None:
+            return False
+        if buffered is not None:
+            # Stops the speculative agent at its next write or token
+            buffered.abandon()
+        return True
+
+    graph = StageGraph(timings)
+    graph.add("store", store)
+    graph.add("extract", read)
+    graph.add("dedup", check_duplicate, ("extract",))
+    graph.add("classify", classify, () if speculative else ("dedup",), inline=True)
+    graph.add("link", link, ("store", "dedup"))
+    graph.add("label", label, ("link", "classify"))
+    graph.add("agent", agent, ("classify", "extract") if speculative else ("classify", "extract", "label"),
+              inline=True)
+
+    try:
+        outputs = graph.run(stop=reused)
+        if outputs.get("link") is not None:
+            if buffered is not None:
+                buffered.abandon()
+            if index:
+                outcome = outputs["link"]
+                index_document(conversation_id, source, outcome["classification"], outcome["result"],
+                               text=state["text"], duplicate=outcome["duplicate_of"])
+            return outputs["link"]
+        if buffered is not None:
+            buffered.flush()
+    except Exception as e:
+        if buffered is not None:
+            buffered.abandon()
+        if index:
+            # Failed documents stay findable by their error status
+            index_document(conversation_id, source, state["classification"], error=str(e), text=state["text"],
+                           duplicate=state["duplicate"])
+        raise
+
+    classification, result = outputs["classify"], outputs["agent"]
+    document, duplicate, _ = outputs["dedup"]
+    if index:
+        index_document(conversation_id, source, classification, result, text=state["text"], duplicate=duplicate)
+
+    # Only originals are indexed, so every match links to a first occurrence
+    if document is not None and duplicate is None and not (isinstance(result, dict) and result.get("error")):
+        get_dedup_index().add(conversation_id, document)
+
+    return {
+        "conversation_id": conversation_id,
+        "classification": classification,
+        "result": result,
+        "duplicate_of": duplicate
+    }
@@ -0,0 +1,241 @@
+"""In-process metrics and tracing for the pipeline.
+
+Stages are wrapped in ``span(stage, **labels)``; each finished span feeds the
+``pipeline_stage_duration_seconds`` histogram and, when TELEMETRY_TRACE_LOG
+is set, is written as one trace record (trace/span/parent ids, duration,
+status) to TELEMETRY_TRACE_PATH through a background log writer. Counters
+cover LLM requests, token usage per agent and model, cache lookups and
+classification routes. ``start_metrics_server`` exposes everything in the
+Prometheus text format on ``/metrics``.
+
+Recording a span costs one lock acquisition and a bisect, so it is meant to
+stay enabled in production; keep label values low-cardinality.
+"""
+import contextvars
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import (
+    TELEMETRY_ENABLED,
+    TELEMETRY_TRACE_LOG,
+    TELEMETRY_TRACE_PATH,
+    TELEMETRY_TRACE_SAMPLE,
+)
+from utils.log_writer import BackgroundLogWriter
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "pipeline_stage_duration_seconds": "Time spent in each pipeline stage",
+    "llm_requests_total": "LLM requests by agent, model and outcome",
+    "llm_tokens_total": "Prompt and completion tokens reported by the API",
+    "llm_retries_total": "LLM requests retried, by HTTP status or error kind",
+    "llm_cache_lookups_total": "LLM response cache lookups by result",
+    "prompt_tokens_saved_total": "Estimated prompt tokens removed by text cleanup or the token budget",
+    "classification_routes_total": "Documents classified by heuristics, local model or LLM",
+    "dedup_lookups_total": "Duplicate index lookups by result",
+    "jobs_total": "Background jobs by lifecycle event",
+    "job_queue_depth": "Jobs waiting for a worker",
+    "job_workers_busy": "Job workers currently running a job",
+    "api_requests_total": "HTTP API requests by route and response status",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_current = contextvars.ContextVar("telemetry_span", default=None)
+_trace_writer = None
+_server = None
+
+class Span:
+    __slots__ = ("stage", "labels", "attrs", "trace_id", "span_id", "parent_id", "sampled",
+                 "started", "duration", "status")
+
+    def __init__(self, stage: str, labels: dict, parent):
+        self.stage = stage
+        self.labels = labels
+        self.attrs = {}
+        self.sampled = parent.sampled if parent is not None else (
+            TELEMETRY_TRACE_LOG and random.random() < TELEMETRY_TRACE_SAMPLE
+        )
+        if self.sampled:
+            self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(64):016x}"
+            self.span_id = f"{random.getrandbits(64):016x}"
+            self.parent_id = parent.span_id if parent is not None else None
+        else:
+            self.trace_id = self.span_id = self.parent_id = None
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.status = "ok"
+
+    def set(self, key: str, value):
+        """Attach a trace-only attribute (not used as a metric label)"""
+        self.attrs[key] = value
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    """Add ``value`` to a counter"""
+    if not TELEMETRY_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name: str, value: float, **labels):
+    """Set a gauge to its current value"""
+    if not TELEMETRY_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+def observe(name: str, seconds: float, **labels):
+    """Record one observation in a histogram"""
+    if not TELEMETRY_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            # One count per bucket plus +Inf, then the running sum
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+def current_span():
+    return _current.get()
+
+@contextmanager
+def span(stage: str, **labels):
+    """Time a block as one pipeline stage; yields the Span"""
+    current = Span(stage, labels, _current.get())
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.started
+        _current.reset(token)
+        finish(current)
+
+def finish(current: Span):
+    """Record a span whose duration is already set (e.g. one timed by hand)"""
+    observe("pipeline_stage_duration_seconds", current.duration, stage=current.stage, **current.labels)
+    if current.sampled:
+        _write_trace(current)
+
+def record_usage(agent: str, model: str, usage):
+    """Count tokens from a Groq ``usage`` object (or dict)"""
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        field = f"{kind}_tokens"
+        tokens = usage.get(field) if isinstance(usage, dict) else getattr(usage, field, None)
+        if tokens:
+            inc("llm_tokens_total", tokens, agent=agent, model=model, kind=kind)
+
+def _write_trace(current: Span):
+    global _trace_writer
+    if _trace_writer is None:
+        with _lock:
+            if _trace_writer is None:
+                _trace_writer = BackgroundLogWriter(path=TELEMETRY_TRACE_PATH)
+    _trace_writer.write({
+        "timestamp": datetime.now().isoformat(),
+        "trace_id": current.trace_id,
+        "span_id": current.span_id,
+        "parent_id": current.parent_id,
+        "stage": current.stage,
+        "labels": current.labels,
+        "attrs": current.attrs,
+        "duration_ms": round(current.duration * 1000, 3),
+        "status": current.status
+    })
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+
+    lines = []
+    described = set()
+
+    def describe(name: str, metric_type: str):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for (name, labels), value in sorted(gauges.items()):
+        describe(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for (name, labels), values in sorted(histograms.items()):
+        describe(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), values[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def reset():
+    """Drop every recorded metric"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread; later calls return the running server"""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
@@ -0,0 +1,23 @@
+import pytest
+
+@pytest.fixture
+def stub_llm(monkeypatch, tmp_path):
+    """Point the LLM gateway at a local stub Groq server with a fresh cache and scheduler"""
+    from groq import Groq
+
+    import llm_gateway
+    import llm_scheduler
+    from bench.stub_server import StubGroqServer
+    from llm_cache import LLMCache
+
+    server = StubGroqServer(latency_ms=0, jitter_ms=0, seed=0).start()
+    client = Groq(api_key="stub", base_url=server.url, max_retries=0)
+    cache = LLMCache(str(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(llm_gateway, "_client", client)
+    monkeypatch.setattr(llm_gateway, "_cache", cache)
+    monkeypatch.setattr(llm_gateway, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_scheduler, "_scheduler", llm_scheduler.LLMScheduler(rpm=0, tpm=0, max_retries=0))
+    yield server
+    server.stop()
+    client.close()
+    cache.close()
@@ -0,0 +1,218 @@
+import asyncio
+import base64
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import api_server
+import job_queue
+from api_server import APIServer, HTTPError, Request, parse_submission
+from job_queue import JobQueue
+from memory.shared_memory import SharedMemory
+
+@pytest.fixture
+def release(monkeypatch):
+    """Stand-in for process_document; "block" waits for the returned event and "raise" fails"""
+    release = threading.Event()
+
+    def process_document(source, content, classification_input, memory, conversation_id=None,
+                         timings=None, on_token=None):
+        memory.store(conversation_id, {"source": source, "classification": {"format": "text"}})
+        if content == "block":
+            release.wait(5)
+        if content == "raise":
+            raise RuntimeError("pipeline broke")
+        if on_token is not None:
+            on_token("partial ")
+        return {"conversation_id": conversation_id, "result": {"echo": content}}
+
+    monkeypatch.setattr(job_queue, "process_document", process_document)
+    yield release
+    release.set()
+
+@pytest.fixture
+def server(tmp_path, release):
+    """(jobs, port) of an API server running on its own event loop thread"""
+    jobs = JobQueue(SharedMemory(str(tmp_path / "memory.db")), workers=1, max_depth=1)
+    api = APIServer(jobs, max_body=4096, sync_timeout=0.5)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def start():
+        state["server"] = await asyncio.start_server(api.handle_connection, "127.0.0.1", 0)
+        started.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(start()), loop.run_forever()), daemon=True)
+    thread.start()
+    assert started.wait(5)
+    yield jobs, state["server"].sockets[0].getsockname()[1]
+
+    async def stop():
+        state["server"].close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    release.set()
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+    jobs.shutdown()
+
+def call(port: int, method: str, path: str, body=None, headers: dict = None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    if isinstance(body, dict):
+        body = json.dumps(body)
+        headers = {"Content-Type": "application/json", **(headers or {})}
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    if response.getheader("Content-Type", "").startswith("application/json"):
+        data = json.loads(data)
+    return response, data
+
+def test_sync_submission_answers_with_the_result(server):
+    _, port = server
+    response, body = call(port, "POST", "/v1/documents", {"content": "hello", "source": "crm"})
+
+    assert response.status == 200
+    assert body["status"] == "succeeded" and body["result"] == {"echo": "hello"}
+    assert body["source"] == "crm" and body["classification"] == {"format": "text"}
+
+    response, again = call(port, "GET", f"/v1/documents/{body['conversation_id']}")
+    assert response.status == 200 and again["result"] == {"echo": "hello"}
+
+def test_failed_document_answers_422(server):
+    _, port = server
+    response, body = call(port, "POST", "/v1/documents", {"content": "raise"})
+
+    assert response.status == 422
+    assert body["status"] == "failed" and body["error"] == "pipeline broke"
+
+def test_async_submission_is_accepted_then_polled_and_cancelled(server, release):
+    jobs, port = server
+    response, body = call(port, "POST", "/v1/documents?mode=async", {"content": "block"})
+
+    assert response.status == 202
+    assert response.getheader("Location") == body["status_url"] == f"/v1/documents/{body['conversation_id']}"
+    assert call(port, "GET", body["status_url"])[1]["status"] in ("queued", "running")
+
+    response, cancelled = call(port, "DELETE", body["status_url"])
+    assert response.status == 200 and cancelled["status"] == "cancelled"
+    assert call(port, "DELETE", body["status_url"])[0].status == 409
+    assert call(port, "DELETE", "/v1/documents/unknown")[0].status == 404
+
+def test_slow_sync_submission_falls_back_to_202(server, release):
+    _, port = server
+    response, body = call(port, "POST", "/v1/documents", {"content": "block"})
+
+    assert response.status == 202 and body["status"] in ("queued", "running")
+
+def test_full_queue_answers_503_with_retry_after(server, release):
+    jobs, port = server
+    running = call(port, "POST", "/v1/documents?mode=async", {"content": "block"})[1]
+    deadline = time.time() + 5
+    while jobs.get(running["conversation_id"]).status != "running" and time.time() < deadline:
+        time.sleep(0.01)
+    assert call(port, "POST", "/v1/documents?mode=async", {"content": "queued"})[0].status == 202
+
+    response, body = call(port, "POST", "/v1/documents?mode=async", {"content": "rejected"})
+    assert response.status == 503 and response.getheader("Retry-After") == "1"
+    assert "error" in body
+
+@pytest.mark.parametrize("path, payload, headers, status", [
+    ("/v1/documents?mode=later", {"content": "x"}, None, 400),
+    ("/v1/documents?stream=yes", {"content": "x"}, None, 400),
+    ("/v1/documents", {"content": "  "}, None, 400),
+    ("/v1/documents", {"file_name": "a.exe", "content": "x"}, None, 415),
+    ("/v1/documents", "content=x", {"Content-Type": "text/plain"}, 415),
+    ("/v1/documents", "x" * 5000, {"Content-Type": "application/json"}, 413),
+])
+def test_bad_submissions_are_refused(server, path, payload, headers, status):
+    _, port = server
+    response, body = call(port, "POST", path, payload, headers)
+
+    assert response.status == status
+    assert "error" in body
+
+def test_unknown_routes_and_documents_answer_404(server):
+    _, port = server
+    assert call(port, "GET", "/v1/documents/missing")[0].status == 404
+    assert call(port, "GET", "/v1/documents/a/b")[0].status == 404
+    assert call(port, "PUT", "/v1/documents")[0].status == 404
+
+def test_attachment_children_are_described_from_memory(server):
+    jobs, port = server
+    jobs.memory.store("mail-1-attachment-0", {"source": "mail:scan.pdf", "results": {"total": 5}})
+    jobs.memory.store("mail-1-attachment-1", {"source": "mail:logo.gif", "error": "Unsupported"})
+
+    response, body = call(port, "GET", "/v1/documents/mail-1-attachment-0")
+    assert response.status == 200
+    assert body["status"] == "succeeded" and body["result"] == {"total": 5}
+    assert call(port, "GET", "/v1/documents/mail-1-attachment-1")[1]["status"] == "failed"
+
+def test_events_stream_status_tokens_and_result(server, release):
+    jobs, port = server
+    call(port, "POST", "/v1/documents?mode=async", {"content": "block"})
+    queued = call(port, "POST", "/v1/documents?mode=async", {"content": "streamed"})[1]
+
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    connection.request("GET", queued["events_url"])
+    response = connection.getresponse()
+    assert response.getheader("Content-Type") == "text/event-stream"
+    release.set()
+    text = response.read().decode("utf-8")
+    connection.close()
+
+    events = [
+        (lines[0][len("event: "):], json.loads(lines[1][len("data: "):]))
+        for lines in (block.split("\n") for block in text.strip().split("\n\n"))
+    ]
+    assert events[0] == ("status", {"status": "queued"})
+    assert ("token", {"delta": "partial "}) in events
+    assert events[-2] == ("status", {"status": "succeeded"})
+    assert events[-1][0] == "result" and events[-1][1]["result"] == {"echo": "streamed"}
+
+def test_health_and_metrics(server):
+    _, port = server
+    response, body = call(port, "GET", "/healthz")
+    assert response.status == 200 and body["status"] == "ok" and body["workers"] == 1
+
+    response, text = call(port, "GET", "/metrics")
+    assert response.status == 200 and b"api_requests_total" in text
+
+def test_submissions_parse_from_json_and_multipart():
+    data = base64.b64encode(b"%PDF-1.4").decode("ascii")
+    request = Request("POST", "/v1/documents", "HTTP/1.1", {"content-type": "application/json"},
+                      json.dumps({"file_name": "a.pdf", "content_base64": data}).encode("utf-8"))
+    assert parse_submission(request) == ("api:a.pdf", "a.pdf", b"%PDF-1.4")
+
+    request.body = json.dumps({"file_name": "a.pdf", "content_base64": "not base64!"}).encode("utf-8")
+    with pytest.raises(HTTPError) as invalid:
+        parse_submission(request)
+    assert invalid.value.status == 400
+
+    boundary = "XyZ"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"source\"\r\n\r\nscanner\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"order.json\"\r\n"
+        f"Content-Type: application/json\r\n\r\n{{\"order\": 1}}\r\n--{boundary}--\r\n"
+    ).encode("utf-8")
+    request = Request("POST", "/v1/documents", "HTTP/1.1",
+                      {"content-type": f"multipart/form-data; boundary={boundary}"}, body)
+    assert parse_submission(request) == ("scanner", "order.json", b'{"order": 1}')
+
+def test_keep_alive_follows_the_http_version():
+    assert Request("GET", "/", "HTTP/1.1", {}).keep_alive
+    assert not Request("GET", "/", "HTTP/1.1", {"connection": "close"}).keep_alive
+    assert not Request("GET", "/", "HTTP/1.0", {}).keep_alive
+    assert Request("GET", "/?a=1&a=2", "HTTP/1.0", {"connection": "Keep-Alive"}).query == {"a": "2"}
+    assert api_server.encode_response(404, {"error": "x"}, keep_alive=False).startswith(
+        b"HTTP/1.1 404 Not Found\r\nContent-Length: 14\r\nConnection: close\r\n")
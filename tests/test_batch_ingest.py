@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import batch_ingest
+import llm_scheduler
+from memory.shared_memory import ThreadSafeSharedMemory
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """process_document replaced by one that fails documents containing "fail" """
+    calls = []
+
+    def process_document(source, content, classification_input, memory, timings=None):
+        calls.append(source)
+        timings["agent"] = 0.01
+        if "fail" in content:
+            return {"conversation_id": source, "classification": None, "result": {"error": "agent failed"}}
+        return {"conversation_id": source, "classification": {"format": "json"}, "result": {"ok": True}}
+
+    monkeypatch.setattr(batch_ingest, "process_document", process_document)
+    monkeypatch.setattr(batch_ingest, "get_memory", lambda: None)
+    monkeypatch.setattr(llm_scheduler, "_default_priority", llm_scheduler.INTERACTIVE)
+    return calls
+
+def records(path) -> list:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_discover_documents_and_manifest(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("a.json", "b.TXT", "sub/c.pdf", "feed.ndjson", "notes.md"):
+        (tmp_path / name).write_text("x")
+    manifest = tmp_path / "sub" / "files.lst"
+    manifest.write_text(f"# comment\n\n../a.json\n{tmp_path / 'sub' / 'c.pdf'}\n")
+
+    found = batch_ingest.discover_documents(str(tmp_path))
+    assert [path.replace(str(tmp_path), "") for path in found] == ["/a.json", "/b.TXT", "/feed.ndjson", "/sub/c.pdf"]
+    assert batch_ingest.discover_documents(str(tmp_path), recursive=False) == found[:3]
+    assert batch_ingest.read_manifest(str(manifest)) == [str(tmp_path / "sub" / "../a.json"),
+                                                         str(tmp_path / "sub" / "c.pdf")]
+
+def test_run_records_every_document_and_resumes(tmp_path, pipeline):
+    (tmp_path / "good.json").write_text('{"a": 1}')
+    (tmp_path / "bad.txt").write_text("please fail")
+    output = tmp_path / "out" / "results.jsonl"
+    paths = batch_ingest.discover_documents(str(tmp_path))
+
+    stats = batch_ingest.run_batch(paths, str(output), workers=2, progress_every=0)
+    assert (stats["succeeded"], stats["failed"]) == (1, 1)
+    assert {record["path"]: record["status"] for record in records(output)} == {
+        str(tmp_path / "good.json"): "ok", str(tmp_path / "bad.txt"): "error"
+    }
+    assert set(stats["stages"]) == {"agent", "total"}
+
+    # A rerun only retries the failure
+    completed = batch_ingest.load_completed(str(output))
+    with open(output, "a") as out:
+        out.write('{"path": "truncated')
+    assert batch_ingest.load_completed(str(output)) == completed == {str(tmp_path / "good.json")}
+    stats = batch_ingest.run_batch(paths, str(output), progress_every=0, completed=completed)
+    assert (stats["already_done"], stats["failed"]) == (1, 1)
+    assert len(pipeline) == 3
+
+def test_record_streams_stop_at_bad_records_unless_skipped(tmp_path, pipeline):
+    feed = tmp_path / "feed.ndjson"
+    feed.write_text('{"id": 1}\n{"id": \n{"id": 3}\n')
+    output = tmp_path / "results.jsonl"
+
+    stats = batch_ingest.run_batch([str(feed)], str(output), workers=1, progress_every=0)
+    assert stats["aborted"].startswith(f"{feed}#1: Invalid JSON")
+    assert stats["processed"] == 1
+
+    stats = batch_ingest.run_batch([str(feed)], str(tmp_path / "all.jsonl"), progress_every=0,
+                                   skip_bad_records=True)
+    assert (stats["succeeded"], stats["skipped"], stats["aborted"]) == (2, 1, None)
+    assert {record["path"]: record["status"] for record in records(tmp_path / "all.jsonl")} == {
+        f"{feed}#0": "ok", f"{feed}#1": "skipped", f"{feed}#2": "ok"
+    }
+    assert sorted(pipeline) == ["record:feed.ndjson#0", "record:feed.ndjson#0", "record:feed.ndjson#2"]
+
+def test_unreadable_files_are_errors(tmp_path, pipeline):
+    record = batch_ingest.process_path(str(tmp_path / "missing.json"))
+
+    assert record["status"] == "error" and "No such file" in record["error"]
+    assert "total" in record["timings"]
+
+def test_percentile():
+    assert batch_ingest.percentile([], 95) == 0.0
+    assert batch_ingest.percentile([3, 1, 2, 4], 50) == 2
+    assert batch_ingest.percentile(list(range(1, 101)), 95) == 95
+
+def test_batch_memory_mirrors_writes_into_the_log(monkeypatch):
+    monkeypatch.setattr(batch_ingest, "_memory", None)
+    monkeypatch.setattr(batch_ingest, "create_memory", lambda: object())
+
+    memory = batch_ingest.get_memory()
+    assert isinstance(memory, ThreadSafeSharedMemory)
+    assert batch_ingest.get_memory() is memory
@@ -0,0 +1,111 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from bench import synthetic
+from bench.run_benchmark import build_corpus, compare, summarize
+from bench.stub_server import DEFAULT_RESPONSES, StubGroqServer, guess_format, pick_response
+
+@pytest.fixture
+def server():
+    server = StubGroqServer(latency_ms=0, jitter_ms=0, seed=0).start()
+    yield server
+    server.stop()
+
+def post(url: str, body: dict, path: str = "/openai/v1/chat/completions"):
+    request = urllib.request.Request(url + path, data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    return urllib.request.urlopen(request, timeout=5)
+
+def prompt(text: str) -> dict:
+    return {"messages": [{"role": "user", "content": text}]}
+
+@pytest.mark.parametrize("content, expected", [
+    ("%PDF-1.4 ...", "pdf"),
+    ("[PDF FILE] scanned.pdf", "pdf"),
+    ('  {"a": 1}', "json"),
+    ("Hello\nSubject: quote\n\nbody", "email"),
+    ("plain notes", "text"),
+])
+def test_format_guess(content, expected):
+    assert guess_format(content, "text") == expected
+
+def test_responses_follow_the_prompt():
+    combined = json.loads(pick_response(prompt('Reply {"format": "<format>", ...}\nContent: {"a": 1}'), DEFAULT_RESPONSES))
+    assert combined == {"format": "json", "intent": "Other"}
+    assert pick_response(prompt("What is this content's format?\nContent: %PDF-1.4"), DEFAULT_RESPONSES) == "pdf"
+    assert json.loads(pick_response(prompt("You are an email parsing assistant."), DEFAULT_RESPONSES)) \
+        == DEFAULT_RESPONSES["email"]
+    assert pick_response(prompt("Something else"), DEFAULT_RESPONSES) == "{}"
+
+def test_batched_prompts_get_one_result_per_document():
+    text = 'Return {"results": [...]}\nDocument 0:\n<<<\n{"a": 1}\n>>>\nDocument 3:\n<<<\nSubject: hi\n>>>'
+    results = json.loads(pick_response(prompt(text), DEFAULT_RESPONSES))["results"]
+
+    assert [(result["id"], result["format"]) for result in results] == [(0, "json"), (3, "email")]
+
+def test_completion_reports_usage(server):
+    with post(server.url, dict(prompt("What is this content's format?\nContent: hi"), model="m")) as response:
+        body = json.load(response)
+
+    assert body["choices"][0]["message"]["content"] == "text"
+    assert body["usage"]["total_tokens"] == body["usage"]["prompt_tokens"] + body["usage"]["completion_tokens"]
+    assert server.requests == 1
+
+def test_streamed_completion_is_sent_as_events(server):
+    server.responses["intent"] = "Complaint about a delayed delivery"
+    with post(server.url, dict(prompt("Classify the following text"), stream=True)) as response:
+        assert response.headers["Content-Type"] == "text/event-stream"
+        events = [line[len(b"data: "):] for line in response.read().splitlines() if line.startswith(b"data: ")]
+
+    assert events[-1] == b"[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    assert len(chunks) > 1
+    assert "".join(chunk["choices"][0]["delta"]["content"] for chunk in chunks) == server.responses["intent"]
+    assert "usage" in chunks[-1]["x_groq"]
+
+def test_injected_failures_and_unknown_paths(server):
+    server.error_rate = 1.0
+    with pytest.raises(urllib.error.HTTPError) as failure:
+        post(server.url, prompt("hi"))
+    assert failure.value.code in (429, 500)
+    if failure.value.code == 429:
+        assert failure.value.headers["Retry-After"] == "1"
+    assert server.errors == 1
+
+    with pytest.raises(urllib.error.HTTPError) as missing:
+        post(server.url, prompt("hi"), path="/openai/v1/models")
+    assert missing.value.code == 404
+
+def test_corpus_mixes_samples_with_synthetic_documents(tmp_path):
+    (tmp_path / "note.txt").write_text("hello")
+    corpus = build_corpus(tmp_path, copies=2, pdf_pages=1, json_items=3, email_paragraphs=2)
+
+    assert [name for name, _, _ in corpus][:2] == ["sample/note.txt", "synthetic/invoice_0.pdf"]
+    assert len(corpus) == 1 + 2 * 3
+    raw = dict((name, raw) for name, _, raw in corpus)
+    assert raw["synthetic/invoice_1.pdf"].startswith(b"%PDF")
+    assert len(json.loads(raw["synthetic/invoice_0.json"])["items"]) == 3
+    assert synthetic.long_email(2, seed=1).startswith("From: buyer1@example.com")
+
+def test_regressions_beyond_tolerance_are_reported():
+    summary = summarize({
+        "documents": 10,
+        "failures": [],
+        "elapsed_s": 2.0,
+        "stages": {"classify": [0.1] * 10, "agent": [], "total": [0.2] * 10},
+    })
+    assert summary["throughput_docs_per_s"] == 5.0
+    assert summary["stages"]["classify"]["p95_ms"] == 100.0
+    assert summary["stages"]["agent"]["max_ms"] == 0.0
+
+    baseline = {"throughput_docs_per_s": 5.5, "stages": {"classify": {"p95_ms": 90.0}},
+                "peak_rss_mb": summary["peak_rss_mb"]}
+    assert compare(summary, baseline, tolerance=0.2) == []
+
+    baseline = {"throughput_docs_per_s": 10.0, "stages": {"total": {"p95_ms": 100.0}},
+                "peak_rss_mb": summary["peak_rss_mb"] / 2}
+    regressions = compare(summary, baseline, tolerance=0.2)
+    assert [regression.split()[0] for regression in regressions] == ["throughput", "total", "peak"]
@@ -0,0 +1,98 @@
+import json
+import threading
+
+import pytest
+
+from agents import classifier_agent
+
+ITEMS = [
+    ("file:a.json", '{"order": 1}'),
+    ("email", "From: ana@example.com\nSubject: quote\n\nPlease quote."),
+    ("text", "Some notes about nothing in particular."),
+]
+
+@pytest.fixture
+def fake_chat(monkeypatch):
+    """classifier_agent.chat answering from a list of canned replies"""
+    replies = []
+    prompts = []
+
+    def chat(messages, parse=None, **kwargs):
+        prompts.append(messages[-1]["content"])
+        text = replies.pop(0)
+        return parse(text) if parse is not None else text
+
+    monkeypatch.setattr(classifier_agent, "chat", chat)
+    return replies, prompts
+
+def test_combined_classification_makes_one_call(stub_llm):
+    classification = classifier_agent.combined_classification("file:a.json", '{"order": 1}')
+
+    assert classification == {"format": "json", "intent": "Other", "source": "file:a.json"}
+    assert stub_llm.requests == 1
+
+@pytest.mark.parametrize("reply, expected", [
+    ('{"format": "EMAIL ", "intent": "rfq"}', ("email", "RFQ")),
+    ('{"format": "docx", "intent": "Memo"}', ("text", "Other")),
+    ('not json', ("text", "Other")),
+    ('["pdf"]', ("text", "Other")),
+])
+def test_combined_labels_are_validated(fake_chat, reply, expected):
+    replies, _ = fake_chat
+    replies.append(reply)
+
+    classification = classifier_agent.combined_classification("src", "content")
+    assert (classification["format"], classification["intent"]) == expected
+
+def test_batch_classifies_every_document_in_one_call(stub_llm):
+    results = classifier_agent.batch_classification(ITEMS)
+
+    assert [result["format"] for result in results] == ["json", "email", "text"]
+    assert [result["source"] for result in results] == [source for source, _ in ITEMS]
+    assert stub_llm.requests == 1
+
+def test_batch_retries_skipped_and_invalid_entries_alone(fake_chat):
+    replies, prompts = fake_chat
+    replies.extend([
+        json.dumps({"results": [{"id": 3, "format": "text", "intent": "Complaint"},
+                                {"id": 2, "format": "spreadsheet", "intent": "RFQ"}]}),
+        '{"format": "json", "intent": "Invoice"}',
+        '{"format": "email", "intent": "RFQ"}',
+    ])
+
+    results = classifier_agent.batch_classification(ITEMS)
+    assert [(result["format"], result["intent"]) for result in results] == [
+        ("json", "Invoice"), ("email", "RFQ"), ("text", "Complaint")
+    ]
+    assert len(prompts) == 3 and "Document 3:" in prompts[0]
+
+def test_batcher_coalesces_concurrent_requests(stub_llm):
+    batcher = classifier_agent.ClassificationBatcher(batch_size=8, linger=0.5)
+    results = {}
+
+    def classify(source, content):
+        results[source] = batcher.classify(source, content)
+
+    threads = [threading.Thread(target=classify, args=item) for item in ITEMS]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {source: result["format"] for source, result in results.items()} == {
+        "file:a.json": "json", "email": "email", "text": "text"
+    }
+    assert stub_llm.requests == 1
+
+def test_batcher_passes_errors_to_every_caller(stub_llm):
+    stub_llm.error_rate = 1.0
+    batcher = classifier_agent.ClassificationBatcher(batch_size=2, linger=0.01)
+
+    with pytest.raises(Exception):
+        batcher.classify(*ITEMS[1])
+
+def test_separate_mode_asks_twice(stub_llm):
+    classification = classifier_agent.normal_classification("email", ITEMS[1][1], mode="separate")
+
+    assert classification["format"] == "email"
+    assert stub_llm.requests == 2
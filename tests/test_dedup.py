@@ -0,0 +1,86 @@
+import hashlib
+import random
+
+import pytest
+
+from memory.dedup_index import DedupIndex
+from utils.fingerprint import MAX_CHARS, distance, exact_tokens, fingerprint
+
+def invoice(number: int, total: str, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    vocabulary = ["pallet", "cement", "delivery", "site", "north", "order", "unit", "crate", "steel", "beam",
+                  "bolt", "invoice", "freight", "handling", "storage", "week", "month", "batch", "lot", "item"]
+    lines = [" ".join(f"{rng.choice(vocabulary)}{rng.randint(0, 99)}" for _ in range(15)) for _ in range(100)]
+    return f"INVOICE {number}\nTotal due: {total} USD\n\n" + "\n".join(lines)
+
+@pytest.fixture
+def index():
+    return DedupIndex(":memory:")
+
+def test_whitespace_case_and_punctuation_give_the_same_exact_hash():
+    assert fingerprint("Hello,  World!\nPlease pay 500.")["sha256"] == fingerprint("hello world please pay 500")["sha256"]
+
+@pytest.mark.parametrize("first, second", [
+    ("Refund of -500 USD", "Refund of 500 USD"),
+    ("Total 1.500 EUR", "Total 1500 EUR"),
+    ("Total 1,500 EUR", "Total 1.500 EUR"),
+    ("Discount 20% applied", "Discount 20 applied"),
+    ("Amount $500 due", "Amount 500 due"),
+])
+def test_numeric_only_differences_are_not_exact_matches(first, second):
+    assert fingerprint(first)["sha256"] != fingerprint(second)["sha256"]
+
+def test_hyphens_inside_words_are_not_signs():
+    assert fingerprint("Part A-17 shipped")["sha256"] == fingerprint("Part A 17 shipped")["sha256"]
+
+def test_differences_past_the_simhash_cap_change_the_exact_hash():
+    padding = "line item delivered " * (MAX_CHARS // 10)
+    first = fingerprint(padding + '"amount": 100')
+    second = fingerprint(padding + '"amount": 900')
+
+    assert first["simhash"] == second["simhash"]
+    assert first["sha256"] != second["sha256"]
+
+def test_exact_hash_is_the_hash_of_the_joined_tokens():
+    text = "Invoice 17: pay -1,500.00 EUR by Friday"
+
+    assert fingerprint(text)["sha256"] == hashlib.sha256(" ".join(exact_tokens(text)).encode("utf-8")).hexdigest()
+
+def test_find_exact_match(index):
+    index.add("original", fingerprint(invoice(1001, "500.00")))
+
+    match = index.find(fingerprint(" ".join(invoice(1001, "500.00").split())))
+    assert match == {"conversation_id": "original", "exact": True, "distance": 0, "similarity": 1.0}
+
+def test_find_near_match_for_a_changed_invoice_number_and_total(index):
+    original, changed = fingerprint(invoice(1001, "500.00")), fingerprint(invoice(1002, "750.00"))
+    index.add("original", original)
+
+    match = index.find(changed)
+    assert match["conversation_id"] == "original"
+    assert match["exact"] is False
+    assert match["distance"] == distance(original["simhash"], changed["simhash"]) <= index.max_distance
+
+def test_find_sign_change_is_near_not_exact(index):
+    index.add("original", fingerprint(invoice(1001, "500.00")))
+
+    match = index.find(fingerprint(invoice(1001, "-500.00")))
+    assert match is not None and match["exact"] is False
+
+def test_find_unrelated_document(index):
+    index.add("original", fingerprint(invoice(1001, "500.00", seed=1)))
+
+    assert index.find(fingerprint(invoice(1001, "500.00", seed=2))) is None
+
+def test_short_texts_only_match_exactly(index):
+    index.add("original", fingerprint("Please send 20 units of cement"))
+
+    assert index.find(fingerprint("Please send 20 units of cement"))["exact"] is True
+    assert index.find(fingerprint("Please send 25 units of cement")) is None
+
+def test_ties_go_to_the_oldest_document(index):
+    document = fingerprint(invoice(1001, "500.00"))
+    index.add("first", document)
+    index.add("second", document)
+
+    assert index.find(document)["conversation_id"] == "first"
@@ -0,0 +1,124 @@
+import argparse
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import history
+from memory.document_index import DocumentIndex, fts_query, reindex_from_log, result_text
+
+INVOICE = {"format": "pdf", "intent": "Invoice"}
+RFQ = {"format": "email", "intent": "RFQ"}
+
+@pytest.fixture
+def index(tmp_path):
+    index = DocumentIndex(str(tmp_path / "index.db"))
+    index.add("c1", "file:invoice_a.pdf", INVOICE, agent="pdf_processor", text="Invoice for widgets",
+              result={"total": 855.0, "lines": ["Widget A"]}, created_at="2024-05-01T10:00:00")
+    index.add("c2", "email", RFQ, agent="email_processor", text="Please quote 500 gadgets",
+              created_at="2024-05-02T10:00:00")
+    index.add("c3", "file:invoice_b.pdf", INVOICE, agent="pdf_processor", error="Parse failed: late payment",
+              created_at="2024-05-03T10:00:00")
+    index.add("c4", "file:invoice_c.pdf", INVOICE, agent="pdf_processor", duplicate_of="c1",
+              created_at="2024-05-04T10:00:00")
+    return index
+
+def ids(page: dict) -> list:
+    return [item["conversation_id"] for item in page["items"]]
+
+def test_results_are_newest_first_with_status(index):
+    page = index.search()
+
+    assert ids(page) == ["c4", "c3", "c2", "c1"]
+    assert [item["status"] for item in page["items"]] == ["duplicate", "error", "ok", "ok"]
+    assert page["items"][0]["duplicate_of"] == "c1"
+    assert page["next_cursor"] is None
+
+def test_filters_combine(index):
+    assert ids(index.search(intent="Invoice", status="ok")) == ["c1"]
+    assert ids(index.search(source="file:invoice_")) == ["c4", "c3", "c1"]
+    assert ids(index.search(source="file:", agent="email_processor")) == []
+    assert ids(index.search(since="2024-05-02", until="2024-05-04")) == ["c3", "c2"]
+    assert ids(index.search(format=None, intent="")) == ["c4", "c3", "c2", "c1"]
+    with pytest.raises(ValueError):
+        index.search(color="red")
+
+def test_full_text_covers_text_results_and_errors(index):
+    assert ids(index.search("widgets")) == ["c1"]
+    assert ids(index.search("855.0")) == ["c1"]
+    assert ids(index.search("late payment")) == ["c3"]
+    assert ids(index.search("quote gadgets")) == ["c2"]
+    assert ids(index.search("quote invoice")) == []
+    assert "[gadgets]" in index.search("gadgets")["items"][0]["snippet"]
+
+def test_user_input_is_not_fts_syntax(index):
+    assert fts_query('late "payment OR') == '"late" """payment" "OR"'
+    assert ids(index.search('NEAR( "payment')) == []
+    # No prefix expansion: "pay*" is just the word "pay"
+    assert ids(index.search("pay*")) == []
+
+def test_cursor_pages_through_everything(index):
+    seen = []
+    cursor = None
+    while True:
+        page = index.search(limit=3 if cursor is None else 1, cursor=cursor)
+        seen.extend(ids(page))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["c4", "c3", "c2", "c1"]
+
+    first = index.search("invoice", limit=1)
+    assert ids(first) == ["c1"] and first["next_cursor"] is None
+    cursor = index.search(intent="Invoice", limit=2)["next_cursor"]
+    assert ids(index.search(intent="Invoice", limit=2, cursor=cursor)) == ["c1"]
+
+def test_re_adding_a_conversation_moves_it_to_the_top(index):
+    index.add("c1", "file:invoice_a.pdf", INVOICE, agent="pdf_processor", text="Corrected invoice")
+
+    assert ids(index.search()) == ["c1", "c4", "c3", "c2"]
+    assert ids(index.search("widgets")) == []
+    assert ids(index.search("corrected")) == ["c1"]
+
+def test_result_text_flattens_nested_values():
+    assert result_text({"a": {"b": [1, None, "x"]}, "c": True}) == "1 x True"
+    assert result_text(None) == ""
+
+def test_reindex_merges_log_entries_per_conversation(tmp_path):
+    log = tmp_path / "log.jsonl"
+    entries = [
+        {"conversation_id": "a", "timestamp": "2024-05-01T09:00:00",
+         "data": {"source": "email", "original_content": "Quote for bolts"}},
+        {"conversation_id": "a", "data": {"classification": RFQ, "agent": "email_processor",
+                                          "results": {"Subject": "Bolts"}}},
+        {"conversation_id": "b", "data": {"source": "text", "original_content": "never classified"}},
+        {"conversation_id": "c", "timestamp": "2024-05-02T09:00:00",
+         "data": {"source": "file:x.pdf", "classification": INVOICE, "duplicate_of": {"conversation_id": "a"}}},
+    ]
+    log.write_text("\n".join(json.dumps(entry) for entry in entries) + "\n")
+    index = DocumentIndex(":memory:")
+
+    assert reindex_from_log(index, [str(log)]) == 2
+    page = index.search()
+    assert ids(page) == ["c", "a"]
+    assert page["items"][0]["status"] == "duplicate"
+    assert page["items"][1]["created_at"] == "2024-05-01T09:00:00"
+    assert ids(index.search("bolts")) == ["a"]
+
+def test_history_times_accept_ages_and_dates():
+    assert history.parse_time("2024-05-01") == "2024-05-01T00:00:00"
+    before = datetime.now()
+    since = datetime.fromisoformat(history.parse_time("2d"))
+    assert before - timedelta(days=2) <= since <= datetime.now() - timedelta(days=2)
+    with pytest.raises(argparse.ArgumentTypeError):
+        history.parse_time("last week")
+
+def test_history_prints_a_page_with_its_cursor(index, capsys):
+    assert history.main(["--intent", "Invoice", "--limit", "2", "--index", index.path]) == 0
+    out = capsys.readouterr().out
+    assert "c4" in out and "duplicate of c1" in out
+    assert "error: Parse failed: late payment" in out
+    assert "More results: --cursor" in out
+
+    assert history.main(["nothing-matches", "--json", "--index", index.path]) == 0
+    assert json.loads(capsys.readouterr().out) == {"items": [], "next_cursor": None}
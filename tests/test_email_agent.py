@@ -0,0 +1,62 @@
+import json
+from email.message import EmailMessage
+
+import pytest
+
+import api_server
+from agents import email_agent
+from memory.shared_memory import SharedMemory
+
+def email_with_attachments() -> bytes:
+    message = EmailMessage()
+    message["From"] = "Ana Ruiz <ana@example.com>"
+    message["To"] = "orders@example.com"
+    message["Subject"] = "Order 1001"
+    message.set_content("Please ship the attached order by Friday.")
+    message.add_attachment(b"%PDF-1.4 broken", maintype="application", subtype="pdf", filename="scan.pdf")
+    message.add_attachment(json.dumps({"order": 1001}).encode("utf-8"), maintype="application", subtype="json",
+                           filename="order.json")
+    message.add_attachment(b"GIF89a", maintype="image", subtype="gif", filename="logo.gif")
+    return message.as_bytes()
+
+@pytest.fixture
+def memory(tmp_path):
+    return SharedMemory(str(tmp_path / "memory.db"))
+
+@pytest.fixture
+def agents(monkeypatch):
+    def process_pdf(content, conversation_id, memory):
+        raise RuntimeError("unreadable scan")
+
+    def process_json(content, conversation_id, memory):
+        memory.append_to_conversation(conversation_id, {"results": json.loads(content)})
+        return json.loads(content)
+
+    monkeypatch.setattr(email_agent, "analyze_body", lambda body, headers, on_token=None: {"Urgency": "high"})
+    monkeypatch.setattr(email_agent, "process_pdf", process_pdf)
+    monkeypatch.setattr(email_agent, "process_json", process_json)
+
+def test_failed_attachment_is_reported_without_failing_the_email(memory, agents):
+    result = email_agent.process_email(email_with_attachments(), "mail", memory)
+
+    assert result["Subject"] == "Order 1001" and result["Urgency"] == "high"
+    scan, order, logo = result["Attachments"]
+    assert scan["error"] == "Attachment processing failed: unreadable scan" and "result" not in scan
+    assert order["result"] == {"order": 1001}
+    assert logo["skipped"] == "no agent for this attachment type"
+    assert "Processed 1 of 3 attachments" in memory.retrieve_conversation("mail")["processing_steps"]
+
+def test_attachments_get_child_conversations(memory, agents):
+    result = email_agent.process_email(email_with_attachments(), "mail", memory)
+
+    order = result["Attachments"][1]
+    assert order["conversation_id"] == "mail-attachment-2"
+    child = memory.retrieve_conversation("mail-attachment-2")
+    assert child["parent_conversation_id"] == "mail" and child["results"] == {"order": 1001}
+    assert "results" not in memory.retrieve_conversation("mail-attachment-1")
+
+def test_attachment_ids_fit_the_api_routes():
+    child_id = email_agent.attachment_conversation_id("3f2b9c1e-8d4a-4f7e-9a61-2c5d7e8f9a0b", 2)
+
+    assert api_server._DOCUMENT.match(f"/v1/documents/{child_id}").group(1) == child_id
+    assert api_server._DOCUMENT.match(f"/v1/documents/{child_id}/events").group(1) == child_id
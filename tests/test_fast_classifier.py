@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import pytest
+
+from agents import classifier_agent, fast_classifier
+from agents.fast_classifier import FastClassifier, extract_features, load_examples, train
+
+COMPLAINTS = [
+    f"I am very unhappy, order {n} arrived broken and nobody answers my calls" for n in range(12)
+]
+INVOICES = [
+    f"Amount due for services rendered in period {n}, payment within thirty days" for n in range(12)
+]
+EXAMPLES = [(text, "text", "Complaint") for text in COMPLAINTS] + [(text, "text", "Invoice") for text in INVOICES]
+
+@pytest.fixture(scope="module")
+def model():
+    return train(EXAMPLES)
+
+def test_features_are_normalized_and_case_insensitive():
+    features = extract_features("Hello World")
+
+    assert features == extract_features("hello world")
+    assert sum(value * value for value in features.values()) == pytest.approx(1.0)
+    assert extract_features("") == {}
+
+def test_features_only_see_the_stored_prefix():
+    prefix = "a" * fast_classifier.MAX_CHARS
+
+    assert extract_features(prefix + " tail") == extract_features(prefix + " other tail")
+
+def test_trained_model_separates_the_labels(model):
+    complaint = model.predict("my order arrived broken and I am unhappy")
+    invoice = model.predict("payment due for services within thirty days")
+
+    assert (complaint["format"], complaint["intent"]) == ("text", "Complaint")
+    assert invoice["intent"] == "Invoice"
+    assert 0.5 < complaint["confidence"] <= 1.0
+
+def test_saved_model_predicts_the_same(model, tmp_path):
+    path = str(tmp_path / "models" / "fast.json")
+    model.save(path)
+    loaded = FastClassifier.load(path)
+
+    for text, _, _ in EXAMPLES[::5]:
+        assert loaded.predict(text)["intent"] == model.predict(text)["intent"]
+        assert loaded.predict(text)["confidence"] == pytest.approx(model.predict(text)["confidence"], abs=1e-4)
+
+def test_examples_join_content_and_labels_across_rotated_logs(tmp_path):
+    with open(tmp_path / "log.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"conversation_id": "a", "data": {"original_content": "first"}}) + "\n")
+        f.write("not json\n")
+        f.write(json.dumps({"conversation_id": "b", "data": {"original_content": "orphan"}}) + "\n")
+    with gzip.open(tmp_path / "log.1.jsonl.gz", "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"conversation_id": "a", "data": {"classification": {"format": "email", "intent": "RFQ"}}}) + "\n")
+        f.write(json.dumps({"conversation_id": "c", "data": {"classification": {"format": "json"}}}) + "\n")
+
+    assert load_examples([str(tmp_path / "log*.jsonl*")]) == [("first", "email", "RFQ")]
+
+def test_confident_prediction_skips_the_llm(model, monkeypatch):
+    monkeypatch.setattr(classifier_agent, "get_model", lambda: model)
+    monkeypatch.setattr(classifier_agent, "llm_classification", lambda source, content: pytest.fail("escalated"))
+
+    classification = classifier_agent.classify_and_route("text", COMPLAINTS[0])
+    assert classification == {"format": "text", "intent": "Complaint", "source": "text"}
+
+def test_unsure_or_missing_model_escalates(model, monkeypatch):
+    monkeypatch.setattr(classifier_agent, "get_model", lambda: model)
+    assert classifier_agent.fast_classification("text", COMPLAINTS[0], threshold=1.01) is None
+
+    monkeypatch.setattr(classifier_agent, "get_model", lambda: None)
+    monkeypatch.setattr(classifier_agent, "llm_classification",
+                        lambda source, content: {"format": "text", "intent": "Other", "source": source})
+    assert classifier_agent.classify_and_route("text", COMPLAINTS[0])["intent"] == "Other"
+
+def test_training_refuses_too_few_or_single_label_examples(tmp_path, capsys):
+    log = tmp_path / "log.jsonl"
+    with open(log, "w", encoding="utf-8") as f:
+        for index, text in enumerate(COMPLAINTS):
+            f.write(json.dumps({"conversation_id": str(index), "data": {
+                "original_content": text, "classification": {"format": "text", "intent": "Complaint"}
+            }}) + "\n")
+    out = str(tmp_path / "model.json")
+
+    assert fast_classifier.main(["train", "--log", str(log), "--out", out]) == 1
+    assert fast_classifier.main(["train", "--log", str(log), "--out", out, "--min-examples", "5"]) == 1
+    assert "single label" in capsys.readouterr().err
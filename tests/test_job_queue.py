@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+
+import job_queue
+from job_queue import CANCELLED, FAILED, QUEUED, SUCCEEDED, TIMED_OUT, JobQueue, QueueFullError
+from memory.shared_memory import SharedMemory
+
+@pytest.fixture
+def memory(tmp_path):
+    return SharedMemory(str(tmp_path / "memory.db"))
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Stand-in for process_document; "block" waits for ``release`` and "raise" fails"""
+    calls = []
+    release = threading.Event()
+
+    def process_document(source, content, classification_input, memory, conversation_id=None,
+                         timings=None, on_token=None):
+        calls.append({"content": content, "streamed": on_token is not None})
+        memory.store(conversation_id, {"source": source})
+        if content == "block":
+            while not release.wait(0.01):
+                # A running job stops at its next memory write once cancelled or timed out
+                memory.append_to_conversation(conversation_id, {"processing_steps": []})
+        if content == "raise":
+            raise RuntimeError("pipeline broke")
+        if on_token is not None:
+            on_token("partial ")
+        return {"conversation_id": conversation_id, "result": {"echo": content}}
+
+    monkeypatch.setattr(job_queue, "process_document", process_document)
+    yield calls, release
+    release.set()
+
+def wait_for(job, status, timeout=5.0):
+    deadline = time.time() + timeout
+    while job.status != status and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.status == status
+
+def test_submitted_job_succeeds(memory, pipeline):
+    jobs = JobQueue(memory, workers=2)
+    job = jobs.submit("text", "hello", "hello")
+
+    wait_for(job, SUCCEEDED)
+    assert job.result == {"echo": "hello"}
+    assert jobs.get(job.conversation_id) is job
+    assert memory.retrieve_conversation(job.conversation_id) == {"source": "text"}
+    jobs.shutdown()
+
+def test_full_queue_rejects_submissions(memory, pipeline):
+    _, release = pipeline
+    jobs = JobQueue(memory, workers=1, max_depth=1)
+    running = jobs.submit("a", "block", "")
+    wait_for(running, "running")
+    jobs.submit("b", "hello", "")
+
+    with pytest.raises(QueueFullError):
+        jobs.submit("c", "hello", "")
+    assert jobs.metrics()["rejected"] == 1
+    release.set()
+    jobs.shutdown()
+
+def test_cancel_stops_a_running_job(memory, pipeline):
+    jobs = JobQueue(memory, workers=1)
+    job = jobs.submit("a", "block", "")
+    wait_for(job, "running")
+
+    assert jobs.cancel(job.conversation_id)
+    assert job.status == CANCELLED
+    assert not jobs.cancel(job.conversation_id)
+    jobs.shutdown()
+
+def test_running_job_times_out(memory, pipeline):
+    jobs = JobQueue(memory, workers=1, timeout=0.1)
+    job = jobs.submit("a", "block", "")
+
+    wait_for(job, TIMED_OUT)
+    assert job.error == "Timed out after 0.1s"
+    jobs.shutdown()
+
+def test_failed_job_can_be_retried(memory, pipeline):
+    jobs = JobQueue(memory, workers=1)
+    job = jobs.submit("a", "raise", "")
+    wait_for(job, FAILED)
+    assert job.error == "pipeline broke"
+    assert memory.retrieve_conversation(job.conversation_id)["error"] == "pipeline broke"
+
+    retried = jobs.retry(job.conversation_id)
+    assert retried is not job and retried.conversation_id == job.conversation_id
+    wait_for(retried, FAILED)
+    assert retried.attempts == 2
+    with pytest.raises(KeyError):
+        jobs.retry("unknown")
+    jobs.shutdown()
+
+def test_done_callbacks_run_once_finished(memory, pipeline):
+    jobs = JobQueue(memory, workers=1)
+    job = jobs.submit("a", "hello", "")
+    finished = threading.Event()
+    jobs.add_done_callback(job, lambda _job: finished.set())
+
+    assert finished.wait(5)
+    late = []
+    jobs.add_done_callback(job, late.append)
+    assert late == [job]
+    jobs.shutdown()
+
+def test_only_streamed_jobs_collect_output(memory, pipeline):
+    calls, release = pipeline
+    jobs = JobQueue(memory, workers=1)
+    blocker = jobs.submit("a", "block", "")
+    plain = jobs.submit("b", "plain", "")
+    subscribed = jobs.submit("c", "subscribed", "")
+    assert subscribed.status == QUEUED and jobs.request_stream(subscribed)
+
+    release.set()
+    for job in (blocker, plain, subscribed):
+        wait_for(job, SUCCEEDED)
+    assert [call["streamed"] for call in calls] == [False, False, True]
+    assert plain.partial_output() == ""
+    assert subscribed.partial_output() == "partial "
+    assert not jobs.request_stream(plain)
+    jobs.shutdown()
+
+def test_record_feed_queues_one_job_per_record(memory, pipeline):
+    calls, _ = pipeline
+    jobs = JobQueue(memory, workers=2, max_depth=2)
+    records = [(0, '{"a": 1}', None), (1, "{bad", "Invalid JSON"), (2, '{"a": 2}', None), (3, '{"a": 3}', None)]
+    feed = jobs.submit_records("file:feed.ndjson", iter(records))
+
+    deadline = time.time() + 5
+    while not feed.finished and time.time() < deadline:
+        time.sleep(0.01)
+    assert feed.finished
+    assert feed.to_dict()["read"] == 4 and feed.counts["bad"] == 1
+    assert feed.counts["submitted"] == feed.counts[SUCCEEDED] == 3
+    assert sorted(call["content"] for call in calls) == ['{"a": 1}', '{"a": 2}', '{"a": 3}']
+    jobs.shutdown()
@@ -0,0 +1,88 @@
+import pytest
+
+from agents.json_schemas import FORMATS, Schema, SchemaRegistry
+from config import JSON_SCHEMAS_PATH
+
+@pytest.mark.parametrize("value", ["2024-01-15", "2024-01-15T10:30:00", "2024-01-15T10:30:00Z",
+                                   "2024-01-15 10:30:00+02:00"])
+def test_date_accepts_dates_and_complete_date_times(value):
+    FORMATS["date"](value)
+
+@pytest.mark.parametrize("value", ["2024-01-15garbage", "2024-01-15T99:99", "2024-13-01", "15/01/2024", ""])
+def test_date_rejects_anything_else(value):
+    with pytest.raises(ValueError):
+        FORMATS["date"](value)
+
+@pytest.mark.parametrize("value, valid", [
+    ("2024-01-15T10:30:00Z", True),
+    ("2024-01-15T10:30:00+02:00", True),
+    ("2024-01-15T25:00:00", False),
+    ("2024-01-15T10:30:00 trailing", False),
+])
+def test_date_time(value, valid):
+    if valid:
+        FORMATS["date-time"](value)
+    else:
+        with pytest.raises(ValueError):
+            FORMATS["date-time"](value)
+
+@pytest.mark.parametrize("value, valid", [("ana@example.com", True), ("ana@example", False), ("a b@c.de", False)])
+def test_email(value, valid):
+    if valid:
+        FORMATS["email"](value)
+    else:
+        with pytest.raises(ValueError):
+            FORMATS["email"](value)
+
+INVOICE = Schema("Invoice", {
+    "required": ["id", "amount", "date", "due_date"],
+    "fields": {
+        "id": {"type": ["string", "integer"]},
+        "amount": {"type": "number", "minimum": 0},
+        "currency": {"type": "string", "pattern": "^[A-Z]{3}$"},
+        "date": {"type": "string", "format": "date"},
+        "due_date": {"type": "string", "format": "date"},
+        "items": {"type": "array", "min_items": 1},
+    },
+    "ordered": [["date", "due_date"]],
+})
+
+def test_valid_document_has_no_findings():
+    document = {"id": 7, "amount": 10, "currency": "USD", "date": "2024-01-15", "due_date": "2024-02-15",
+                "items": [{}]}
+
+    assert INVOICE.validate(document) == {"missing_fields": [], "anomalies": []}
+
+def test_each_field_reports_its_first_problem():
+    document = {"id": 1.5, "amount": -3, "currency": "usd", "date": "2024-01-15garbage", "due_date": "",
+                "items": []}
+
+    assert INVOICE.validate(document) == {
+        "missing_fields": ["due_date"],
+        "anomalies": [
+            "id: expected string or integer, got number",
+            "amount: -3 is below the minimum 0",
+            "currency: 'usd' does not match ^[A-Z]{3}$",
+            "date: '2024-01-15garbage' is not a valid date",
+            "due_date: '' is not a valid date",
+            "items: expected at least 1 item(s), got 0",
+        ]
+    }
+
+def test_ordered_dates_must_not_run_backwards():
+    document = {"id": 7, "amount": 10, "date": "2024-02-15T09:00:00", "due_date": "2024-01-15"}
+
+    assert INVOICE.validate(document)["anomalies"] == [
+        "due_date (2024-01-15) is before date (2024-02-15T09:00:00)"
+    ]
+
+def test_non_object_documents():
+    assert INVOICE.validate([1, 2])["anomalies"] == ["expected a JSON object, got array"]
+
+def test_registry_selects_by_intent_declared_type_or_best_fit():
+    registry = SchemaRegistry.from_file(JSON_SCHEMAS_PATH)
+
+    assert registry.select({}, intent="invoice").intent == "Invoice"
+    assert registry.select({"type": "RFQ"}).intent == "RFQ"
+    assert registry.select({"items": [], "delivery_date": "2024-01-01"}).intent == "RFQ"
+    assert registry.select({"unrelated": 1}) is None
@@ -0,0 +1,66 @@
+import io
+import json
+
+import pytest
+
+from utils.json_stream import is_record_stream, iter_records
+
+RECORDS = [
+    {"id": 1, "name": "Widget, large", "tags": ["a", "b]"], "price": 12.5},
+    {"id": 2, "note": "quote \" and backslash \\ and unicode é中"},
+    [1, 2, {"nested": [3, 4]}],
+    "plain string",
+    123456789,
+    None,
+]
+
+def records(data: bytes, **kwargs) -> list:
+    return list(iter_records(io.BytesIO(data), **kwargs))
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 1024 * 1024])
+def test_array_elements_are_yielded_whole_at_any_chunk_size(chunk_size):
+    data = json.dumps(RECORDS, indent=2, ensure_ascii=False).encode("utf-8")
+
+    result = records(data, chunk_size=chunk_size)
+    assert [index for index, _, _ in result] == list(range(len(RECORDS)))
+    assert [json.loads(text) for _, text, error in result if error is None] == RECORDS
+
+def test_malformed_element_is_reported_and_the_rest_still_read():
+    data = b'[{"id": 1}, {"id": 2,, "x": [1, ","]}, {"id": 3}]'
+
+    result = records(data, chunk_size=5)
+    assert [(index, error is None) for index, _, error in result] == [(0, True), (1, False), (2, True)]
+    assert json.loads(result[2][1]) == {"id": 3}
+
+def test_truncated_array_reports_the_last_record():
+    result = records(b'[{"id": 1}, {"id": 2', chunk_size=4)
+
+    assert result[0][2] is None
+    assert result[1][2] == "Invalid JSON: truncated record at end of input"
+
+def test_byte_order_mark_and_empty_array():
+    assert records(b"\xef\xbb\xbf  [ ]") == []
+    assert [text for _, text, _ in records(b'\xef\xbb\xbf[{"a": 1}]')] == ['{"a": 1}']
+
+def test_non_array_is_rejected():
+    with pytest.raises(ValueError):
+        records(b'{"a": 1}')
+
+def test_ndjson_skips_blank_lines_and_flags_bad_ones():
+    data = b'{"id": 1}\n\n  \n{"id": 2\n{"id": 3}'
+
+    result = records(data, ndjson=True, chunk_size=3)
+    assert [(index, text, error is None) for index, text, error in result] == [
+        (0, '{"id": 1}', True), (1, '{"id": 2', False), (2, '{"id": 3}', True)
+    ]
+
+def test_multibyte_characters_split_across_chunks():
+    data = json.dumps(["été 中文"], ensure_ascii=False).encode("utf-8")
+
+    assert json.loads(records(data, chunk_size=1)[0][1]) == "été 中文"
+
+def test_is_record_stream():
+    assert is_record_stream("feed.NDJSON", b"{", 10)
+    assert is_record_stream("big.json", b"  [", 2048, min_bytes=1024)
+    assert not is_record_stream("small.json", b"[", 10, min_bytes=1024)
+    assert not is_record_stream("big.json", b"{", 2048, min_bytes=1024)
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+import llm_gateway
+from llm_cache import LLMCache, make_key
+
+MESSAGES = [{"role": "system", "content": "You are a precise email parsing assistant."},
+            {"role": "user", "content": "From: a@example.com\nPlease quote 10 units."}]
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+def test_key_covers_every_parameter_that_changes_the_reply():
+    key = make_key("m", MESSAGES, 0.1)
+
+    assert key == make_key("m", [dict(message) for message in MESSAGES], 0.1)
+    assert len({key, make_key("other", MESSAGES, 0.1), make_key("m", MESSAGES, 0.2),
+                make_key("m", MESSAGES, 0.1, {"type": "json_object"}), make_key("m", MESSAGES, 0.1, None, 100),
+                make_key("m", MESSAGES[:1], 0.1)}) == 6
+
+def test_memory_tier_evicts_least_recently_used(path):
+    cache = LLMCache(path, memory_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert list(cache.memory) == ["a", "c"]
+    # The disk tier still has it and brings it back into memory
+    assert cache.get("b") == "2"
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["evictions"] == 2
+
+def test_disk_tier_survives_a_restart(path):
+    LLMCache(path).set("a", "1")
+
+    cache = LLMCache(path)
+    assert cache.get("a") == "1"
+    assert cache.get("missing") is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+def test_expired_entries_are_misses_in_both_tiers(path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_cache.time.time", lambda: now[0])
+    cache = LLMCache(path, ttl=60)
+    cache.set("a", "1")
+    now[0] += 61
+
+    assert cache.get("a") is None
+    assert LLMCache(path, ttl=60).get("a") is None
+
+def test_disk_tier_is_pruned_to_its_cap(path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_cache.time.time", lambda: now[0])
+    cache = LLMCache(path, memory_entries=1, disk_entries=50, ttl=0)
+    for index in range(100):
+        now[0] += 1
+        cache.set(str(index), str(index))
+
+    assert cache.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 50
+    assert cache.get("0") is None and cache.get("99") == "99"
+
+def test_delete_and_clear(path):
+    cache = LLMCache(path)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.delete("a")
+
+    assert cache.get("a") is None
+    cache.clear()
+    assert LLMCache(path).get("b") is None
+
+def test_repeated_requests_are_served_from_the_cache(stub_llm):
+    first = llm_gateway.chat(MESSAGES)
+    second = llm_gateway.chat(MESSAGES)
+
+    assert first == second and stub_llm.requests == 1
+    llm_gateway.chat(MESSAGES, cache=False)
+    assert stub_llm.requests == 2
+
+def test_replies_that_fail_to_parse_are_not_cached(stub_llm):
+    def reject(text):
+        raise ValueError("bad reply")
+
+    with pytest.raises(ValueError):
+        llm_gateway.chat(MESSAGES, parse=reject)
+    assert llm_gateway.chat(MESSAGES, parse=json.loads)["Urgency"] == "medium"
+    assert stub_llm.requests == 2
+    assert llm_gateway.chat(MESSAGES, parse=json.loads)["Urgency"] == "medium"
+    assert stub_llm.requests == 2
+
+def test_cached_replies_that_no_longer_parse_are_dropped(stub_llm):
+    key = make_key(llm_gateway.LLM_MODEL, MESSAGES, 0.1)
+    llm_gateway.get_cache().set(key, "not json")
+
+    assert llm_gateway.chat(MESSAGES, parse=json.loads)["Urgency"] == "medium"
+    assert stub_llm.requests == 1
+    assert json.loads(llm_gateway.get_cache().get(key))["Urgency"] == "medium"
+
+def test_streamed_replies_are_cached_once_valid(stub_llm):
+    first = "".join(llm_gateway.stream_chat(MESSAGES, validate=json.loads))
+    cached = list(llm_gateway.stream_chat(MESSAGES, validate=json.loads))
+
+    assert cached == [first] and stub_llm.requests == 1
+
+    def reject(text):
+        raise ValueError("bad reply")
+
+    other = MESSAGES + [{"role": "user", "content": "again"}]
+    "".join(llm_gateway.stream_chat(other, validate=reject))
+    "".join(llm_gateway.stream_chat(other, validate=reject))
+    assert stub_llm.requests == 3
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import llm_gateway
+import telemetry
+
+MESSAGES = [{"role": "system", "content": "You are a precise email parsing assistant."},
+            {"role": "user", "content": "From: a@example.com\nPlease quote 10 units."}]
+
+def test_chat_returns_the_completion(stub_llm):
+    content = llm_gateway.chat(MESSAGES, cache=False)
+
+    assert json.loads(content)["Subject"] == "Request for Quotation - Widget A"
+    assert stub_llm.requests == 1
+
+def test_every_thread_shares_one_client(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_client", None)
+    monkeypatch.setattr(llm_gateway, "GROQ_API_KEY", "stub")
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(llm_gateway.get_client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 1
+    # Retries belong to the scheduler
+    assert clients[0].max_retries == 0
+    clients[0].close()
+
+def test_submit_chat_and_achat_run_in_the_background(stub_llm):
+    futures = [llm_gateway.submit_chat(MESSAGES + [{"role": "user", "content": str(index)}], cache=False)
+               for index in range(6)]
+
+    assert all(json.loads(future.result(timeout=10))["Urgency"] == "medium" for future in futures)
+    assert json.loads(asyncio.run(llm_gateway.achat(MESSAGES, cache=False)))["Urgency"] == "medium"
+    assert stub_llm.requests == 7
+
+def test_requests_and_tokens_are_counted_per_agent(stub_llm):
+    telemetry.reset()
+    llm_gateway.chat(MESSAGES, cache=False, agent="email_agent")
+
+    metrics = telemetry.render_prometheus()
+    assert 'llm_requests_total{agent="email_agent",model="llama3-70b-8192",status="ok"} 1' in metrics
+    assert 'llm_tokens_total{agent="email_agent",kind="completion",model="llama3-70b-8192"}' in metrics
+
+def test_api_errors_are_raised_and_counted(stub_llm):
+    telemetry.reset()
+    stub_llm.error_rate = 1.0
+
+    with pytest.raises(Exception):
+        llm_gateway.chat(MESSAGES, cache=False, agent="email_agent")
+    assert 'status="error"} 1' in telemetry.render_prometheus()
@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import groq
+import httpx
+import pytest
+
+import llm_scheduler
+from llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, TokenBucket, is_retryable, retry_after_seconds
+
+REQUEST = httpx.Request("POST", "http://stub/openai/v1/chat/completions")
+
+def status_error(status: int, headers: dict = None) -> groq.APIStatusError:
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    error_type = groq.RateLimitError if status == 429 else groq.APIStatusError
+    return error_type("stub failure", response=response, body=None)
+
+def flaky(errors: list, result="ok"):
+    """A call raising each of ``errors`` in turn, then returning ``result``"""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn, calls
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "250"}, 0.25),
+    ({"retry-after-ms": "soon", "retry-after": "2"}, 2.0),
+    ({"retry-after": "3"}, 3.0),
+    ({"retry-after": "-5"}, 0.0),
+    ({"retry-after": "whenever"}, None),
+    ({}, None),
+])
+def test_retry_after_header_forms(headers, expected):
+    assert retry_after_seconds(status_error(429, headers)) == expected
+
+def test_retry_after_http_date():
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    seconds = retry_after_seconds(status_error(429, {"retry-after": format_datetime(later, usegmt=True)}))
+    assert 25 < seconds <= 30
+
+    earlier = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert retry_after_seconds(status_error(503, {"retry-after": format_datetime(earlier, usegmt=True)})) == 0.0
+    assert retry_after_seconds(ValueError("no response")) is None
+
+@pytest.mark.parametrize("error, retryable", [
+    (status_error(429), True),
+    (status_error(500), True),
+    (status_error(503), True),
+    (status_error(408), True),
+    (status_error(400), False),
+    (status_error(401), False),
+    (groq.APIConnectionError(request=REQUEST), True),
+    (groq.APITimeoutError(request=REQUEST), True),
+    (ValueError("bad parse"), False),
+])
+def test_retryable_errors(error, retryable):
+    assert is_retryable(error) is retryable
+
+def test_backoff_is_jittered_and_capped():
+    scheduler = LLMScheduler(rpm=0, tpm=0, backoff_base=1.0, backoff_max=4.0)
+    error = status_error(500)
+
+    assert all(0 <= scheduler.backoff(0, error) <= 1.0 for _ in range(50))
+    assert all(0 <= scheduler.backoff(10, error) <= 4.0 for _ in range(50))
+    assert scheduler.stats()["rate_limited"] == 0
+
+def test_retry_after_sets_the_minimum_delay_and_429_pauses_everyone():
+    scheduler = LLMScheduler(rpm=0, tpm=0, backoff_base=0.01, backoff_max=0.01)
+
+    assert scheduler.backoff(0, status_error(503, {"retry-after": "2"})) == 2.0
+    assert scheduler.paused_until == 0.0
+
+    before = time.monotonic()
+    assert scheduler.backoff(0, status_error(429, {"retry-after-ms": "300"})) == 0.3
+    assert before + 0.25 < scheduler.paused_until <= time.monotonic() + 0.3
+    assert scheduler.stats()["rate_limited"] == 1
+
+def test_paused_scheduler_holds_new_calls():
+    scheduler = LLMScheduler(rpm=0, tpm=0)
+    scheduler.pause(0.2)
+
+    started = time.monotonic()
+    scheduler.release(scheduler.acquire(10))
+    assert time.monotonic() - started >= 0.15
+
+def test_transient_errors_are_retried_until_success():
+    scheduler = LLMScheduler(rpm=0, tpm=0, max_retries=3, backoff_base=0, backoff_max=0)
+    fn, calls = flaky([status_error(500), groq.APIConnectionError(request=REQUEST)])
+
+    with scheduler.request(fn, tokens=10) as (grant, result):
+        assert result == "ok" and grant.tokens == 10
+        assert scheduler.stats()["in_flight"] == 1
+    assert len(calls) == 3
+    assert scheduler.stats() == {"granted": 3, "retries": 2, "rate_limited": 0, "gave_up": 0,
+                                 "in_flight": 0, "waiting": 0}
+
+def test_retries_give_up_after_the_limit():
+    scheduler = LLMScheduler(rpm=0, tpm=0, max_retries=2, backoff_base=0, backoff_max=0)
+    fn, calls = flaky([status_error(500) for _ in range(5)])
+
+    with pytest.raises(groq.APIStatusError):
+        with scheduler.request(fn, tokens=10):
+            pass
+    assert len(calls) == 3
+    assert scheduler.stats()["gave_up"] == 1 and scheduler.stats()["in_flight"] == 0
+
+def test_client_errors_are_not_retried():
+    scheduler = LLMScheduler(rpm=0, tpm=0, max_retries=3, backoff_base=0, backoff_max=0)
+    fn, calls = flaky([status_error(400)])
+
+    with pytest.raises(groq.APIStatusError):
+        with scheduler.request(fn, tokens=10):
+            pass
+    assert len(calls) == 1
+    assert scheduler.stats()["retries"] == scheduler.stats()["gave_up"] == 0
+
+def test_waiters_are_served_by_priority_then_arrival():
+    scheduler = LLMScheduler(rpm=0, tpm=0, max_concurrency=1)
+    holder = scheduler.acquire(1)
+    order = []
+
+    def call(name, level):
+        scheduler.release(scheduler.acquire(1, level))
+        order.append(name)
+
+    threads = []
+    for name, level in (("batch-1", BATCH), ("batch-2", BATCH), ("interactive", INTERACTIVE)):
+        thread = threading.Thread(target=call, args=(name, level))
+        thread.start()
+        threads.append(thread)
+        while scheduler.stats()["waiting"] < len(threads):
+            time.sleep(0.005)
+
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "batch-1", "batch-2"]
+
+def test_priority_context_overrides_the_default(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "_default_priority", INTERACTIVE)
+    assert llm_scheduler.current_priority() == INTERACTIVE
+    with llm_scheduler.priority(BATCH):
+        assert llm_scheduler.current_priority() == BATCH
+    assert llm_scheduler.current_priority() == INTERACTIVE
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1.0) == pytest.approx(0.0)
+    # Requests larger than the bucket only wait for a full bucket
+    assert bucket.wait_time(600, now + 1.0) == pytest.approx(59.0)
+
+    unlimited = TokenBucket(0)
+    unlimited.take(1000)
+    assert unlimited.wait_time(1000, now) == 0.0
+
+def test_reported_usage_corrects_the_estimate():
+    scheduler = LLMScheduler(rpm=0, tpm=6000)
+    grant = scheduler.acquire(1000)
+    grant.used({"total_tokens": 200})
+    scheduler.release(grant)
+    assert scheduler.tokens.level == pytest.approx(5800, abs=5)
+
+    grant = scheduler.acquire(100)
+    grant.used(type("Usage", (), {"total_tokens": 3000})())
+    scheduler.release(grant)
+    assert scheduler.tokens.level == pytest.approx(2800, abs=5)
+
+def test_token_estimate_counts_prompt_and_completion():
+    messages = [{"role": "system", "content": "x" * 40}, {"role": "user", "content": "y" * 80}]
+    assert llm_scheduler.estimate_tokens(messages, max_tokens=50) == 10 + 20 + 8 + 50
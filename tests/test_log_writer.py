@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from utils.log_writer import BackgroundLogWriter
+
+def lines(path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "logs" / "log.jsonl")
+
+def test_entries_are_written_in_order(path):
+    writer = BackgroundLogWriter(path, batch_size=7, flush_interval=0.01)
+    threads = [threading.Thread(target=lambda start=start: [writer.write({"n": n}) for n in range(start, start + 50)])
+               for start in (0, 50, 100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.flush()
+
+    written = [entry["n"] for entry in lines(path)]
+    assert sorted(written) == list(range(150))
+    for start in (0, 50, 100):
+        own = [n for n in written if start <= n < start + 50]
+        assert own == sorted(own)
+    writer.close()
+
+def test_close_flushes_and_refuses_later_writes(path):
+    writer = BackgroundLogWriter(path, batch_size=1000, flush_interval=60)
+    writer.write({"n": 1, "when": date(2024, 1, 15)})
+    writer.close()
+
+    assert lines(path) == [{"n": 1, "when": "2024-01-15"}]
+    with pytest.raises(RuntimeError):
+        writer.write({"n": 2})
+    writer.close()
+
+def test_rotates_by_size(path):
+    writer = BackgroundLogWriter(path, batch_size=1, flush_interval=0.01, max_bytes=200, rotate_daily=False,
+                                 compress=False)
+    for n in range(20):
+        writer.write({"n": n, "padding": "x" * 40})
+        writer.flush()
+    writer.close()
+
+    directory = os.path.dirname(path)
+    rotated = sorted(name for name in os.listdir(directory) if name != "log.jsonl")
+    assert rotated and all(name.startswith("log.") and name.endswith(".jsonl") for name in rotated)
+    entries = [entry for name in rotated for entry in lines(os.path.join(directory, name))] + lines(path)
+    assert sorted(entry["n"] for entry in entries) == list(range(20))
+
+def test_rotates_a_file_from_an_earlier_day_compressed(path):
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write('{"n": 0}\n')
+    yesterday = (datetime.now() - timedelta(days=1)).timestamp()
+    os.utime(path, (yesterday, yesterday))
+
+    writer = BackgroundLogWriter(path, batch_size=1, flush_interval=0.01, compress=True)
+    writer.write({"n": 1})
+    writer.write({"n": 2})
+    writer.close()
+
+    directory = os.path.dirname(path)
+    (archive,) = [name for name in os.listdir(directory) if name.endswith(".gz")]
+    with gzip.open(os.path.join(directory, archive), "rt") as f:
+        assert [json.loads(line) for line in f] == [{"n": 0}]
+    assert lines(path) == [{"n": 1}, {"n": 2}]
+
+def test_write_failures_do_not_stop_the_writer(path, capsys):
+    writer = BackgroundLogWriter(path, batch_size=1, flush_interval=0.01)
+    original = writer._write_batch
+    failures = []
+
+    def flaky(batch):
+        if not failures:
+            failures.append(batch)
+            raise OSError("disk full")
+        original(batch)
+
+    writer._write_batch = flaky
+    writer.write({"n": 1})
+    writer.flush()
+    writer.write({"n": 2})
+    writer.close()
+
+    assert lines(path) == [{"n": 2}]
+    assert "failed to write 1 entries: disk full" in capsys.readouterr().err
@@ -0,0 +1,71 @@
+import pytest
+
+from agents import pdf_agent
+from agents.pdf_agent import merge_results, process_pdf, split_into_chunks, split_sections
+from memory.shared_memory import SharedMemory
+
+SECTIONS = [f"Section {number}\n" + "cement pallets delivered to the north site. " * 8 for number in range(20)]
+
+@pytest.fixture
+def memory(tmp_path):
+    return SharedMemory(str(tmp_path / "memory.db"))
+
+def test_chunks_respect_the_limit_and_keep_every_section():
+    chunks = split_into_chunks(SECTIONS, 1000)
+
+    assert len(chunks) > 1 and all(len(chunk) <= 1000 for chunk in chunks)
+    assert "\n".join(chunks) == "\n".join(SECTIONS)
+
+def test_oversized_sections_are_cut_at_line_breaks_then_hard_cut():
+    section = "\n".join(["short line"] * 30 + ["x" * 250])
+    chunks = split_into_chunks([section], 100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == section.replace("\n", "")
+    assert chunks[0] == "\n".join(["short line"] * 9)
+
+def test_split_sections_on_blank_lines():
+    assert split_sections("a\nb\n\n  \nc\n\n") == ["a\nb", "c"]
+
+def test_merge_results():
+    merged = merge_results([
+        {"document_type": "Invoice", "key_entities": {"total": 10, "dates": ["2024-01-01"]},
+         "anomalies": ["late"]},
+        {"document_type": "report", "key_entities": {"total": 10, "vendor": "ACME"}, "anomalies": ["late"]},
+        {"document_type": "invoice", "key_entities": {"total": 12, "dates": ["2024-02-01"]},
+         "anomalies": [{"page": 3}]},
+        "not a dict",
+    ])
+
+    assert merged == {
+        "document_type": "Invoice",
+        "key_entities": {"total": [10, 12], "dates": ["2024-01-01", "2024-02-01"], "vendor": "ACME"},
+        "anomalies": ["late", {"page": 3}],
+    }
+
+def test_chunked_mode_maps_every_chunk_and_merges(stub_llm, memory, monkeypatch):
+    monkeypatch.setattr(pdf_agent, "PDF_CHUNK_CHARS", 1000)
+    text = "\n\n".join(SECTIONS)
+
+    result = process_pdf(text, "c1", memory, mode="chunked")
+    chunks = len(split_into_chunks(SECTIONS, 1000))
+    assert stub_llm.requests == chunks
+    assert result["document_type"] == "invoice"
+    assert f"PDF analysis completed across {chunks} chunks" in memory.retrieve_conversation("c1")["processing_steps"]
+
+def test_chunk_count_is_capped(stub_llm, memory, monkeypatch):
+    monkeypatch.setattr(pdf_agent, "PDF_CHUNK_CHARS", 1000)
+    monkeypatch.setattr(pdf_agent, "PDF_MAX_CHUNKS", 2)
+
+    process_pdf("\n\n".join(SECTIONS), "c1", memory, mode="chunked")
+    assert stub_llm.requests == 2
+    assert any(step.startswith("Skipped") for step in memory.retrieve_conversation("c1")["processing_steps"])
+
+def test_auto_mode_only_chunks_what_does_not_fit(stub_llm, memory, monkeypatch):
+    monkeypatch.setattr(pdf_agent, "PDF_CHUNK_CHARS", 1000)
+
+    process_pdf(SECTIONS[0], "short", memory, mode="auto")
+    assert stub_llm.requests == 1
+    monkeypatch.setattr(pdf_agent, "PDF_TOKEN_BUDGET", 200)
+    process_pdf("\n\n".join(SECTIONS), "long", memory, mode="auto")
+    assert stub_llm.requests > 2
@@ -0,0 +1,70 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from bench.synthetic import make_pdf
+from utils.pdf_extract import extract_pdf_text
+
+PAGES = [[f"Page {number}"] + ["pallet of cement delivered"] * 10 for number in range(12)]
+
+class OneShotStream(io.RawIOBase):
+    """A readable stream that cannot seek, like a socket or pipe"""
+    def __init__(self, data: bytes):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+@pytest.fixture(scope="module")
+def pdf(tmp_path_factory):
+    data = make_pdf(PAGES)
+    path = tmp_path_factory.mktemp("pdf") / "doc.pdf"
+    path.write_bytes(data)
+    return data, path
+
+def test_extraction_stops_once_the_budget_is_met(pdf):
+    data, _ = pdf
+    extraction = extract_pdf_text(data, char_budget=500)
+
+    assert extraction["pages_read"] < extraction["total_pages"] == 12
+    assert extraction["truncated"]
+    assert len(extraction["text"]) > 500
+    assert len(extraction["page_timings_ms"]) == extraction["pages_read"]
+    assert extraction["text"] == "\n".join(extraction["pages"])
+    assert extraction["pages"][0].startswith("Page 0")
+
+def test_no_budget_reads_every_page(pdf):
+    data, _ = pdf
+    extraction = extract_pdf_text(data, char_budget=None)
+
+    assert extraction["pages_read"] == 12 and not extraction["truncated"]
+    assert extraction["pages"][-1].startswith("Page 11")
+
+def test_every_kind_of_source_gives_the_same_text(pdf):
+    data, path = pdf
+    expected = extract_pdf_text(data, char_budget=2000)["text"]
+
+    for source in (bytearray(data), memoryview(data), io.BytesIO(data), path, OneShotStream(data)):
+        assert extract_pdf_text(source, char_budget=2000)["text"] == expected
+
+def test_seekable_streams_are_rewound(pdf):
+    data, _ = pdf
+    stream = io.BytesIO(data)
+    stream.seek(100)
+
+    assert extract_pdf_text(stream, char_budget=None)["pages_read"] == 12
+
+def test_bad_sources(tmp_path):
+    empty = tmp_path / "empty.pdf"
+    empty.write_bytes(b"")
+
+    with pytest.raises(ValueError):
+        extract_pdf_text(Path(empty))
+    with pytest.raises(TypeError):
+        extract_pdf_text("not a source")
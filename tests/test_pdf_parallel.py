@@ -0,0 +1,59 @@
+import io
+import os
+import tempfile
+
+import pytest
+
+import utils.pdf_extract as pdf_extract
+from bench.synthetic import make_pdf
+from utils.pdf_extract import extract_pdf_text, extract_pdf_text_parallel, pdf_path
+
+PAGES = [[f"Page {number}"] + [f"line {line} of page {number}" for line in range(5)] for number in range(40)]
+
+@pytest.fixture(scope="module")
+def pool():
+    yield
+    if pdf_extract._pool is not None:
+        pdf_extract._pool.shutdown(wait=True)
+        pdf_extract._pool = None
+
+def spooled_files() -> set:
+    return {name for name in os.listdir(tempfile.gettempdir()) if name.startswith("pdf-")}
+
+def test_page_ranges_cover_every_page_once():
+    for total in (1, 8, 40, 1001):
+        ranges = pdf_extract._page_ranges(total, 4)
+        assert [page for start, stop in ranges for page in range(start, stop)] == list(range(total))
+
+def test_parallel_text_matches_sequential(pool, tmp_path):
+    data = make_pdf(PAGES)
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(data)
+    expected = extract_pdf_text(data, char_budget=None)["pages"]
+    before = spooled_files()
+
+    for source in (data, io.BytesIO(data), path):
+        extraction = extract_pdf_text_parallel(source, len(PAGES), workers=2)
+        assert extraction["pages"] == expected
+        assert extraction["pages_read"] == 40 and not extraction["truncated"]
+    # Bytes and streams were spooled to disk once and cleaned up
+    assert spooled_files() == before
+
+def test_long_documents_use_the_pool(pool, monkeypatch):
+    monkeypatch.setattr(pdf_extract, "PDF_EXTRACT_WORKERS", 2)
+    monkeypatch.setattr(pdf_extract, "PDF_PARALLEL_MIN_PAGES", 30)
+    data = make_pdf(PAGES)
+
+    assert "parallel_workers" in extract_pdf_text(data, char_budget=None)
+    assert "parallel_workers" not in extract_pdf_text(make_pdf(PAGES[:10]), char_budget=None)
+    assert "parallel_workers" not in extract_pdf_text(data, char_budget=1000)
+
+def test_pdf_path_spools_once_and_removes_the_file():
+    with pdf_path(b"%PDF-1.4 data") as path:
+        assert path.read_bytes() == b"%PDF-1.4 data"
+    assert not path.exists()
+
+    with pytest.raises(RuntimeError):
+        with pdf_path(io.BytesIO(b"data")) as path:
+            raise RuntimeError("worker failed")
+    assert not path.exists()
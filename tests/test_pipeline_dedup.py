@@ -0,0 +1,61 @@
+import pytest
+
+import pipeline
+from bench.synthetic import make_pdf
+from memory.dedup_index import DedupIndex
+from memory.shared_memory import SharedMemory
+from utils.pdf_extract import extract_pdf_text, limit_extraction
+
+def pages(last: str) -> list:
+    return [[f"Section {number}"] + ["steel beam delivered to site north"] * 40 for number in range(30)] + [[last]]
+
+@pytest.fixture
+def memory(tmp_path):
+    return SharedMemory(str(tmp_path / "memory.db"))
+
+@pytest.fixture
+def agent(monkeypatch):
+    """The PDF agent, replaced by one recording the extraction it was handed"""
+    extractions = []
+
+    def process_pdf(content, conversation_id, memory, on_token=None, extraction=None):
+        extractions.append(extraction)
+        memory.append_to_conversation(conversation_id, {"results": {"pages": extraction["pages_read"]}})
+        return {"pages": extraction["pages_read"]}
+
+    monkeypatch.setattr(pipeline, "process_pdf", process_pdf)
+    monkeypatch.setattr(pipeline, "local_classification",
+                        lambda source, content: {"format": "pdf", "intent": "Invoice", "confidence": 0.9})
+    monkeypatch.setattr(pipeline, "get_dedup_index", lambda index=DedupIndex(":memory:"): index)
+    monkeypatch.setattr(pipeline, "PDF_ANALYSIS_MODE", "truncate")
+    monkeypatch.setattr(pipeline, "PDF_CHAR_BUDGET", 4000)
+    return extractions
+
+def test_limit_extraction_matches_a_budgeted_extraction():
+    content = make_pdf(pages("Total due: 100 USD"))
+    full = extract_pdf_text(content, None)
+
+    assert limit_extraction(full, 4000)["pages"] == extract_pdf_text(content, 4000)["pages"]
+    assert limit_extraction(full, 4000)["truncated"]
+    assert limit_extraction(full, 10 ** 9) is full
+
+def test_pdfs_differing_past_the_budget_are_not_reused(memory, agent):
+    first = pipeline.process_document("a.pdf", make_pdf(pages("Total due: 100 USD")), "[PDF FILE]", memory,
+                                      index=False)
+    second = pipeline.process_document("b.pdf", make_pdf(pages("Total due: 900 USD")), "[PDF FILE]", memory,
+                                       index=False)
+
+    assert len(agent) == 2
+    assert second["duplicate_of"] is None or not second["duplicate_of"]["exact"]
+    assert second["result"] == first["result"]
+    # The agent still only gets the pages within its budget
+    assert agent[0]["truncated"] and agent[0]["total_pages"] == 31
+
+def test_identical_pdfs_are_reused(memory, agent):
+    content = make_pdf(pages("Total due: 100 USD"))
+    first = pipeline.process_document("a.pdf", content, "[PDF FILE]", memory, index=False)
+    second = pipeline.process_document("b.pdf", content, "[PDF FILE]", memory, index=False)
+
+    assert len(agent) == 1
+    assert second["duplicate_of"]["conversation_id"] == first["conversation_id"]
+    assert second["duplicate_of"]["exact"]
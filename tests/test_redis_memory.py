@@ -0,0 +1,150 @@
+import threading
+
+import fakeredis
+import pytest
+
+from memory.redis_memory import RedisMemory
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+def test_store_append_retrieve(client):
+    memory = RedisMemory(client=client, ttl=0)
+    memory.store("c1", {"source": "file:a.pdf", "classification": {"format": "pdf"}})
+    step = memory.append_to_conversation("c1", {"agent": "pdf_processor", "results": {"total": 12.5}})
+
+    assert step == "append"
+    assert memory.retrieve_conversation("c1") == {
+        "source": "file:a.pdf",
+        "classification": {"format": "pdf"},
+        "agent": "pdf_processor",
+        "results": {"total": 12.5},
+    }
+    assert [event["step"] for event in memory.conversation_events("c1")] == ["store", "append"]
+    assert memory.conversation_events("c1")[1]["data"] == {"agent": "pdf_processor", "results": {"total": 12.5}}
+
+def test_append_overwrites_only_its_fields(client):
+    memory = RedisMemory(client=client, ttl=0)
+    memory.store("c1", {"source": "a", "results": {"v": 1}})
+    memory.append_to_conversation("c1", {"results": {"v": 2}})
+
+    assert memory.retrieve_conversation("c1") == {"source": "a", "results": {"v": 2}}
+
+def test_store_replaces_previous_state(client):
+    memory = RedisMemory(client=client, ttl=0)
+    memory.store("c1", {"source": "a", "agent": "x"})
+    memory.store("c1", {"source": "b"})
+
+    assert memory.retrieve_conversation("c1") == {"source": "b"}
+
+def test_first_append_is_recorded_as_store(client):
+    memory = RedisMemory(client=client, ttl=0)
+
+    assert memory.append_to_conversation("new", {"source": "a"}) == "store"
+
+def test_missing_conversation(client):
+    memory = RedisMemory(client=client, ttl=0)
+
+    assert memory.retrieve_conversation("missing") is None
+    assert memory.conversation_events("missing") == []
+
+def test_ttl_is_refreshed_on_every_write(client):
+    memory = RedisMemory(client=client, ttl=60)
+    memory.store("c1", {"source": "a"})
+    client.expire("conversation:c1:state", 5)
+    client.expire("conversation:c1:events", 5)
+    memory.append_to_conversation("c1", {"agent": "x"})
+
+    assert 5 < client.ttl("conversation:c1:state") <= 60
+    assert 5 < client.ttl("conversation:c1:events") <= 60
+
+def test_ttl_zero_keeps_conversations(client):
+    memory = RedisMemory(client=client, ttl=0)
+    memory.store("c1", {"source": "a"})
+
+    assert client.ttl("conversation:c1:state") == -1
+    assert client.ttl("conversation:c1:events") == -1
+
+def test_concurrent_appends_keep_every_field_and_event(client):
+    memory = RedisMemory(client=client, ttl=60)
+    memory.store("c1", {"source": "a"})
+    threads = [
+        threading.Thread(target=memory.append_to_conversation, args=("c1", {f"field_{index}": index}))
+        for index in range(32)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    state = memory.retrieve_conversation("c1")
+    assert state == {"source": "a", **{f"field_{index}": index for index in range(32)}}
+    events = memory.conversation_events("c1")
+    assert len(events) == 33
+    appended = sorted(next(iter(event["data"].values())) for event in events if event["step"] == "append")
+    assert appended == list(range(32))
+
+def test_prefix_separates_stores(client):
+    first = RedisMemory(client=client, ttl=0, prefix="a")
+    second = RedisMemory(client=client, ttl=0, prefix="b")
+    first.store("c1", {"source": "first"})
+
+    assert second.retrieve_conversation("c1") is None
+
+def test_racing_first_writers_record_one_store():
+    server = fakeredis.FakeServer()
+    other = RedisMemory(client=fakeredis.FakeRedis(server=server), ttl=0)
+    raced = []
+
+    class RacingClient(fakeredis.FakeRedis):
+        def pipeline(self, *args, **kwargs):
+            pipe = super().pipeline(*args, **kwargs)
+            exists = pipe.exists
+
+            def racing_exists(*keys):
+                found = exists(*keys)
+                if not raced:
+                    # Another replica writes between the check and EXEC
+                    raced.append(True)
+                    other.append_to_conversation("new", {"source": "other"})
+                return found
+
+            pipe.exists = racing_exists
+            return pipe
+
+    memory = RedisMemory(client=RacingClient(server=server), ttl=0)
+
+    assert memory.append_to_conversation("new", {"agent": "x"}) == "append"
+    assert [event["step"] for event in memory.conversation_events("new")] == ["store", "append"]
+
+def test_concurrent_first_appends_record_one_store(client):
+    memory = RedisMemory(client=client, ttl=0)
+    threads = [
+        threading.Thread(target=memory.append_to_conversation, args=("new", {f"field_{index}": index}))
+        for index in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    steps = [event["step"] for event in memory.conversation_events("new")]
+    assert steps.count("store") == 1 and len(steps) == 16
+
+def test_event_stream_is_trimmed(client):
+    memory = RedisMemory(client=client, ttl=0, events_maxlen=10)
+    memory.store("c1", {"source": "a"})
+    for index in range(500):
+        memory.append_to_conversation("c1", {"index": index})
+
+    # Trimming is approximate: Redis drops whole stream nodes
+    assert client.xlen("conversation:c1:events") < 500
+    assert memory.retrieve_conversation("c1") == {"source": "a", "index": 499}
+
+def test_events_maxlen_zero_keeps_every_event(client):
+    memory = RedisMemory(client=client, ttl=0, events_maxlen=0)
+    for index in range(200):
+        memory.append_to_conversation("c1", {"index": index})
+
+    assert client.xlen("conversation:c1:events") == 200
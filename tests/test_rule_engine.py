@@ -0,0 +1,57 @@
+import pytest
+
+from agents.rule_engine import RuleEngine
+from config import CLASSIFIER_RULES_PATH
+
+@pytest.fixture(scope="module")
+def rules():
+    return RuleEngine.from_file(CLASSIFIER_RULES_PATH)
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"id": 7, "type": "invoice", "amount": 10}', ("json", "Invoice")),
+    ('  {"items": [1], "subject": "Request for quotation"}', ("json", "RFQ")),
+    ('{"id": 7, "note": "hello"}', ("json", "Other")),
+    ("ACME-CORP #1001\nWidgets 5 units @ $3.50\nTotal: $17.50", ("pdf", "Invoice")),
+    ("Page 2 of 9\nPlease send your best pricing", ("pdf", "RFQ")),
+    ("Service agreement between the parties", ("pdf", "Other")),
+])
+def test_shipped_rules(rules, content, expected):
+    assert rules.classify(content) == expected
+
+@pytest.mark.parametrize("content", [
+    '{"name": "no document keys"}',
+    '[{"id": 1}]',
+    '{"id": 1,',
+    "Hi team, lunch is at noon.",
+])
+def test_no_rule_applies(rules, content):
+    assert rules.classify(content) is None
+
+def test_intents_follow_file_order():
+    engine = RuleEngine({"json_intents": [{"intent": "First", "keywords": ["b"]},
+                                          {"intent": "Second", "keywords": ["a"]}]})
+
+    assert engine.intent("json_intents", "a b") == "First"
+    assert engine.intent("json_intents", "a") == "Second"
+    assert engine.intent("json_intents", "c") == "Other"
+
+def test_keywords_are_looked_up_once_per_document():
+    engine = RuleEngine({"json_intents": [{"intent": "Invoice", "keywords": ["total"]}],
+                         "pdf_intents": [{"intent": "Invoice", "keywords": ["TOTAL"]}]})
+    seen = {}
+
+    engine.intent("json_intents", "grand total", seen)
+    assert seen == {"total": True}
+    seen["total"] = False
+    # The cached answer is reused for the same keyword from another rule set
+    assert engine.intent("pdf_intents", "grand total", seen) == "Other"
+
+def test_structure_patterns_only_run_when_a_required_literal_is_present():
+    engine = RuleEngine({"pdf_structure_patterns": [
+        {"pattern": r"\border\b", "requires_any": ["invoice"]},
+        r"\bpage \d+\b",
+    ]})
+
+    assert not engine.is_pdf_like("order 17")
+    assert engine.is_pdf_like("invoice for order 17")
+    assert engine.is_pdf_like("see page 4")
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+import memory.shared_memory as shared_memory
+from memory.shared_memory import SharedMemory, ThreadSafeSharedMemory, create_memory
+
+@pytest.fixture(params=["file", ":memory:"])
+def memory(request, tmp_path):
+    return SharedMemory(str(tmp_path / "memory.db") if request.param == "file" else ":memory:")
+
+def test_store_append_retrieve(memory):
+    memory.store("c1", {"source": "file:a.pdf", "processing_steps": []})
+    step = memory.append_to_conversation("c1", {"classification": {"format": "pdf"}, "results": {"total": 1}})
+
+    assert step == "append"
+    assert memory.retrieve_conversation("c1") == {
+        "source": "file:a.pdf", "processing_steps": [], "classification": {"format": "pdf"}, "results": {"total": 1}
+    }
+    assert [(event["step"], event["data"]) for event in memory.conversation_events("c1")] == [
+        ("store", {"source": "file:a.pdf", "processing_steps": []}),
+        ("append", {"classification": {"format": "pdf"}, "results": {"total": 1}}),
+    ]
+
+def test_append_only_replaces_its_fields(memory):
+    memory.store("c1", {"source": "a", "results": {"v": 1}})
+    memory.append_to_conversation("c1", {"results": {"v": 2}})
+
+    assert memory.retrieve_conversation("c1") == {"source": "a", "results": {"v": 2}}
+
+def test_store_replaces_the_state_but_keeps_the_history(memory):
+    memory.store("c1", {"source": "a", "agent": "x"})
+    memory.store("c1", {"source": "b"})
+
+    assert memory.retrieve_conversation("c1") == {"source": "b"}
+    assert len(memory.conversation_events("c1")) == 2
+
+def test_first_append_is_recorded_as_store(memory):
+    assert memory.append_to_conversation("new", {"source": "a"}) == "store"
+    assert memory.retrieve_conversation("missing") is None
+    assert memory.conversation_events("missing") == []
+
+def test_conversations_survive_a_restart(tmp_path):
+    SharedMemory(str(tmp_path / "memory.db")).store("c1", {"source": "a"})
+
+    assert SharedMemory(str(tmp_path / "memory.db")).retrieve_conversation("c1") == {"source": "a"}
+
+def test_concurrent_writers_and_readers(memory):
+    memory.store("c1", {"source": "a"})
+    seen = []
+
+    def write(index):
+        memory.append_to_conversation("c1", {f"field_{index}": index})
+        seen.append(len(memory.retrieve_conversation("c1")))
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert memory.retrieve_conversation("c1") == {"source": "a", **{f"field_{index}": index for index in range(32)}}
+    assert len(memory.conversation_events("c1")) == 33
+    assert len(seen) == 32 and min(seen) >= 2
+
+def test_thread_safe_wrapper_mirrors_writes_into_the_log(monkeypatch, tmp_path):
+    logged = []
+    monkeypatch.setattr(shared_memory, "log_to_file", lambda *entry: logged.append(entry))
+    memory = ThreadSafeSharedMemory(SharedMemory(str(tmp_path / "memory.db")))
+
+    memory.store("c1", {"source": "a"})
+    memory.append_to_conversation("c1", {"agent": "x"})
+    memory.append_to_conversation("c2", {"source": "b"})
+
+    assert logged == [("c1", "store", {"source": "a"}), ("c1", "append", {"agent": "x"}),
+                      ("c2", "store", {"source": "b"})]
+    assert memory.retrieve_conversation("c1") == {"source": "a", "agent": "x"}
+    assert len(memory.conversation_events("c1")) == 2
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_memory("cassandra")
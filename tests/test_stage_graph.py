@@ -0,0 +1,102 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import utils.stage_graph as stage_graph
+from utils.stage_graph import StageGraph
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(stage_graph, "_executor", pool)
+    yield pool
+    pool.shutdown(wait=True)
+
+def test_stages_get_their_inputs_outputs_and_timings():
+    timings = {}
+    graph = StageGraph(timings)
+    graph.add("a", lambda: 2)
+    graph.add("b", lambda: 3)
+    graph.add("sum", lambda a, b: a + b, ("a", "b"))
+    graph.add("double", lambda total: total * 2, ("sum",), inline=True)
+
+    assert graph.run() == {"a": 2, "b": 3, "sum": 5, "double": 10}
+    assert set(timings) == {"a", "b", "sum", "double"}
+
+def test_unknown_input_is_rejected():
+    graph = StageGraph()
+
+    with pytest.raises(ValueError):
+        graph.add("b", lambda a: a, ("a",))
+
+def test_independent_stages_run_concurrently():
+    graph = StageGraph()
+    barrier = threading.Barrier(2, timeout=5)
+    graph.add("a", barrier.wait)
+    graph.add("b", barrier.wait)
+
+    graph.run()
+
+def test_inline_stages_run_on_the_calling_thread():
+    graph = StageGraph()
+    graph.add("pool", threading.get_ident)
+    graph.add("inline", lambda _: threading.get_ident(), ("pool",), inline=True)
+
+    outputs = graph.run()
+    assert outputs["inline"] == threading.get_ident()
+    assert outputs["pool"] != threading.get_ident()
+
+def test_inline_stages_are_not_capped_by_the_pool(small_pool):
+    def document():
+        graph = StageGraph()
+        graph.add("short", lambda: None)
+        graph.add("long", lambda _: time.sleep(0.3), ("short",), inline=True)
+        graph.run()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=document) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Eight long stages sharing two pool threads would take at least 1.2s
+    assert time.perf_counter() - started < 0.9
+
+def test_stage_errors_are_raised():
+    graph = StageGraph()
+    graph.add("fail", lambda: 1 / 0)
+    graph.add("after", lambda _: None, ("fail",))
+
+    with pytest.raises(ZeroDivisionError):
+        graph.run()
+
+def test_stop_skips_the_remaining_stages():
+    ran = []
+    graph = StageGraph()
+    graph.add("check", lambda: "duplicate")
+    graph.add("work", lambda _: ran.append("work"), ("check",), inline=True)
+
+    outputs = graph.run(stop=lambda name, output: output == "duplicate")
+    assert outputs == {"check": "duplicate"}
+    assert ran == []
+
+def test_stop_during_an_inline_stage_discards_what_it_raises():
+    abandoned = threading.Event()
+
+    def speculative():
+        assert abandoned.wait(5)
+        raise RuntimeError("abandoned")
+
+    def stop(name, output):
+        if output == "duplicate":
+            abandoned.set()
+            return True
+        return False
+
+    graph = StageGraph()
+    graph.add("check", lambda: time.sleep(0.05) or "duplicate")
+    graph.add("agent", speculative, inline=True)
+
+    assert graph.run(stop=stop) == {"check": "duplicate"}
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import llm_gateway
+from agents.email_agent import process_email
+from agents.pdf_agent import process_pdf
+from memory.shared_memory import SharedMemory
+
+MESSAGES = [{"role": "system", "content": "You are a precise email parsing assistant."},
+            {"role": "user", "content": "From: a@example.com\nPlease quote 10 units."}]
+
+EMAIL = "From: Ana Ruiz <ana@example.com>\nTo: orders@example.com\nSubject: Quote\n\nPlease quote 10 units."
+
+@pytest.fixture
+def memory(tmp_path):
+    return SharedMemory(str(tmp_path / "memory.db"))
+
+def test_stream_chat_yields_the_reply_in_pieces(stub_llm):
+    deltas = list(llm_gateway.stream_chat(MESSAGES, cache=False))
+
+    assert len(deltas) > 1
+    assert json.loads("".join(deltas))["Urgency"] == "medium"
+
+def test_chat_json_streams_tokens_and_parses_the_reply(stub_llm):
+    tokens = []
+
+    reply = llm_gateway.chat_json(MESSAGES, on_token=tokens.append, cache=False)
+    assert len(tokens) > 1
+    assert json.loads("".join(tokens)) == reply
+
+def test_streamed_and_json_mode_agents_give_the_same_result(stub_llm, memory):
+    tokens = []
+
+    streamed = process_email(EMAIL, "streamed", memory, on_token=tokens.append)
+    plain = process_email(EMAIL, "plain", memory)
+    assert tokens and streamed == plain
+    assert streamed["Sender"] == {"name": "Ana Ruiz", "email": "ana@example.com"}
+
+    tokens.clear()
+    assert process_pdf("Invoice 17, total due 500 USD", "pdf", memory, on_token=tokens.append)["document_type"]
+    assert tokens
+
+def test_streamed_reply_that_is_not_an_object_is_reported_by_the_agent(stub_llm, memory):
+    stub_llm.responses["email"] = "Sorry, I cannot help with that."
+
+    result = process_email(EMAIL, "c1", memory, on_token=lambda delta: None)
+    assert result["error"].startswith("Email processing failed")
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {"a": 1}),
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Here you go: {"a": {"b": 2}} hope it helps', {"a": {"b": 2}}),
+])
+def test_parse_json_reply(text, expected):
+    assert llm_gateway.parse_json_reply(text) == expected
+
+def test_parse_json_reply_rejects_text_without_an_object():
+    with pytest.raises(ValueError):
+        llm_gateway.parse_json_reply("no json here")
@@ -0,0 +1,111 @@
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+import telemetry
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    telemetry.reset()
+    yield
+    telemetry.reset()
+
+@pytest.fixture
+def traces(monkeypatch):
+    """Sample every span and collect trace records instead of writing them"""
+    records = []
+    monkeypatch.setattr(telemetry, "TELEMETRY_TRACE_LOG", True)
+    monkeypatch.setattr(telemetry, "TELEMETRY_TRACE_SAMPLE", 1.0)
+    monkeypatch.setattr(telemetry, "_trace_writer", SimpleNamespace(write=records.append))
+    return records
+
+def test_counters_and_gauges_render_in_text_format():
+    telemetry.inc("llm_requests_total", agent="email", outcome="ok")
+    telemetry.inc("llm_requests_total", 2, agent="email", outcome="ok")
+    telemetry.set_gauge("job_queue_depth", 3)
+    telemetry.set_gauge("job_queue_depth", 1)
+    telemetry.inc("custom_total", 0.5, note='say "hi"\n')
+
+    lines = telemetry.render_prometheus().splitlines()
+    assert "# TYPE llm_requests_total counter" in lines
+    assert 'llm_requests_total{agent="email",outcome="ok"} 3' in lines
+    assert "job_queue_depth 1" in lines
+    assert "# HELP custom_total custom_total" in lines
+    assert 'custom_total{note="say \\"hi\\"\\n"} 0.5' in lines
+
+def test_histogram_buckets_are_cumulative():
+    for seconds in (0.004, 0.2, 0.2, 100.0):
+        telemetry.observe("pipeline_stage_duration_seconds", seconds, stage="agent")
+
+    text = telemetry.render_prometheus()
+    assert 'pipeline_stage_duration_seconds_bucket{stage="agent",le="0.005"} 1' in text
+    assert 'pipeline_stage_duration_seconds_bucket{stage="agent",le="0.25"} 3' in text
+    assert 'pipeline_stage_duration_seconds_bucket{stage="agent",le="60.0"} 3' in text
+    assert 'pipeline_stage_duration_seconds_bucket{stage="agent",le="+Inf"} 4' in text
+    assert 'pipeline_stage_duration_seconds_count{stage="agent"} 4' in text
+    assert 'pipeline_stage_duration_seconds_sum{stage="agent"} 100.404' in text
+
+def test_span_records_duration_and_errors():
+    with telemetry.span("classify", route="llm"):
+        pass
+    with pytest.raises(ValueError):
+        with telemetry.span("classify", route="llm"):
+            raise ValueError("boom")
+
+    assert 'pipeline_stage_duration_seconds_count{route="llm",stage="classify"} 2' in telemetry.render_prometheus()
+    assert telemetry.current_span() is None
+
+def test_nested_spans_share_a_trace(traces):
+    with telemetry.span("document") as outer:
+        outer.set("pages", 3)
+        with telemetry.span("agent"):
+            assert telemetry.current_span().stage == "agent"
+        assert telemetry.current_span() is outer
+
+    inner, root = traces
+    assert inner["trace_id"] == root["trace_id"]
+    assert inner["parent_id"] == root["span_id"] and root["parent_id"] is None
+    assert root["attrs"] == {"pages": 3} and root["status"] == "ok"
+
+def test_unsampled_spans_write_no_trace(traces, monkeypatch):
+    monkeypatch.setattr(telemetry, "TELEMETRY_TRACE_SAMPLE", 0.0)
+    with telemetry.span("document"):
+        with telemetry.span("agent"):
+            pass
+    assert traces == []
+
+def test_usage_is_counted_from_objects_and_dicts():
+    telemetry.record_usage("email", "m", SimpleNamespace(prompt_tokens=10, completion_tokens=4))
+    telemetry.record_usage("email", "m", {"prompt_tokens": 5, "completion_tokens": 0})
+    telemetry.record_usage("email", "m", None)
+
+    text = telemetry.render_prometheus()
+    assert 'llm_tokens_total{agent="email",kind="prompt",model="m"} 15' in text
+    assert 'llm_tokens_total{agent="email",kind="completion",model="m"} 4' in text
+
+def test_disabled_telemetry_records_nothing(monkeypatch):
+    monkeypatch.setattr(telemetry, "TELEMETRY_ENABLED", False)
+    telemetry.inc("llm_requests_total")
+    telemetry.set_gauge("job_queue_depth", 1)
+    telemetry.observe("pipeline_stage_duration_seconds", 1.0)
+
+    assert telemetry.render_prometheus() == "\n"
+
+def test_metrics_server_serves_the_registry(monkeypatch):
+    monkeypatch.setattr(telemetry, "_server", None)
+    server = telemetry.start_metrics_server(0, host="127.0.0.1")
+    try:
+        assert telemetry.start_metrics_server(0, host="127.0.0.1") is server
+        telemetry.inc("jobs_total", event="submitted")
+        url = "http://127.0.0.1:%d" % server.server_address[1]
+        with urllib.request.urlopen(url + "/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert 'jobs_total{event="submitted"} 1' in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError) as missing:
+            urllib.request.urlopen(url + "/other", timeout=5)
+        assert missing.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,54 @@
+from utils.text_budget import clean_pages, clean_text, compact, truncate_tokens
+
+DISCLAIMER = "This email is confidential and may be privileged."
+
+def test_disclaimer_sentence_in_body_paragraph_keeps_the_body():
+    text = f"Please send 500 units of part A-17 by Friday. {DISCLAIMER}"
+
+    assert clean_text(text) == "Please send 500 units of part A-17 by Friday."
+
+def test_disclaimer_line_without_blank_lines_keeps_the_other_lines():
+    text = f"Hi team,\nPlease review invoice INV-42.\n{DISCLAIMER}\nThanks, Ann"
+
+    assert clean_text(text) == "Hi team,\nPlease review invoice INV-42.\nThanks, Ann"
+
+def test_disclaimer_paragraph_is_removed():
+    text = ("Please review invoice INV-42.\n\nThis message is confidential. "
+            "If you are not the intended recipient, please delete it.")
+
+    assert clean_text(text) == "Please review invoice INV-42."
+
+def test_pdf_page_collapsed_to_one_line_keeps_its_content():
+    # PyPDF2 output with a word per line is collapsed into a single line
+    words = "Invoice number 42 total due 500 USD by March 3 .".split() + DISCLAIMER.split()
+    cleaned = clean_text("\n".join(words))
+
+    assert cleaned.startswith("Invoice number 42 total due 500 USD")
+    assert "confidential" not in cleaned
+
+def test_cleanup_never_empties_text_with_content():
+    assert clean_text(DISCLAIMER) == DISCLAIMER
+    assert clean_text("> quoted reply only") == "> quoted reply only"
+    assert clean_text("   \n\n ") == ""
+
+def test_clean_pages_falls_back_when_every_page_is_boilerplate():
+    assert clean_pages([DISCLAIMER]) == [DISCLAIMER]
+    assert clean_pages(["Order 7 for 20 units.", DISCLAIMER]) == ["Order 7 for 20 units."]
+
+def test_clean_pages_drops_running_headers():
+    pages = [f"ACME Corp\nBody of page {index} with enough lines\nmore text\nstill more\nPage {index}"
+             for index in range(1, 5)]
+
+    assert all("ACME Corp" not in page and "Page" not in page for page in clean_pages(pages))
+
+def test_compact_sends_body_text_next_to_a_disclaimer():
+    text = f"Order 5 pallets of cement for site B. {DISCLAIMER}"
+
+    assert compact(text, 500, "email_agent") == "Order 5 pallets of cement for site B."
+
+def test_truncate_tokens_cuts_at_a_word_break():
+    text = "word " * 100
+
+    cut = truncate_tokens(text, 10)
+    assert len(cut) <= 40
+    assert cut.endswith("word")
@@ -0,0 +1,82 @@
+"""Structural parsing of RFC 822 / MIME email with the stdlib ``email`` package.
+
+Headers, the readable text body and attachments are separated without any
+model call, so only the body needs to be sent to the LLM.
+"""
+import html
+import re
+from email import policy
+from email.parser import BytesParser, Parser
+from email.utils import getaddresses, parseaddr, parsedate_to_datetime
+
+# A header block is at least one "Name: value" line before the first blank line
+_HEADER_BLOCK = re.compile(r"\A(?:[!-9;-~]+:[^\n]*\n(?:[ \t][^\n]*\n)*)+\r?\n")
+
+def looks_like_email(content: str) -> bool:
+    """True when the text starts with an RFC 822 header block naming a sender or subject"""
+    match = _HEADER_BLOCK.match(content.lstrip().replace("\r\n", "\n"))
+    return bool(match) and re.search(r"^(from|subject|to):", match.group(0), re.IGNORECASE | re.MULTILINE) is not None
+
+def parse_email(content) -> dict:
+    """Split an email (str or bytes) into headers, text body and attachments.
+
+    Returns ``headers`` (sender name/email, recipients, cc, subject, ISO date,
+    message id), ``body`` (the text/plain part, or the HTML part reduced to
+    text) and ``attachments`` as dicts with filename, content_type and the
+    decoded ``data`` bytes. Text without a header block is returned as the
+    body with empty headers.
+    """
+    if isinstance(content, str):
+        if not looks_like_email(content):
+            return {"headers": {}, "body": content.strip(), "attachments": []}
+        message = Parser(policy=policy.default).parsestr(content.lstrip())
+    else:
+        message = BytesParser(policy=policy.default).parsebytes(bytes(content).lstrip())
+
+    return {
+        "headers": _headers(message),
+        "body": _body(message),
+        "attachments": [
+            {
+                "filename": part.get_filename() or "",
+                "content_type": part.get_content_type(),
+                "data": part.get_payload(decode=True) or b""
+            }
+            for part in message.iter_attachments()
+        ] if message.is_multipart() else []
+    }
+
+def _headers(message) -> dict:
+    name, address = parseaddr(str(message.get("From", "")))
+    headers = {
+        "from_name": name,
+        "from_email": address,
+        "to": [address for _, address in getaddresses([str(value) for value in message.get_all("To", [])])],
+        "cc": [address for _, address in getaddresses([str(value) for value in message.get_all("Cc", [])])],
+        "subject": str(message.get("Subject", "")).strip(),
+        "date": None,
+        "message_id": str(message.get("Message-ID", "")).strip()
+    }
+    if message.get("Date"):
+        try:
+            headers["date"] = parsedate_to_datetime(str(message["Date"])).isoformat()
+        except (TypeError, ValueError):
+            headers["date"] = str(message["Date"])
+    return headers
+
+def _body(message) -> str:
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        text = part.get_content()
+    except (LookupError, KeyError):
+        text = (part.get_payload(decode=True) or b"").decode("utf-8", errors="replace")
+    if part.get_content_type() == "text/html":
+        text = _html_to_text(text)
+    return re.sub(r"\n{3,}", "\n\n", text.strip())
+
+def _html_to_text(markup: str) -> str:
+    markup = re.sub(r"(?is)<(script|style).*?</\1>", "", markup)
+    markup = re.sub(r"(?i)<br\s*/?>|</p>|</div>|</tr>|</li>", "\n", markup)
+    return html.unescape(re.sub(r"<[^>]+>", "", markup))
@@ -0,0 +1,76 @@
+"""Content fingerprints for spotting repeated documents.
+
+Text is reduced to lowercase words before hashing, so a re-export with
+different whitespace, line breaks or punctuation gives the same exact hash.
+Numbers keep their sign, decimal and thousands separators and currency
+symbols in the exact hash, so "-500" and "500" or "1.500" and "1500" are
+different documents. The exact hash covers the whole text, however long.
+A 64-bit SimHash over word 3-shingles of the first MAX_CHARS characters
+stays within a few bits for copies that differ slightly, such as a re-scan
+or the same invoice pasted from an email. ``bands`` splits the SimHash into 16-bit pieces: two hashes at most
+three bits apart always share at least one piece, so candidates can be
+found with an exact index lookup.
+"""
+import hashlib
+import re
+
+SHINGLE_WORDS = 3
+BANDS = 4
+# Only the start of very long documents goes into the SimHash; the exact hash covers all of it
+MAX_CHARS = 50000
+
+_WORD = re.compile(r"\w+")
+# A number with its sign (not a hyphen inside a word), separators, currency and percent signs
+_EXACT_TOKEN = re.compile(
+    r"(?:(?<!\w)[-+\u2212])?[$\u20ac\u00a3\u00a5\u20b9]?\d+(?:[.,]\d+)*[$\u20ac\u00a3\u00a5\u20b9%]?|\w+"
+)
+
+def words(text: str) -> list:
+    return _WORD.findall(text[:MAX_CHARS].lower())
+
+def exact_tokens(text: str):
+    """Lowercase words of the whole text, with numbers kept whole for the exact hash"""
+    for match in _EXACT_TOKEN.finditer(text.lower()):
+        yield match.group()
+
+def exact_hash(text: str) -> str:
+    """sha256 of the space-joined exact tokens, hashed token by token"""
+    digest = hashlib.sha256()
+    separator = b""
+    for token in exact_tokens(text):
+        digest.update(separator + token.encode("utf-8"))
+        separator = b" "
+    return digest.hexdigest()
+
+def fingerprint(text: str) -> dict:
+    """``sha256`` of the normalized text, its 64-bit ``simhash`` and ``words`` count"""
+    tokens = words(text)
+    return {
+        "sha256": exact_hash(text),
+        "simhash": simhash(tokens),
+        "words": len(tokens)
+    }
+
+def simhash(tokens: list) -> int:
+    shingles = {
+        " ".join(tokens[index:index + SHINGLE_WORDS])
+        for index in range(max(1, len(tokens) - SHINGLE_WORDS + 1))
+    }
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in shingles
+    ]
+    # Column-wise bit counts: each hash as a 64-character bit string
+    columns = zip(*(format(value, "064b") for value in hashes))
+    threshold = len(hashes) / 2
+    bits = "".join("1" if column.count("1") > threshold else "0" for column in columns)
+    return int(bits or "0", 2)
+
+def distance(a: int, b: int) -> int:
+    """Number of differing bits"""
+    return bin(a ^ b).count("1")
+
+def bands(value: int) -> list:
+    width = 64 // BANDS
+    mask = (1 << width) - 1
+    return [(value >> (band * width)) & mask for band in range(BANDS)]
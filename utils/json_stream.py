@@ -0,0 +1,158 @@
+"""Incremental reading of large JSON arrays and NDJSON feeds.
+
+``iter_records`` reads a binary stream in fixed-size chunks and yields one
+record at a time, so memory stays bounded by the chunk size and the largest
+single record instead of the whole file. Array elements are parsed where
+they sit in the buffer with ``JSONDecoder.raw_decode``; a malformed element
+is delimited by a bracket/string scanner so it can be reported with its index
+while the records after it are still read.
+"""
+import codecs
+import json
+import re
+from config import JSON_STREAM_CHUNK_BYTES, JSON_STREAM_MIN_BYTES
+
+STREAM_EXTENSIONS = (".ndjson", ".jsonl")
+
+_WHITESPACE = re.compile(r"\s*")
+_STRUCTURE = re.compile(r'[\[\]{}",]')
+_STRING_END = re.compile(r'["\\]')
+
+def is_record_stream(file_name: str, head: bytes, size: int, min_bytes: int = JSON_STREAM_MIN_BYTES) -> bool:
+    """True for NDJSON files and for JSON arrays of at least ``min_bytes``"""
+    file_name = file_name.lower()
+    if file_name.endswith(STREAM_EXTENSIONS):
+        return True
+    return file_name.endswith(".json") and size >= min_bytes and head.lstrip(b"\xef\xbb\xbf \t\r\n")[:1] == b"["
+
+def iter_records(stream, ndjson: bool = False, chunk_size: int = JSON_STREAM_CHUNK_BYTES):
+    """Yield ``(index, text, error)`` for each record of a binary stream.
+
+    With ``ndjson`` every non-blank line is a record, otherwise the stream
+    must hold a top-level JSON array whose elements are the records. ``error``
+    is None for a valid record and describes the problem for a malformed one.
+    """
+    chunks = _read_text(stream, chunk_size)
+    records = _ndjson_records(chunks) if ndjson else _array_records(chunks)
+    for index, (text, error) in enumerate(records):
+        yield index, text, error
+
+def _read_text(stream, chunk_size: int):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(data)
+
+def _ndjson_records(chunks):
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield _check(line.strip())
+    if rest.strip():
+        yield _check(rest.strip())
+
+def _check(text: str) -> tuple:
+    try:
+        json.loads(text)
+    except ValueError as e:
+        return text, f"Invalid JSON: {getattr(e, 'msg', e)}"
+    return text, None
+
+def _array_records(chunks):
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        # Drop the consumed text and append the next chunk; False at end of input
+        nonlocal buf, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return False
+        buf, pos = buf[pos:] + chunk, 0
+        return True
+
+    while True:
+        pos = _WHITESPACE.match(buf, pos).end()
+        if pos < len(buf):
+            break
+        if not fill():
+            return
+    if buf[pos] != "[":
+        raise ValueError("Expected a top-level JSON array")
+    pos += 1
+
+    while True:
+        pos = _WHITESPACE.match(buf, pos).end()
+        if pos == len(buf):
+            if fill():
+                continue
+            return
+        if buf[pos] == "]":
+            # Empty array or a trailing comma
+            return
+
+        error = None
+        try:
+            _, end = decoder.raw_decode(buf, pos)
+        except ValueError as e:
+            error = f"Invalid JSON: {e.msg}"
+        else:
+            after = _WHITESPACE.match(buf, end).end()
+            if after == len(buf) and not eof:
+                # A number could continue in the next chunk
+                fill()
+                continue
+            if after == len(buf) or buf[after] in ",]":
+                yield buf[pos:end], None
+                if after == len(buf) or buf[after] == "]":
+                    return
+                pos = after + 1
+                continue
+            error = "Invalid JSON: Extra data"
+
+        stop = _record_end(buf, pos)
+        if stop is None:
+            if fill():
+                continue
+            yield buf[pos:].strip(), "Invalid JSON: truncated record at end of input"
+            return
+        yield buf[pos:stop].strip(), error
+        if buf[stop] == "]":
+            return
+        pos = stop + 1
+
+def _record_end(buf: str, pos: int):
+    """Index of the "," or "]" that ends the array element starting at ``pos``, or None if not buffered yet"""
+    depth, index = 0, pos
+    while True:
+        match = _STRUCTURE.search(buf, index)
+        if match is None:
+            return None
+        char, index = match.group(), match.end()
+        if char == '"':
+            while True:
+                match = _STRING_END.search(buf, index)
+                if match is None:
+                    return None
+                if match.group() == "\\":
+                    index = match.end() + 1
+                    continue
+                index = match.end()
+                break
+        elif char in "[{":
+            depth += 1
+        elif depth:
+            if char in "]}":
+                depth -= 1
+        elif char in ",]":
+            return match.start()
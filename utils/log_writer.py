@@ -0,0 +1,157 @@
+"""Queue-backed JSONL writer for output_logs/log.jsonl.
+
+Callers only enqueue entries; a daemon thread serializes them and appends
+them to the log in batches, flushing when ``batch_size`` entries are waiting
+or ``flush_interval`` seconds have passed. The active file keeps its path and
+line format. When it exceeds ``max_bytes`` or the day changes it is renamed
+to ``<name>.<YYYYmmdd-HHMMSS>.jsonl`` (gzipped when ``compress`` is set) and a
+fresh file is started. Pending entries are flushed at interpreter exit.
+"""
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+from config import (
+    LOG_PATH,
+    LOG_BATCH_SIZE,
+    LOG_FLUSH_INTERVAL,
+    LOG_MAX_BYTES,
+    LOG_ROTATE_DAILY,
+    LOG_COMPRESS,
+)
+
+_STOP = object()
+
+class BackgroundLogWriter:
+    def __init__(self, path: str = LOG_PATH, batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL, max_bytes: int = LOG_MAX_BYTES,
+                 rotate_daily: bool = LOG_ROTATE_DAILY, compress: bool = LOG_COMPRESS,
+                 max_queue: int = 100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.closed = False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = None
+        self.opened_on = None
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, entry: dict):
+        """Queue one log entry; only blocks if the writer is far behind"""
+        if self.closed:
+            raise RuntimeError("log writer is closed")
+        self.queue.put(entry)
+
+    def flush(self):
+        """Block until every entry queued so far is on disk"""
+        self.queue.join()
+
+    def close(self):
+        """Flush pending entries and stop the writer thread"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def _open(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+        if self.file.tell() > 0:
+            self.opened_on = date.fromtimestamp(os.path.getmtime(self.path))
+        else:
+            self.opened_on = date.today()
+
+    def _should_rotate(self) -> bool:
+        if self.file.tell() == 0:
+            return False
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            return True
+        return self.rotate_daily and date.today() != self.opened_on
+
+    def _rotate(self):
+        self.file.close()
+        stem, ext = os.path.splitext(self.path)
+        suffix = datetime.now().strftime('%Y%m%d-%H%M%S')
+        rotated = f"{stem}.{suffix}{ext}"
+        counter = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{stem}.{suffix}-{counter}{ext}"
+            counter += 1
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        self._open()
+
+    def _write_batch(self, batch: list):
+        if self.file is None:
+            self._open()
+        # A file left over from an earlier day or run is rotated before the first batch too
+        if self._should_rotate():
+            self._rotate()
+        self.file.write("".join(json.dumps(entry, default=str) + "\n" for entry in batch))
+        self.file.flush()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.queue.get()
+            taken = 1
+            batch = []
+            if first is _STOP:
+                stopping = True
+            else:
+                batch.append(first)
+            # Keep collecting until the batch is full or the interval elapses
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                taken += 1
+                if entry is _STOP:
+                    stopping = True
+                else:
+                    batch.append(entry)
+            try:
+                if batch:
+                    self._write_batch(batch)
+            except Exception as e:
+                # Losing a batch is bad, but killing the writer would block
+                # every later flush
+                print(f"log writer failed to write {len(batch)} entries: {e}", file=sys.stderr)
+            finally:
+                for _ in range(taken):
+                    self.queue.task_done()
+        if self.file is not None:
+            self.file.close()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_log_writer() -> BackgroundLogWriter:
+    """Process-wide writer for the output log, closed automatically at exit"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BackgroundLogWriter()
+                atexit.register(_writer.close)
+    return _writer
@@ -0,0 +1,207 @@
+"""Incremental text extraction for PDF documents.
+
+PDFs are opened from whatever the caller already has without materializing
+another copy: bytes are wrapped in place, paths are memory-mapped, seekable
+file objects (e.g. Streamlit uploads) are read directly and non-seekable
+streams are spooled to a temporary file. Pages are then extracted lazily and
+extraction stops as soon as the character budget is met.
+
+When every page is needed (no budget) and the document is long enough, the
+page range is split across a process pool instead. Documents that are not
+already files are spooled to a temporary file once, each worker opens that
+path on its own, and the text is reassembled in page order.
+"""
+import io
+import math
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import PyPDF2
+
+import telemetry
+from config import PDF_CHAR_BUDGET, PDF_SPOOL_MAX_BYTES, PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES
+
+_pool = None
+_pool_lock = threading.Lock()
+
+@contextmanager
+def open_pdf_stream(source):
+    """Yield a seekable binary stream over bytes, a path or a file object"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    elif isinstance(source, os.PathLike):
+        with open(source, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("PDF file is empty")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+    elif hasattr(source, "read"):
+        if getattr(source, "seekable", lambda: False)():
+            source.seek(0)
+            yield source
+        else:
+            with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES) as spooled:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    spooled.write(chunk)
+                spooled.seek(0)
+                yield spooled
+    else:
+        raise TypeError(f"Unsupported PDF source: {type(source).__name__}")
+
+@contextmanager
+def pdf_path(source):
+    """Yield a file path holding the PDF, spooling bytes or streams to a temporary file"""
+    if isinstance(source, os.PathLike):
+        yield Path(source)
+        return
+    with tempfile.NamedTemporaryFile(prefix="pdf-", suffix=".pdf", delete=False) as spooled:
+        try:
+            with open_pdf_stream(source) as stream:
+                shutil.copyfileobj(stream, spooled, 1024 * 1024)
+        except BaseException:
+            spooled.close()
+            os.unlink(spooled.name)
+            raise
+    try:
+        yield Path(spooled.name)
+    finally:
+        os.unlink(spooled.name)
+
+def iter_pdf_pages(reader: PyPDF2.PdfReader, start: int = 0, stop: int = None):
+    """Lazily yield (page_index, text, seconds) for a page range"""
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    for index in range(start, stop):
+        started = time.perf_counter()
+        text = reader.pages[index].extract_text() or ""
+        yield index, text, time.perf_counter() - started
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned workers: forking a threaded server process is unsafe
+                _pool = ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+def _extract_page_range(path: Path, start: int, stop: int) -> list:
+    """Worker: open the document independently and extract one page range"""
+    with open_pdf_stream(path) as stream:
+        reader = PyPDF2.PdfReader(stream)
+        return [(text, seconds) for _, text, seconds in iter_pdf_pages(reader, start, stop)]
+
+def _page_ranges(total_pages: int, workers: int) -> list:
+    # A couple of ranges per worker evens out pages that are slower to parse
+    size = max(8, math.ceil(total_pages / (workers * 2)))
+    return [(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+def extract_pdf_text_parallel(source, total_pages: int, workers: int = PDF_EXTRACT_WORKERS) -> dict:
+    """Extract every page of a PDF path, bytes or file object using a process pool.
+
+    Workers are only sent the document's path and their page range. Pages
+    are returned in document order regardless of which worker finished first.
+    """
+    pages = []
+    page_timings = []
+    with pdf_path(source) as path:
+        pool = _get_pool()
+        futures = [
+            pool.submit(_extract_page_range, path, start, stop)
+            for start, stop in _page_ranges(total_pages, workers)
+        ]
+        for future in futures:
+            for text, seconds in future.result():
+                pages.append(text)
+                page_timings.append(round(seconds * 1000, 2))
+
+    return {
+        "text": "\n".join(pages),
+        "pages": pages,
+        "pages_read": len(pages),
+        "total_pages": total_pages,
+        "truncated": False,
+        "page_timings_ms": page_timings,
+        "parallel_workers": workers
+    }
+
+def extract_pdf_text(source, char_budget: int = PDF_CHAR_BUDGET) -> dict:
+    """Extract page text until ``char_budget`` characters are collected.
+
+    Returns the text (pages joined with newlines, as before) and the list of
+    page texts, together with how many pages were read, the document's page count, whether pages were
+    left unread, and per-page extraction times in milliseconds. With
+    ``char_budget=None`` every page is extracted, in parallel for documents
+    of at least PDF_PARALLEL_MIN_PAGES pages.
+    """
+    with telemetry.span("pdf.extract") as span:
+        extraction = _extract_pdf_text(source, char_budget)
+        span.set("pages_read", extraction["pages_read"])
+        span.set("total_pages", extraction["total_pages"])
+    return extraction
+
+def _over_budget(length: int, char_budget: int) -> bool:
+    return char_budget is not None and length > char_budget
+
+def limit_extraction(extraction: dict, char_budget: int) -> dict:
+    """The ``extract_pdf_text(source, char_budget)`` result, cut from a fuller extraction of the same PDF"""
+    length = 0
+    for count, text in enumerate(extraction["pages"], 1):
+        length += len(text) + 1
+        if _over_budget(length, char_budget):
+            break
+    else:
+        return extraction
+    pages = extraction["pages"][:count]
+    return {
+        "text": "\n".join(pages),
+        "pages": pages,
+        "pages_read": count,
+        "total_pages": extraction["total_pages"],
+        "truncated": count < extraction["total_pages"],
+        "page_timings_ms": extraction["page_timings_ms"][:count]
+    }
+
+def _extract_pdf_text(source, char_budget: int) -> dict:
+    with open_pdf_stream(source) as stream:
+        reader = PyPDF2.PdfReader(stream)
+        total_pages = len(reader.pages)
+        if (char_budget is None and PDF_EXTRACT_WORKERS > 1
+                and total_pages >= PDF_PARALLEL_MIN_PAGES):
+            if not isinstance(source, os.PathLike):
+                # A one-shot stream has already been spooled into ``stream``
+                stream.seek(0)
+                source = stream
+            return extract_pdf_text_parallel(source, total_pages)
+
+        pages = []
+        page_timings = []
+        length = 0
+        for index, text, seconds in iter_pdf_pages(reader):
+            pages.append(text)
+            page_timings.append(round(seconds * 1000, 2))
+            length += len(text) + 1
+            if _over_budget(length, char_budget):
+                break
+
+    return {
+        "text": "\n".join(pages),
+        "pages": pages,
+        "pages_read": len(pages),
+        "total_pages": total_pages,
+        "truncated": len(pages) < total_pages,
+        "page_timings_ms": page_timings
+    }
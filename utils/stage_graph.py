@@ -0,0 +1,132 @@
+"""A small dependency-graph executor for the stages of one document.
+
+Stages are added with the names of the stages whose outputs they take as
+arguments. ``run`` starts every stage as soon as all of its inputs have
+finished, so independent stages (storing the upload, extracting its text,
+the duplicate check) run concurrently on a shared thread pool. Stages added
+with ``inline=True`` run on the thread that called ``run`` instead: long
+stages such as LLM calls then take one thread per caller (job worker, batch
+worker, ...) rather than a slot in the shared pool, so they neither cap how
+many documents run at once nor hold up the short stages of other documents.
+The wall time of every stage is written into ``timings`` under its name.
+
+A ``stop`` predicate can end the run early, e.g. once a duplicate is found:
+stages not yet started are dropped, and stages still running finish in the
+background with their outputs ignored.
+"""
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import PIPELINE_STAGE_THREADS
+
+_executor = None
+_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PIPELINE_STAGE_THREADS, thread_name_prefix="stage")
+    return _executor
+
+class StageGraph:
+    def __init__(self, timings: dict = None):
+        self.timings = timings if timings is not None else {}
+        self.stages = {}
+
+    def add(self, name: str, fn, inputs: tuple = (), inline: bool = False):
+        """Add stage ``name``, run as ``fn(*outputs of inputs)`` once they have all finished.
+
+        An ``inline`` stage runs on the thread calling ``run``.
+        """
+        missing = [stage for stage in inputs if stage not in self.stages]
+        if missing:
+            # Stages are added in dependency order, which also rules out cycles
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(missing)}")
+        self.stages[name] = (fn, tuple(inputs), inline)
+
+    def run(self, stop=None) -> dict:
+        """Run the stages and return their outputs by name.
+
+        The first exception raised by a stage is re-raised here. ``stop(name,
+        output)`` is called as each stage finishes, on the thread that ran
+        it; returning True ends the run with the outputs gathered so far. A
+        stop while an inline stage is running ends the run once that stage
+        returns, and whatever it raised after the stop is discarded.
+        """
+        outputs = {}
+        pending = dict(self.stages)
+        finished = queue.SimpleQueue()
+        stopped = threading.Event()
+        running = 0
+
+        def on_done(name: str, future):
+            stopping = False
+            try:
+                if stop is not None and future.exception() is None:
+                    stopping = bool(stop(name, future.result()))
+            finally:
+                finished.put((name, future, stopping))
+            if stopping:
+                stopped.set()
+
+        def collect() -> bool:
+            """Wait for the next pool stage to finish and take its output; True when it stopped the run"""
+            nonlocal running
+            name, future, stopping = finished.get()
+            running -= 1
+            outputs[name] = future.result()
+            return stopping
+
+        def drain() -> dict:
+            """Outputs once another thread stopped the run; stages failing meanwhile are ignored"""
+            while True:
+                # The stopping stage is queued before ``stopped`` is set
+                name, future, stopping = finished.get()
+                if future.exception() is None:
+                    outputs[name] = future.result()
+                if stopping:
+                    return outputs
+
+        while pending or running:
+            if stopped.is_set():
+                return drain()
+            ready = [name for name, (_, inputs, _) in pending.items() if all(stage in outputs for stage in inputs)]
+            inline = []
+            for name in ready:
+                fn, inputs, on_caller = pending.pop(name)
+                args = [outputs[stage] for stage in inputs]
+                if on_caller:
+                    inline.append((name, fn, args))
+                    continue
+                # Carry the caller's context so spans started in the stage nest under its span
+                context = contextvars.copy_context()
+                future = _get_executor().submit(context.run, self._timed, name, fn, args)
+                running += 1
+                future.add_done_callback(lambda future, name=name: on_done(name, future))
+            if inline:
+                for name, fn, args in inline:
+                    try:
+                        outputs[name] = self._timed(name, fn, args)
+                    except BaseException:
+                        if stopped.is_set():
+                            return drain()
+                        raise
+                    if stop is not None and stop(name, outputs[name]):
+                        return outputs
+                    if stopped.is_set():
+                        return drain()
+                continue
+            if collect():
+                return outputs
+        return outputs
+
+    def _timed(self, name: str, fn, args: list):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timings[name] = time.perf_counter() - started
@@ -0,0 +1,213 @@
+"""Prompt text cleanup and token budgeting shared by the agents.
+
+Extracted text is cleaned before it is sent to the model: whitespace noise
+from PDF extraction is collapsed, lines repeated at the top or bottom of
+most pages (running headers, footers, page numbers) are dropped, and common
+email boilerplate (quoted replies, disclaimer sentences, "Sent from my ..."
+lines) is removed. Cleanup never empties a text that had content; it then
+falls back to the text with only its whitespace normalized. The result is then cut to a budget of estimated tokens, capped by
+what fits in the model's context window next to the instructions and the
+completion, instead of a fixed number of characters.
+
+Token counts are estimates at ~4 characters per token, the same rate the
+LLM scheduler uses for its tokens-per-minute budget. Tokens removed by
+cleanup and by truncation are counted per agent in telemetry.
+"""
+import math
+import re
+from collections import Counter
+
+import telemetry
+from config import LLM_MODEL, LLM_CONTEXT_TOKENS, LLM_COMPLETION_TOKEN_ESTIMATE
+
+CHARS_PER_TOKEN = 4
+# Room left for the prompt's own instructions
+INSTRUCTION_TOKENS = 512
+# Only this many times the budget is cleaned; cleanup rarely shrinks text more
+RAW_SLACK = 4
+
+MODEL_CONTEXT_TOKENS = {
+    "llama3-70b-8192": 8192,
+    "llama3-8b-8192": 8192,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "mixtral-8x7b-32768": 32768,
+    "gemma2-9b-it": 8192,
+}
+
+_ZERO_WIDTH = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u00ad]")
+_SPACES = re.compile("[ \t\f\v\u00a0\u2000-\u200a\u202f\u205f\u3000]+")
+_RULES = re.compile(r"([._\-=*~])\1{3,}")
+_DIGITS = re.compile(r"\d+")
+_BOILERPLATE_LINES = re.compile(
+    r"^(>.*"
+    r"|on .{0,200} wrote:"
+    r"|sent from my [\w ]+"
+    r"|get outlook for \w+"
+    r"|-+ ?original message ?-+"
+    r"|page \d+( of \d+)?"
+    r"|- ?\d+ ?-"
+    r"|--"
+    r"|.*\bunsubscribe\b.*)$",
+    re.IGNORECASE
+)
+_DISCLAIMER = re.compile(
+    r"\b(this (e-?mail|message|communication)[^.]{0,80}\b(confidential|privileged)"
+    r"|intended (only|solely) for the (use of the )?(individual|addressee|recipient|person)"
+    r"|if you (are not|have received this)[^.]{0,40}\b(intended recipient|in error))",
+    re.IGNORECASE
+)
+# Sentence ends and line breaks; disclaimers are removed one sentence or line at a time
+_SENTENCE_BREAK = re.compile(r"((?<=[.!?])[ \t]+|[ \t]*\n[ \t]*)")
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def context_window(model: str = LLM_MODEL) -> int:
+    """Context size in tokens: LLM_CONTEXT_TOKENS, the known table, or the size in the model's name"""
+    if LLM_CONTEXT_TOKENS:
+        return LLM_CONTEXT_TOKENS
+    if model in MODEL_CONTEXT_TOKENS:
+        return MODEL_CONTEXT_TOKENS[model]
+    match = re.search(r"-(\d{4,6})$", model)
+    return int(match.group(1)) if match else 8192
+
+def available_tokens(model: str = LLM_MODEL, reserve: int = LLM_COMPLETION_TOKEN_ESTIMATE) -> int:
+    """Tokens of document text that fit next to the instructions and a ``reserve``-token completion"""
+    return context_window(model) - reserve - INSTRUCTION_TOKENS
+
+def prompt_budget(tokens: int, model: str = LLM_MODEL, reserve: int = LLM_COMPLETION_TOKEN_ESTIMATE) -> int:
+    """``tokens`` capped by the model's available context"""
+    return max(256, min(tokens, available_tokens(model, reserve)))
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse extraction whitespace noise while keeping paragraph breaks"""
+    text = _ZERO_WIDTH.sub("", text.replace("\r\n", "\n").replace("\r", "\n"))
+    lines = [_RULES.sub(r"\1\1\1", _SPACES.sub(" ", line)).strip() for line in text.split("\n")]
+    filled = [line for line in lines if line]
+    if len(filled) >= 10 and sum(1 for line in filled if " " not in line) >= 0.6 * len(filled):
+        # PyPDF2 often puts every word on its own line; such breaks carry no structure
+        return " ".join(filled)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+def strip_disclaimers(paragraph: str) -> str:
+    """Drop the sentences or lines of a paragraph that are legal disclaimers, keeping the rest"""
+    if not _DISCLAIMER.search(paragraph):
+        return paragraph
+    # Sentences at even positions, each followed by the break after it
+    pieces = _SENTENCE_BREAK.split(paragraph) + [""]
+    return "".join(
+        pieces[index] + pieces[index + 1]
+        for index in range(0, len(pieces) - 1, 2)
+        if not _DISCLAIMER.search(pieces[index])
+    ).rstrip()
+
+def strip_boilerplate(text: str) -> str:
+    """Drop quoted replies, mobile signatures, page-number lines and legal disclaimers"""
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = strip_disclaimers(paragraph)
+        lines = [line for line in paragraph.split("\n") if not _BOILERPLATE_LINES.match(line.strip())]
+        if any(line.strip() for line in lines):
+            paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs)
+
+def strip_repeated_lines(pages: list, edge_lines: int = 2, min_share: float = 0.5) -> list:
+    """Remove running headers and footers: lines at the top or bottom of most pages.
+
+    Digits are ignored when comparing, so "Page 3 of 10" matches across pages.
+    """
+    if len(pages) < 3:
+        return list(pages)
+
+    def edge_indexes(lines: list) -> set:
+        filled = [index for index, line in enumerate(lines) if line.strip()]
+        # Pages this short have no body to tell a header from
+        if len(filled) <= 2 * edge_lines:
+            return set()
+        return set(filled[:edge_lines] + filled[-edge_lines:])
+
+    def key(line: str) -> str:
+        return _DIGITS.sub("#", _SPACES.sub(" ", line).strip().lower())
+
+    split = [page.split("\n") for page in pages]
+    edges = [edge_indexes(lines) for lines in split]
+    seen = Counter()
+    for lines, edge in zip(split, edges):
+        seen.update({key(lines[index]) for index in edge})
+    threshold = max(2, math.ceil(min_share * len(pages)))
+    repeated = {line for line, count in seen.items() if count >= threshold}
+    if not repeated:
+        return list(pages)
+
+    cleaned = []
+    for lines, edge in zip(split, edges):
+        cleaned.append("\n".join(
+            line for index, line in enumerate(lines) if index not in edge or key(line) not in repeated
+        ))
+    return cleaned
+
+def clean_text(text: str, boilerplate: bool = True) -> str:
+    """Normalized ``text`` without boilerplate, unless removing it would leave nothing"""
+    text = normalize_whitespace(text)
+    return (strip_boilerplate(text) or text) if boilerplate else text
+
+def clean_pages(pages: list) -> list:
+    """Cleaned text of each page, without running headers/footers or empty pages.
+
+    A page that is all boilerplate is dropped, unless every page is; the
+    pages are then only whitespace-normalized.
+    """
+    cleaned = [strip_boilerplate(normalize_whitespace(page)) for page in strip_repeated_lines(pages)]
+    cleaned = [page for page in cleaned if page]
+    return cleaned or [page for page in map(normalize_whitespace, pages) if page]
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    """Cut ``text`` to about ``tokens`` tokens, at a line or word break when one is close"""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    floor = int(limit * 0.9)
+    cut = text.rfind("\n", floor, limit)
+    if cut < 0:
+        cut = text.rfind(" ", floor, limit)
+    return text[:cut if cut > 0 else limit].rstrip()
+
+def fit(text: str, tokens: int, agent: str, raw_tokens: int = None, cleaned_tokens: int = None,
+        model: str = LLM_MODEL, stats: dict = None) -> str:
+    """Truncate already-cleaned text to the prompt budget and record the tokens saved.
+
+    ``raw_tokens`` is the size before cleanup and ``cleaned_tokens`` the size
+    after it (both default to the size of ``text``). When ``stats`` is given
+    it receives ``tokens_raw``, ``tokens_cleaned`` (removed by cleanup) and
+    ``tokens_sent``.
+    """
+    cleaned_tokens = estimate_tokens(text) if cleaned_tokens is None else cleaned_tokens
+    raw_tokens = cleaned_tokens if raw_tokens is None else raw_tokens
+    text = truncate_tokens(text, prompt_budget(tokens, model))
+    sent_tokens = estimate_tokens(text)
+    record_savings(agent, raw_tokens, cleaned_tokens, sent_tokens, stats)
+    return text
+
+def compact(text: str, tokens: int, agent: str, boilerplate: bool = True, model: str = LLM_MODEL,
+            stats: dict = None) -> str:
+    """Clean ``text`` and cut it to ``tokens`` estimated tokens for ``model``"""
+    raw_tokens = estimate_tokens(text)
+    # Text far beyond the budget would be cut anyway; don't clean all of it
+    head = text[:prompt_budget(tokens, model) * CHARS_PER_TOKEN * RAW_SLACK]
+    cleaned = clean_text(head, boilerplate)
+    removed = estimate_tokens(head) - estimate_tokens(cleaned)
+    return fit(cleaned, tokens, agent, raw_tokens=raw_tokens, cleaned_tokens=raw_tokens - removed,
+               model=model, stats=stats)
+
+def record_savings(agent: str, raw_tokens: int, cleaned_tokens: int, sent_tokens: int, stats: dict = None):
+    telemetry.inc("prompt_tokens_saved_total", max(0, raw_tokens - cleaned_tokens), agent=agent, reason="cleanup")
+    telemetry.inc("prompt_tokens_saved_total", max(0, cleaned_tokens - sent_tokens), agent=agent, reason="budget")
+    if stats is not None:
+        stats.update(tokens_raw=raw_tokens, tokens_cleaned=max(0, raw_tokens - cleaned_tokens),
+                     tokens_sent=sent_tokens)
+
+def describe(stats: dict) -> str:
+    """Processing-step summary of a ``stats`` dict filled by ``fit`` or ``compact``"""
+    return (f"Prompt text: {stats['tokens_sent']} of {stats['tokens_raw']} estimated tokens sent "
+            f"({stats['tokens_cleaned']} removed as whitespace/boilerplate)")